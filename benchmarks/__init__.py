@@ -0,0 +1,19 @@
+"""
+benchmarks
+
+Mediciones de desempeño de las etapas del pipeline con datos sintéticos, sin
+necesidad de las descargas reales. Los módulos de src se importan como en los
+scripts (`from config import ...`), así que se agrega src al path.
+
+Uso:
+    python -m benchmarks.run
+    python -m benchmarks.run --stages clean_atus proximidad --scales 1000 100000
+    python -m benchmarks.run --compare
+"""
+
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
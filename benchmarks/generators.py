@@ -0,0 +1,256 @@
+"""
+generators.py
+
+Generadores sintéticos con semilla para las entradas crudas de cada fuente,
+con la misma estructura que las descargas reales:
+
+* CSV de ATUS a escala nacional (columnas del INEGI en mayúsculas, latin1);
+  sólo una fracción de los registros cae en Hermosillo.
+* JSON del Bachómetro, con fechas en español ('Diciembre 30, 2022').
+* GeoJSON de aristas tipo OSMnx (u, v, key, highway, name, length, ...).
+* Shapefile de colonias del INEGI en su proyección LCC.
+* Tablas limpias de accidentes y baches para las métricas de proximidad.
+"""
+
+from config import METRIC_CRS
+from clean_colonias import CSR_INEGI
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Zona urbana de Hermosillo y extensión aproximada de México (lon, lat)
+BBOX_HMO = (-111.075, 28.900, -110.900, 29.200)
+BBOX_MX = (-117.0, 14.5, -86.7, 32.7)
+
+MESES = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+    'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre',
+]
+HIGHWAYS = ['residential', 'tertiary', 'secondary', 'primary', 'unclassified', 'trunk', 'primary_link']
+
+
+def uniform_points(rng, n, bbox):
+    lon = rng.uniform(bbox[0], bbox[2], n)
+    lat = rng.uniform(bbox[1], bbox[3], n)
+    return lon, lat
+
+
+def random_dates(rng, n, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    offsets = rng.integers(0, int((end - start).total_seconds()), n)
+    return start + pd.to_timedelta(offsets, unit='s')
+
+
+def atus_frame(n, seed=0, year=2022, frac_hmo=0.05):
+    """Registros crudos de ATUS (todo el país) para un año."""
+    rng = np.random.default_rng(seed)
+    in_hmo = rng.random(n) < frac_hmo
+
+    lon, lat = uniform_points(rng, n, BBOX_MX)
+    # Los de Hermosillo se reparten entre la zona urbana y sus alrededores
+    h_lon, h_lat = uniform_points(rng, int(in_hmo.sum()), (-111.2, 28.8, -110.8, 29.3))
+    lon[in_hmo], lat[in_hmo] = h_lon, h_lat
+
+    fechas = random_dates(rng, n, f'{year}-01-01', f'{year}-12-31 23:59')
+    return pd.DataFrame({
+        'EDO': np.where(in_hmo, 26, rng.integers(1, 33, n)),
+        'MPIO': np.where(in_hmo, 30, rng.integers(1, 120, n)),
+        'ANIO': fechas.year, 'MES': fechas.month, 'DIA': fechas.day,
+        'HORA': fechas.hour, 'MINUTOS': fechas.minute,
+        'DIASEMANA': fechas.dayofweek + 1,
+        'URBANA': rng.integers(0, 3, n),
+        'SUBURBANA': rng.integers(0, 4, n),
+        'TIPACCID': rng.integers(0, 13, n),
+        'CAUSAACCI': rng.integers(1, 6, n),
+        'CAPAROD': rng.integers(1, 3, n),
+        'SEXO': rng.integers(1, 4, n),
+        'ALIENTO': rng.integers(4, 7, n),
+        'CINTURON': rng.integers(7, 10, n),
+        'CLASE': rng.integers(1, 4, n),
+        'CONDMUERTO': rng.poisson(0.02, n),
+        'CONDHERIDO': rng.poisson(0.2, n),
+        'LATITUD': lat.round(6),
+        'LONGITUD': lon.round(6),
+        'COLONIA': rng.choice(['CENTRO', 'PITIC', 'SAN BENITO', 'MODELO', 'BALDERRAMA'], n),
+        'CLAVEVIAL': rng.choice(['CALLE', 'BLVD', 'AV'], n),
+    })
+
+
+def write_atus_csvs(directory, n, seed=0, years=(2021, 2022, 2023)):
+    """Un CSV por año con n registros en total, como en los ZIP del INEGI."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, year in enumerate(years):
+        size = n // len(years) + (1 if i < n % len(years) else 0)
+        path = directory / f"atus_{year}.csv"
+        atus_frame(size, seed + i, year).to_csv(path, index=False, encoding='latin1')
+        paths.append(path)
+    return paths
+
+
+def spanish_date(dates):
+    return [f'{MESES[d.month - 1]} {d.day}, {d.year}' for d in dates]
+
+
+def bachometro_records(n, seed=0, year=2022, frac_atendidos=0.07):
+    """Registros crudos del Bachómetro como los guarda extract_bachometro."""
+    rng = np.random.default_rng(seed)
+    lon, lat = uniform_points(rng, n, BBOX_HMO)
+    reporte = random_dates(rng, n, f'{year}-01-01', f'{year}-12-31').normalize()
+    atendido = rng.random(n) < frac_atendidos
+    atencion = reporte + pd.to_timedelta(rng.integers(0, 90, n), unit='D')
+
+    fechas_reporte = spanish_date(reporte)
+    fechas_atencion = spanish_date(atencion)
+    ids = np.arange(n) + seed * 10_000_000
+
+    return [
+        {
+            'latitude': float(lat[i]), 'longitude': float(lon[i]),
+            'date': reporte[i].strftime('%Y-%m-%d'),
+            'neighborhoods': [int(rng.integers(1, 900))],
+            'material': 'Asfalto', 'description': f'Bacheo en calle {i % 500}',
+            'id': int(ids[i]), 'no_reparemos': f'{i + 1}/{year}',
+            'folio': None,
+            'fecha_reporte': fechas_reporte[i],
+            'fecha_atencion': fechas_atencion[i] if atendido[i] else None,
+            'colonia': f'Colonia {i % 300}', 'direccion': f'Calle {i % 500} #{i % 1000}',
+            'descripcion': None, 'imagenes': [],
+        }
+        for i in range(n)
+    ]
+
+
+def fechas_bachometro(n, seed=0, frac_atendidos=0.07):
+    """
+    Columnas de fecha crudas del Bachómetro a gran escala: pocas fechas
+    distintas (días de 2021 a 2023) repetidas en muchas filas.
+    """
+    rng = np.random.default_rng(seed)
+    dias = pd.date_range('2021-01-01', '2023-12-31', freq='D')
+    textos = np.array(spanish_date(dias), dtype=object)
+    atencion = textos[rng.integers(0, len(dias), n)]
+    atencion[rng.random(n) >= frac_atendidos] = None
+    return pd.DataFrame({
+        'fecha_reporte': textos[rng.integers(0, len(dias), n)],
+        'fecha_atencion': atencion,
+    })
+
+
+def write_bachometro_json(directory, n, seed=0, years=(2021, 2022, 2023)):
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, year in enumerate(years):
+        size = n // len(years) + (1 if i < n % len(years) else 0)
+        path = directory / f"baches_{year}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(bachometro_records(size, seed + i, year), f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def osm_edges(n, seed=0):
+    """
+    Aristas tipo OSMnx sobre una malla irregular que cubre Hermosillo y sus
+    alrededores (algunas quedan fuera del filtro urbano de clean_vialidades).
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n / 2))) + 1
+    xs = np.linspace(-111.15, -110.85, side)
+    ys = np.linspace(28.85, 29.30, side)
+    jitter = 0.0003
+
+    nodes = np.arange(side * side).reshape(side, side)
+    u = np.concatenate([nodes[:, :-1].ravel(), nodes[:-1, :].ravel()])[:n]
+    v = np.concatenate([nodes[:, 1:].ravel(), nodes[1:, :].ravel()])[:n]
+    node_x = xs[nodes % side].ravel() + rng.normal(0, jitter, side * side)
+    node_y = ys[nodes // side].ravel() + rng.normal(0, jitter, side * side)
+
+    geometry = shapely.linestrings(
+        np.stack([np.column_stack([node_x[u], node_y[u]]), np.column_stack([node_x[v], node_y[v]])], axis=1)
+    )
+    m = len(u)
+    gdf = gpd.GeoDataFrame({
+        'u': u + 10**9, 'v': v + 10**9, 'key': 0,
+        'osmid': rng.integers(10**7, 10**9, m),
+        'highway': rng.choice(HIGHWAYS, m, p=[0.6, 0.12, 0.1, 0.08, 0.05, 0.03, 0.02]),
+        'oneway': rng.random(m) < 0.3,
+        'reversed': rng.random(m) < 0.5,
+        'name': np.where(rng.random(m) < 0.8, [f'Calle {i % 2000}' for i in range(m)], None),
+        'maxspeed': np.where(rng.random(m) < 0.2, rng.choice(['40', '50', '60'], m), None),
+        'lanes': np.where(rng.random(m) < 0.3, rng.choice(['1', '2', '3'], m), None),
+        'bridge': None, 'tunnel': None, 'width': None, 'junction': None,
+        'access': None, 'ref': None,
+    }, geometry=geometry, crs='EPSG:4326')
+    gdf['length'] = gdf.to_crs(METRIC_CRS).length.round(3)
+    return gdf
+
+
+def write_osm_edges(path, n, seed=0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    osm_edges(n, seed).to_file(path, driver='GeoJSON')
+    return path
+
+
+def colonias(n, seed=0, frac_hmo=0.6):
+    """
+    Polígonos de colonias en una malla sobre Hermosillo, en la proyección LCC
+    del INEGI; una parte corresponde a otros municipios o localidades.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n)))
+    size_x = (BBOX_HMO[2] - BBOX_HMO[0]) / side
+    size_y = (BBOX_HMO[3] - BBOX_HMO[1]) / side
+    i = np.arange(n)
+    x0 = BBOX_HMO[0] + (i % side) * size_x
+    y0 = BBOX_HMO[1] + (i // side) * size_y
+    geometry = shapely.box(x0, y0, x0 + size_x, y0 + size_y)
+
+    in_hmo = rng.random(n) < frac_hmo
+    gdf = gpd.GeoDataFrame({
+        'CVEGEO': [f'26030{k:04d}{k:04d}' for k in i],
+        'CVE_ENT': np.where(in_hmo, '26', '25'),
+        'CVE_MUN': '030',
+        'CVE_LOC': np.where(rng.random(n) < 0.9, '0001', '0002'),
+        'CVE_ASEN': [f'{k:04d}' for k in i],
+        'NOM_ASEN': [f'COLONIA {k}' for k in i],
+        'TIPO': rng.choice(['Colonia', 'Fraccionamiento', 'Barrio'], n),
+        'CP': rng.integers(83000, 83400, n).astype(str),
+        'FECHA_ACT': '2020',
+        'INSTITUCIO': 'INEGI',
+    }, geometry=geometry, crs='EPSG:4326')
+    return gdf.to_crs(CSR_INEGI)
+
+
+def write_colonias_shp(directory, n, seed=0):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "colonias_sinteticas.shp"
+    colonias(n, seed).to_file(path)
+    return path
+
+
+def clean_frames(n_baches, n_atus, seed=0):
+    """
+    Tablas ya limpias (como las de clean_atus y cleaning_data_bachometro) para
+    las métricas de proximidad de la notebook 2.3.
+    """
+    rng = np.random.default_rng(seed)
+    b_lon, b_lat = uniform_points(rng, n_baches, BBOX_HMO)
+    reporte = random_dates(rng, n_baches, '2021-01-01', '2023-12-31').normalize()
+    atendido = rng.random(n_baches) < 0.3
+    atencion = reporte + pd.to_timedelta(rng.integers(0, 120, n_baches), unit='D')
+    baches = pd.DataFrame({
+        'id': np.arange(n_baches),
+        'longitude': b_lon, 'latitude': b_lat,
+        'fecha_reporte': reporte,
+        'fecha_atencion': atencion.where(atendido, pd.NaT),
+    })
+
+    a_lon, a_lat = uniform_points(rng, n_atus, BBOX_HMO)
+    atus = pd.DataFrame({
+        'longitud': a_lon, 'latitud': a_lat,
+        'datetime': random_dates(rng, n_atus, '2021-01-01', '2023-12-31'),
+    })
+    return baches, atus
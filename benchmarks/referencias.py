@@ -0,0 +1,97 @@
+"""
+referencias.py
+
+Implementaciones anteriores de funciones optimizadas, conservadas sólo para
+medirlas contra la versión actual en los benchmarks.
+"""
+
+import pandas as pd
+
+
+def procesar_columna_fecha(df, col, month_map):
+    """
+    Versión original de cleaning_data_bachometro.procesar_columna_fecha (un
+    str.replace por mes y split en tres columnas), conservada como referencia.
+    
+    Convierte fechas en formato texto con meses en español (ej: '15 Enero 2023')
+    a objetos datetime de pandas.
+    
+    Args:
+        df (pd.DataFrame): DataFrame con la columna a procesar
+        col (str): Nombre de la columna de fecha a procesar
+        month_map (dict): Diccionario de mapeo de meses español → número
+    
+    Returns:
+        pd.DataFrame: DataFrame con la columna de fecha convertida a datetime
+    """
+    # Máscara para filas válidas (no nulas)
+    mask = df[col].notna()
+
+    # Si no hay filas válidas, omite el procesamiento
+    if mask.sum() == 0:
+        return df
+
+    # Convertir a string
+    df.loc[mask, col] = df.loc[mask, col].astype(str)
+
+    # Limpiar caracteres no alfanuméricos
+    df.loc[mask, col] = df.loc[mask, col].str.replace(r'[^a-zA-Z0-9 ]', '', regex=True)
+
+    # Reemplazar nombres de meses por números
+    for month, num in month_map.items():
+        df.loc[mask, col] = df.loc[mask, col].str.replace(month, str(num), regex=False)
+
+    # Cambiar None por NA
+    df[col] = df[col].replace({None: pd.NA})
+
+    # Split en 3 columnas
+    splitted = df[col].str.split(' ', expand=True)
+
+    # Verifica si el split tiene exactamente 3 columnas
+    if splitted.shape[1] != 3:
+        #print(f"El split de '{col}' produjo {splitted.shape[1]} columnas en vez de 3")
+        return df
+
+    df[['month', 'day', 'year']] = splitted
+
+    # Rellenar vacíos con "0"
+    df['day'] = df['day'].fillna('0')
+    df['month'] = df['month'].fillna('0')
+    df['year'] = df['year'].fillna('0')
+
+    # Unir a datetime
+    df[col] = pd.to_datetime(df[['day', 'month', 'year']], errors='coerce')
+
+    # Eliminar columnas auxiliares
+    df = df.drop(columns=['day', 'month', 'year'])
+    return df
+
+
+def dist_bache_min(atus, baches, time_col='datetime', lon_col='longitud', lat_col='latitud'):
+    """
+    Versión de la notebook 2.3 (get_baches_activos + get_dist_bache_min con
+    GeoDataFrame.apply), conservada como referencia para proximity_baches.
+    Las geometrías se construyen en METRIC_CRS, como en la notebook.
+    """
+    import geopandas as gpd
+    from config import METRIC_CRS
+    from projection import frame_xy
+
+    ax, ay = frame_xy(atus, lon_col, lat_col)
+    bx, by = frame_xy(baches, 'longitude', 'latitude')
+    acc = gpd.GeoDataFrame({'fecha_acc': atus[time_col].to_numpy()},
+                           geometry=gpd.points_from_xy(ax, ay), crs=METRIC_CRS)
+    baches = gpd.GeoDataFrame(baches[['fecha_reporte', 'fecha_atencion']].reset_index(drop=True),
+                              geometry=gpd.points_from_xy(bx, by), crs=METRIC_CRS)
+
+    def get_baches_activos(acc_row, baches):
+        return baches[
+            (baches['fecha_reporte'] <= acc_row['fecha_acc']) &
+            ((baches['fecha_atencion'].isna()) | (baches['fecha_atencion'] >= acc_row['fecha_acc']))
+        ]
+
+    def get_dist_bache_min(acc_row, baches):
+        baches_activos = get_baches_activos(acc_row, baches)
+        return baches_activos.distance(acc_row.geometry).min()
+
+    return acc.apply(lambda row: get_dist_bache_min(row, baches), axis=1).to_numpy()
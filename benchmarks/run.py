@@ -0,0 +1,366 @@
+"""
+run.py
+
+Mide cada etapa del pipeline con datos sintéticos a varias escalas. Para cada
+(etapa, escala) se generan las entradas con una semilla fija en un directorio
+de trabajo bajo data/interim/benchmarks/, se redirigen las rutas de salida del
+módulo a ese directorio y se mide sólo la llamada a la etapa con
+instrumentation.instrument.
+
+Los resultados se agregan a benchmarks/results/<commit>.jsonl (una línea por
+repetición, con etapa, escala, commit y las métricas de instrumentation), de
+modo que las curvas de escalamiento de distintos commits se pueden comparar
+sin volver a correr nada (ver `compare`).
+
+La etapa `imports` mide el costo de arranque: el tiempo acumulado de importar
+cada módulo de src en un intérprete nuevo (python -X importtime) y el de
+`python src/cli.py --help`, que no debe cargar las dependencias pesadas.
+"""
+
+from benchmarks import generators, referencias, SRC_DIR
+from config import ROOT_DIR, INTERIM_DIR, get_logger
+from instrumentation import instrument
+import os
+import gc
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+WORK_DIR = INTERIM_DIR / "benchmarks"
+
+# Escalas por defecto (registros de la fuente principal de cada etapa)
+ESCALAS = (1_000, 10_000, 100_000)
+SEMILLA = 20240601
+
+CLI_HELP = [str(SRC_DIR / "cli.py"), '--help']
+
+
+def git_commit():
+    """Commit actual (con sufijo -dirty si hay cambios sin guardar)."""
+    try:
+        sha = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'sin-git'
+    return f'{sha}-dirty' if dirty else sha
+
+
+@contextmanager
+def patched(module, **attrs):
+    """Sustituye temporalmente atributos (rutas) de un módulo."""
+    original = {k: getattr(module, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(module, k, v)
+    try:
+        yield module
+    finally:
+        for k, v in original.items():
+            setattr(module, k, v)
+
+
+# Cada etapa recibe (workdir, n, seed), prepara sus entradas y regresa una
+# función sin argumentos que ejecuta sólo la parte que se mide.
+
+def setup_clean_atus(workdir, n, seed):
+    import clean_atus
+
+    paths = generators.write_atus_csvs(workdir / "raw", n, seed)
+    interim, processed = workdir / "interim", workdir / "processed"
+    interim.mkdir(), processed.mkdir()
+
+    def run():
+        with patched(clean_atus, INTERIM_ATUS_DIR=interim, PROCESSED_ATUS_DIR=processed,
+                     ATUS_CLEAN_PATH=processed / clean_atus.ATUS_CLEAN_PATH.name):
+            return clean_atus.process_cleaning_atus(paths)
+    return run
+
+
+def setup_clean_vialidades(workdir, n, seed):
+    import clean_vialidades
+
+    raw = workdir / "raw"
+    generators.write_osm_edges(raw / "edges" / "hermosillo_edges.geojson", n, seed)
+    interim, processed = workdir / "interim", workdir / "processed"
+    interim.mkdir(), processed.mkdir()
+
+    def run():
+        with patched(clean_vialidades, RAW_VIALIDADES_DIR=raw,
+                     INTERIM_VIALIDADES_DIR=interim, PROCESSED_VIALIDADES_DIR=processed,
+                     VIALIDADES_CLEAN_PATH=processed / clean_vialidades.VIALIDADES_CLEAN_PATH.name):
+            return clean_vialidades.process_cleaning_vialidades()
+    return run
+
+
+def setup_clean_colonias(workdir, n, seed):
+    import clean_colonias
+
+    raw = workdir / "raw"
+    generators.write_colonias_shp(raw, n, seed)
+    interim, processed = workdir / "interim", workdir / "processed"
+    interim.mkdir(), processed.mkdir()
+
+    def run():
+        with patched(clean_colonias, COLONIAS_DIR=raw,
+                     INTERIM_COLONIAS_DIR=interim, PROCESSED_COLONIAS_DIR=processed,
+                     COLONIAS_CLEAN_PATH=processed / clean_colonias.COLONIAS_CLEAN_PATH.name):
+            return clean_colonias.process_cleaning_colonias()
+    return run
+
+
+def setup_cleaning_bachometro(workdir, n, seed):
+    import cleaning_data_bachometro
+
+    raw = workdir / "raw"
+    generators.write_bachometro_json(raw, n, seed)
+    dataset = workdir / "processed" / "baches.parquet"
+
+    def run():
+        return cleaning_data_bachometro.main(raw, dataset)
+    return run
+
+
+def setup_fechas_bachometro(workdir, n, seed, parser=None):
+    import cleaning_data_bachometro
+
+    parser = parser or cleaning_data_bachometro.procesar_columna_fecha
+    df = generators.fechas_bachometro(n, seed)
+
+    def run():
+        out = df.copy()
+        for col in ('fecha_reporte', 'fecha_atencion'):
+            out = parser(out, col, cleaning_data_bachometro.MONTH_MAP)
+        return out
+    return run
+
+
+def setup_fechas_bachometro_referencia(workdir, n, seed):
+    return setup_fechas_bachometro(workdir, n, seed, parser=referencias.procesar_columna_fecha)
+
+
+def setup_proximidad(workdir, n, seed):
+    import proximity_baches
+
+    # Proporción aproximada de los datos reales: ~10 baches por accidente
+    baches, atus = generators.clean_frames(n, max(n // 10, 1), seed)
+
+    def run():
+        index = proximity_baches.BachesActivosIndex.from_frame(baches)
+        out = proximity_baches.compute_dist_bache_min(atus, baches, index=index)
+        return proximity_baches.count_baches_cercanos(out, index=index, n_workers=1)
+    return run
+
+
+def setup_catalogo(workdir, n, seed, warm=False):
+    import catalog
+    from schemas import write_dataset
+
+    path = write_dataset(generators.atus_frame(n, seed).rename(columns=str.lower),
+                         workdir / "atus_clean.parquet", 'atus')
+    catalog.clear_cache()
+    if warm:
+        catalog.load('atus', path=path)
+
+    def run():
+        if not warm:
+            catalog.clear_cache()
+        return catalog.load('atus', path=path)
+    return run
+
+
+def setup_catalogo_cache(workdir, n, seed):
+    return setup_catalogo(workdir, n, seed, warm=True)
+
+
+def setup_dist_bache_min(workdir, n, seed):
+    import proximity_baches
+
+    baches, atus = generators.clean_frames(n, max(n // 10, 1), seed)
+
+    def run():
+        return proximity_baches.compute_dist_bache_min(atus, baches)
+    return run
+
+
+def setup_dist_bache_min_referencia(workdir, n, seed):
+    baches, atus = generators.clean_frames(n, max(n // 10, 1), seed)
+
+    def run():
+        return referencias.dist_bache_min(atus, baches)
+    return run
+
+
+ETAPAS = {
+    'clean_atus': setup_clean_atus,
+    'clean_vialidades': setup_clean_vialidades,
+    'clean_colonias': setup_clean_colonias,
+    'cleaning_data_bachometro': setup_cleaning_bachometro,
+    'fechas_bachometro': setup_fechas_bachometro,
+    'fechas_bachometro_referencia': setup_fechas_bachometro_referencia,
+    'proximidad': setup_proximidad,
+    'dist_bache_min': setup_dist_bache_min,
+    'dist_bache_min_referencia': setup_dist_bache_min_referencia,
+    'catalogo': setup_catalogo,
+    'catalogo_cache': setup_catalogo_cache,
+}
+
+# Tamaño relativo de cada etapa respecto a la escala (p. ej. hay muchas
+# menos colonias que registros de ATUS)
+FACTOR_ESCALA = {
+    'clean_atus': 1,
+    'clean_vialidades': 1,
+    'clean_colonias': 0.1,
+    'cleaning_data_bachometro': 1,
+    'fechas_bachometro': 10,
+    'fechas_bachometro_referencia': 10,
+    'proximidad': 1,
+    'dist_bache_min': 1,
+    'dist_bache_min_referencia': 1,
+    'catalogo': 1,
+    'catalogo_cache': 1,
+}
+
+
+def import_modules():
+    return sorted(p.stem for p in SRC_DIR.glob("*.py") if p.stem != '__init__')
+
+
+def python_in_src(args):
+    """Ejecuta un intérprete nuevo con src en el path, como los scripts."""
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT_DIR, capture_output=True, text=True,
+        env={**os.environ, 'PYTHONPATH': str(SRC_DIR)},
+    )
+
+
+def import_time(module):
+    """Tiempo acumulado (s) de importar `module` según python -X importtime."""
+    result = python_in_src(['-X', 'importtime', '-c', f'import {module}'])
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        # Sólo la línea del módulo importado directamente (sin sangría)
+        if name.rstrip() == f' {module}':
+            return int(cumulative) / 1e6
+    raise ValueError(f'{module} no aparece en la salida de -X importtime')
+
+
+def run_import_benchmarks(path, commit, repeat=1):
+    """
+    Mide la importación de cada módulo y el arranque de la CLI. `wall_s`
+    incluye el arranque del intérprete; `import_s` es sólo el del módulo.
+    """
+    targets = [(f'import:{m}', m) for m in import_modules()] + [('cli --help', None)]
+    for name, module in targets:
+        for r in range(repeat):
+            try:
+                with instrument(name, report_path=path, commit=commit, escala=1, n=1,
+                                repeticion=r, semilla=None) as m:
+                    if module is None:
+                        start = time.perf_counter()
+                        result = python_in_src(CLI_HELP)
+                        result.check_returncode()
+                        m.extra['import_s'] = round(time.perf_counter() - start, 4)
+                    else:
+                        m.extra['import_s'] = round(import_time(module), 4)
+            except (ImportError, ValueError, subprocess.CalledProcessError) as e:
+                logger.warning(f'{name}: no se pudo medir ({e})')
+                break
+            logger.info(f'{name}: {m.extra["import_s"]:.3f} s')
+
+
+def results_path(commit):
+    return RESULTS_DIR / f"{commit}.jsonl"
+
+
+def run_benchmarks(stages=None, scales=ESCALAS, repeat=1, seed=SEMILLA):
+    stages = stages or ['imports', *ETAPAS]
+    commit = git_commit()
+    path = results_path(commit)
+    logger.info(f'Benchmarks del commit {commit}: {", ".join(stages)} a escalas {list(scales)}')
+
+    for stage in stages:
+        if stage == 'imports':
+            run_import_benchmarks(path, commit, repeat)
+            continue
+        for scale in scales:
+            n = max(int(scale * FACTOR_ESCALA[stage]), 1)
+            workdir = WORK_DIR / f"{stage}_{n}"
+            shutil.rmtree(workdir, ignore_errors=True)
+            workdir.mkdir(parents=True)
+            try:
+                try:
+                    run = ETAPAS[stage](workdir, n, seed)
+                except ImportError as e:
+                    logger.warning(f'{stage}: se omite, falta una dependencia ({e})')
+                    break
+                for r in range(repeat):
+                    gc.collect()
+                    with instrument(stage, report_path=path, commit=commit, escala=scale,
+                                    n=n, repeticion=r, semilla=seed) as m:
+                        run()
+                    logger.info(f'{stage} n={n} rep={r}: {m.record["wall_s"]:.3f} s')
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    logger.info(f'Resultados guardados en {path.relative_to(ROOT_DIR)}')
+    return path
+
+
+def load_results(results_dir=RESULTS_DIR):
+    paths = sorted(results_dir.glob("*.jsonl"))
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_json(p, lines=True) for p in paths], ignore_index=True)
+
+
+def compare(results_dir=RESULTS_DIR, metric='wall_s'):
+    """
+    Tabla (etapa, escala) × commit con la mediana de la métrica, para trazar
+    curvas de escalamiento o detectar regresiones.
+    """
+    results = load_results(results_dir)
+    if results.empty:
+        return results
+    results = results[results['padre'].isna()]
+    return results.pivot_table(index=['etapa', 'escala'], columns='commit', values=metric, aggfunc='median')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks con datos sintéticos')
+    parser.add_argument('--stages', nargs='*', choices=['imports', *ETAPAS], default=None)
+    parser.add_argument('--scales', nargs='*', type=int, default=list(ESCALAS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=SEMILLA)
+    parser.add_argument('--compare', action='store_true', help='Mostrar la comparación entre commits')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        print(compare().to_string())
+        return
+    run_benchmarks(args.stages, args.scales, args.repeat, args.seed)
+
+
+if __name__ == '__main__':
+    main()
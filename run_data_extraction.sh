@@ -1,13 +1,7 @@
 #!/bin/bash
 
-# Ejecuta todos los scripts de extracción en src
-python src/download_atus.py
-python src/extract_atus.py
-python src/download_colonias.py
-python src/download_clima.py
-python src/extract_colonias.py
-python src/extract_vialidades.py
-python src/extract_bachometro.py
-python src/cleaning_data_bachometro.py
-python src/clean_clima.py
-python src/clean_atus.py
\ No newline at end of file
+# Ejecuta las etapas de extracción y limpieza con el pipeline de src/pipeline.py (vía src/cli.py),
+# que corre en paralelo las fuentes independientes y omite las etapas sin cambios.
+# Se pueden pasar etapas objetivo y opciones, por ejemplo:
+#   ./run_data_extraction.sh atus_clean --force
+python src/cli.py pipeline "$@"
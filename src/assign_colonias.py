@@ -0,0 +1,158 @@
+"""
+assign_colonias.py
+
+Asigna puntos (baches, accidentes) a las colonias de INEGI mediante un índice
+espacial precalculado sobre los polígonos generados por clean_colonias.
+
+Los polígonos se reproyectan una sola vez de CSR_INEGI a EPSG:4326, de modo que
+los puntos se consultan directamente en lon/lat. El índice se guarda en
+data/interim/colonias/colonias_index.pkl y se reutiliza mientras el archivo de
+colonias limpio no cambie.
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from projection import WGS84, reproject
+import pickle
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+COLONIAS_PATH = PROCESSED_DIR / "colonias" / "colonias_hmo.gpkg"
+INDEX_CACHE_PATH = INTERIM_DIR / "colonias" / "colonias_index.pkl"
+
+# Número de puntos por consulta al índice
+BATCH_SIZE = 1_000_000
+
+# Columnas de la colonia que se agregan a cada punto asignado
+COLONIA_COLS = ['cvegeo', 'nom_asen']
+
+
+class ColoniasIndex:
+    """
+    Índice espacial (STRtree) sobre los polígonos de colonias en EPSG:4326.
+
+    Guarda junto al árbol los atributos de cada colonia, así como la firma
+    (ruta, tamaño y mtime) del archivo de origen para invalidar la cache.
+    """
+
+    def __init__(self, gdf, source_signature=None):
+        gdf = reproject(gdf, WGS84).reset_index(drop=True)
+        self.attributes = pd.DataFrame(gdf.drop(columns='geometry'))
+        self.tree = STRtree(np.asarray(gdf.geometry.values))
+        self.source_signature = source_signature
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def query(self, lon, lat, batch_size=BATCH_SIZE):
+        """
+        Regresa, para cada punto, la posición de la colonia que lo contiene
+        (-1 si el punto no cae en ninguna colonia o tiene coordenadas nulas).
+        """
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+        result = np.full(len(lon), -1, dtype='int64')
+
+        for start in range(0, len(lon), batch_size):
+            stop = start + batch_size
+            points = shapely.points(lon[start:stop], lat[start:stop])
+            point_idx, poly_idx = self.tree.query(points, predicate='within')
+
+            # Si un punto cae en dos polígonos (traslape), se conserva el primero
+            _, first = np.unique(point_idx, return_index=True)
+            result[start + point_idx[first]] = poly_idx[first]
+
+        return result
+
+    def assign(self, df, lon_col='longitude', lat_col='latitude', cols=COLONIA_COLS):
+        """
+        Agrega a df las columnas `cols` de la colonia que contiene cada punto.
+        """
+        positions = self.query(df[lon_col].to_numpy(), df[lat_col].to_numpy())
+        found = positions >= 0
+
+        df = df.copy()
+        for col in cols:
+            values = self.attributes[col].to_numpy()
+            assigned = pd.Series(pd.NA, index=df.index, dtype='object')
+            assigned[found] = values[positions[found]]
+            df[col] = assigned
+
+        logger.info(f'Puntos asignados a colonia: {found.sum()} de {len(df)}')
+        return df
+
+
+def get_source_signature(path):
+    stat = path.stat()
+    return (str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def save_index(index, cache_path=INDEX_CACHE_PATH):
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info(f'Índice de colonias guardado en: {cache_path.relative_to(ROOT_DIR)}')
+
+
+def load_cached_index(source_path, cache_path=INDEX_CACHE_PATH):
+    """
+    Carga el índice desde disco si existe y corresponde al archivo de origen actual.
+    """
+    if not cache_path.exists():
+        return None
+
+    try:
+        with open(cache_path, 'rb') as f:
+            index = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+        logger.warning(f'No se pudo leer el índice en cache: {e}')
+        return None
+
+    if index.source_signature != get_source_signature(source_path):
+        logger.info('El archivo de colonias cambió, se reconstruirá el índice.')
+        return None
+
+    return index
+
+
+def build_colonias_index(source_path=COLONIAS_PATH, cache_path=INDEX_CACHE_PATH, rebuild=False):
+    """
+    Regresa el índice de colonias, usando la versión en cache cuando es válida.
+    """
+    start = datetime.now()
+
+    if not rebuild:
+        index = load_cached_index(source_path, cache_path)
+        if index is not None:
+            logger.info(f'Índice de colonias cargado desde cache ({len(index)} colonias)')
+            return index
+
+    logger.info(f'Construyendo índice de colonias desde {source_path.relative_to(ROOT_DIR)}')
+    gdf = gpd.read_file(source_path)
+    index = ColoniasIndex(gdf, source_signature=get_source_signature(source_path))
+    save_index(index, cache_path)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Índice de colonias construido en {elapsed:.2f} s ({len(index)} colonias)')
+    return index
+
+
+def assign_colonias(df, lon_col='longitude', lat_col='latitude', cols=COLONIA_COLS, index=None):
+    """
+    Asigna a cada registro de df la colonia INEGI que contiene sus coordenadas.
+    """
+    if index is None:
+        index = build_colonias_index()
+    return index.assign(df, lon_col=lon_col, lat_col=lat_col, cols=cols)
+
+
+if __name__ == '__main__':
+    build_colonias_index(rebuild=True)
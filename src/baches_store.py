@@ -0,0 +1,225 @@
+"""
+baches_store.py
+
+Tabla consolidada de baches con un registro por `id` del Bachómetro, que se
+actualiza con upserts en lugar de volver a concatenar todos los años.
+
+Cada carga compara el hash de cada registro limpio (cleaning_data_bachometro)
+con el guardado en el índice (id, hash, partición): sólo los baches nuevos o
+modificados se escriben, y sólo se reescriben las particiones (año de
+fecha_reporte) que los contienen. Cada diferencia se agrega al historial de
+cambios (por ejemplo, cuando se llena fecha_atencion al atenderse un bache).
+
+Estructura en data/processed/bachometro/:
+    baches_store/anio=<año>/part-0.parquet   registros vigentes
+    baches_indice.parquet                     id, hash y partición de cada bache
+    baches_historial/<marca>.parquet          cambios de cada carga
+"""
+
+from config import ROOT_DIR, get_logger
+from cleaning_data_bachometro import BACHES_DIR, ESQUEMA, load_baches
+from schemas import read_dataset, astype_schema, to_text
+from instrumentation import instrument, instrumented
+import shutil
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+STORE_PATH = BACHES_DIR / "baches_store"
+INDICE_PATH = BACHES_DIR / "baches_indice.parquet"
+HISTORIAL_DIR = BACHES_DIR / "baches_historial"
+
+# Columnas cuyo cambio cuenta como modificación del bache
+VALUE_COLS = [c for c in ESQUEMA if c != 'id']
+
+# Partición de los baches sin fecha de reporte
+SIN_ANIO = 0
+
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df[VALUE_COLS], index=False).to_numpy()
+
+
+def partition_of(df):
+    return df['fecha_reporte'].dt.year.fillna(SIN_ANIO).astype('int64').to_numpy()
+
+
+def partition_file(anio, store_path=STORE_PATH):
+    return store_path / f"anio={anio}" / "part-0.parquet"
+
+
+def prepare(baches):
+    """
+    Ajusta los registros a ESQUEMA y deja uno por id: el de fecha_atencion y
+    fecha_reporte más recientes (las nulas cuentan como las más antiguas) y,
+    en empate, el del archivo de origen (`fuente`) más reciente, sin depender
+    del orden en que se leyeron las particiones.
+    """
+    fuente = to_text(baches['fuente']).to_numpy() if 'fuente' in baches.columns else None
+    baches = astype_schema(baches.reindex(columns=list(ESQUEMA)), ESQUEMA)
+
+    claves = baches[['fecha_atencion', 'fecha_reporte']].reset_index(drop=True)
+    if fuente is not None:
+        claves['fuente'] = fuente
+    orden = claves.sort_values(list(claves.columns), na_position='first', kind='stable').index
+    baches = baches.iloc[orden]
+    return baches.drop_duplicates(subset='id', keep='last').reset_index(drop=True)
+
+
+def load_index(path=INDICE_PATH):
+    if not path.exists():
+        return pd.DataFrame({'id': pd.Series(dtype='int64'), 'hash': pd.Series(dtype='uint64'),
+                             'anio': pd.Series(dtype='int64')})
+    return pd.read_parquet(path)
+
+
+def read_partition(anio, store_path=STORE_PATH):
+    path = partition_file(anio, store_path)
+    if not path.exists():
+        return prepare(pd.DataFrame(columns=list(ESQUEMA)))
+    # prepare agrega como nulas las columnas que no existían al escribirse
+    return prepare(pd.read_parquet(path))
+
+
+def write_partition(df, anio, store_path=STORE_PATH):
+    """Reemplaza la partición completa de forma atómica (o la borra si queda vacía)."""
+    path = partition_file(anio, store_path)
+    if df.empty:
+        shutil.rmtree(path.parent, ignore_errors=True)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Oculto para pyarrow: un temporal huérfano no se lee como parte del dataset
+    tmp = path.with_name(f".{path.name}.tmp")
+    df.sort_values('id').to_parquet(tmp, index=False)
+    tmp.replace(path)
+
+
+def diff_records(old, new, marca):
+    """
+    Historial en formato largo: una fila por (id, columna) que cambió, con los
+    valores como texto. Las altas se registran con columna nula.
+    """
+    cambios = []
+    nuevos = new[~new['id'].isin(old['id'])]
+    if len(nuevos):
+        cambios.append(pd.DataFrame({'id': nuevos['id'].to_numpy(), 'tipo': 'alta'}))
+
+    old = old.set_index('id')
+    modificados = new[new['id'].isin(old.index)].set_index('id')
+    old = old.loc[modificados.index]
+    for col in VALUE_COLS:
+        antes, despues = old[col], modificados[col]
+        distinto = ~((antes == despues).fillna(False) | (antes.isna() & despues.isna()))
+        if distinto.any():
+            cambios.append(pd.DataFrame({
+                'id': modificados.index[distinto.to_numpy()],
+                'tipo': 'modificacion',
+                'columna': col,
+                'valor_anterior': to_text(antes[distinto]).to_numpy(),
+                'valor_nuevo': to_text(despues[distinto]).to_numpy(),
+            }))
+
+    if not cambios:
+        return None
+    historial = pd.concat(cambios, ignore_index=True)
+    historial.insert(1, 'actualizado', marca)
+    return historial.reindex(columns=['id', 'actualizado', 'tipo', 'columna', 'valor_anterior', 'valor_nuevo'])
+
+
+def upsert(baches, store_path=STORE_PATH, indice_path=INDICE_PATH, historial_dir=HISTORIAL_DIR):
+    """
+    Inserta o actualiza los registros de `baches` por id. Regresa un resumen
+    con el número de altas, modificaciones y registros sin cambios, y las
+    particiones reescritas.
+    """
+    marca = pd.Timestamp(datetime.now())
+    baches = prepare(baches)
+    baches['hash'] = row_hashes(baches)
+    baches['anio'] = partition_of(baches)
+
+    # Posición de cada id en el índice (-1 si es nuevo, que apunta al hash 0 agregado al final)
+    indice = load_index(indice_path)
+    pos = pd.Index(indice['id']).get_indexer(baches['id'])
+    es_nuevo = pos == -1
+    hash_prev = np.append(indice['hash'].to_numpy(), np.uint64(0))[pos]
+    cambio = es_nuevo | (baches['hash'].to_numpy() != hash_prev)
+    upserts = baches[cambio]
+
+    # Particiones donde entra una versión nueva o de donde sale la anterior
+    anios_previos = indice['anio'].to_numpy()[pos[cambio & ~es_nuevo]]
+    afectadas = sorted(set(upserts['anio']) | set(anios_previos))
+
+    anteriores = [prepare(pd.DataFrame(columns=list(ESQUEMA)))]
+    ids = upserts['id']
+    for anio in afectadas:
+        actual = read_partition(anio, store_path)
+        anteriores.append(actual[actual['id'].isin(ids)])
+        entran = upserts.loc[upserts['anio'] == anio, list(ESQUEMA)]
+        write_partition(pd.concat([actual[~actual['id'].isin(ids)], entran], ignore_index=True),
+                        anio, store_path)
+
+    # Historial: se compara contra la versión anterior de cada bache modificado
+    historial = diff_records(pd.concat(anteriores, ignore_index=True), upserts[list(ESQUEMA)], marca)
+    if historial is not None:
+        historial_dir.mkdir(parents=True, exist_ok=True)
+        historial.to_parquet(historial_dir / f"{marca:%Y%m%dT%H%M%S%f}.parquet", index=False)
+
+    # Índice actualizado (pequeño: se reescribe completo)
+    indice = pd.concat([indice[~indice['id'].isin(ids)], upserts[['id', 'hash', 'anio']]], ignore_index=True)
+    indice_path.parent.mkdir(parents=True, exist_ok=True)
+    indice.sort_values('id').to_parquet(indice_path, index=False)
+
+    resumen = {
+        'altas': int(es_nuevo.sum()),
+        'modificaciones': int((cambio & ~es_nuevo).sum()),
+        'sin_cambios': int((~cambio).sum()),
+        'particiones': [int(a) for a in afectadas],
+    }
+    logger.info(f'Upsert de baches: {resumen}')
+    return resumen
+
+
+def load_store(columns=None, anios=None, store_path=STORE_PATH):
+    """Registros vigentes, opcionalmente sólo de algunos años de reporte."""
+    filters = [('anio', 'in', list(anios))] if anios is not None else None
+    return read_dataset(store_path, 'baches', columns=columns, filters=filters)
+
+
+def load_historial(historial_dir=HISTORIAL_DIR, columna=None):
+    """Historial de cambios; p. ej. columna='fecha_atencion' para las atenciones."""
+    paths = sorted(historial_dir.glob("*.parquet"))
+    if not paths:
+        return pd.DataFrame(columns=['id', 'actualizado', 'tipo', 'columna', 'valor_anterior', 'valor_nuevo'])
+    historial = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    if columna is not None:
+        historial = historial[historial['columna'] == columna]
+    return historial
+
+
+@instrumented('process_baches_store')
+def process_baches_store():
+    start = datetime.now()
+    logger.info('Inicia la actualización de la tabla consolidada de baches')
+
+    with instrument('cargar_limpios') as m:
+        baches = load_baches()
+        m.rows_out(len(baches))
+
+    with instrument('upsert') as m:
+        m.rows_in(len(baches))
+        resumen = upsert(baches)
+        m.rows_out(resumen['altas'] + resumen['modificaciones'])
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Actualización de baches completada en {elapsed:.2f} s')
+    logger.info(f'Tabla guardada en {STORE_PATH.relative_to(ROOT_DIR)}')
+    return resumen
+
+
+if __name__ == '__main__':
+    process_baches_store()
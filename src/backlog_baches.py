@@ -0,0 +1,153 @@
+"""
+backlog_baches.py
+
+Construye la serie diaria de baches activos (reportados y aún no atendidos),
+para toda la ciudad o agrupada por colonia, tipo de vialidad u otra columna.
+
+Un bache cuenta como activo el día d si fecha_reporte <= d y fecha_atencion es
+nula o >= d. En lugar de filtrar la tabla por cada día, cada bache aporta un
+evento +1 en su fecha de reporte y un -1 el día siguiente a su atención; la
+serie es la suma acumulada de esos eventos ordenados (línea de barrido). Los
+baches con fecha_atencion anterior a fecha_reporte nunca cumplen la regla y se
+descartan; los valores nulos del grupo forman su propio grupo.
+
+El tipo de vialidad no viene en los datos del Bachómetro: se toma del tramo
+asociado a cada bache por map_matching.
+
+Guarda los resultados en data/processed/backlog/
+"""
+
+from config import ROOT_DIR, PROCESSED_DIR, get_logger
+from proximity_baches import load_baches
+from pathlib import Path
+from datetime import datetime
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+PROCESSED_BACKLOG_DIR = PROCESSED_DIR / "backlog"
+
+
+def backlog_events(baches, by=None):
+    """
+    Eventos de la línea de barrido: +1 al reportar, -1 al día siguiente de la
+    atención. Se omiten los baches sin reporte y los atendidos antes de ser
+    reportados.
+    """
+    reporte = pd.to_datetime(baches['fecha_reporte'], errors='coerce').dt.normalize()
+    atencion = pd.to_datetime(baches['fecha_atencion'], errors='coerce').dt.normalize()
+
+    invertidos = (atencion < reporte).to_numpy()
+    if invertidos.any():
+        logger.warning(f'{int(invertidos.sum())} baches con fecha_atencion anterior a fecha_reporte, se omiten')
+    valid = reporte.notna().to_numpy() & ~invertidos
+
+    altas = pd.DataFrame({'fecha': reporte[valid], 'delta': 1})
+    cerrados = valid & atencion.notna().to_numpy()
+    bajas = pd.DataFrame({'fecha': atencion[cerrados] + pd.Timedelta(days=1), 'delta': -1})
+
+    if by is not None:
+        altas[by] = baches.loc[valid, by].to_numpy()
+        bajas[by] = baches.loc[cerrados, by].to_numpy()
+
+    return pd.concat([altas, bajas], ignore_index=True)
+
+
+def backlog_series(baches, by=None, start=None, end=None):
+    """
+    Serie diaria de baches activos. Sin `by` regresa una tabla (fecha,
+    baches_activos) con todos los días del rango; con `by` regresa una tabla
+    larga (fecha, by, baches_activos) que omite los días sin baches activos
+    en el grupo.
+    """
+    events = backlog_events(baches, by)
+    if events.empty:
+        return pd.DataFrame(columns=['fecha', 'baches_activos'])
+
+    start = pd.Timestamp(start) if start is not None else events['fecha'].min()
+    end = pd.Timestamp(end) if end is not None else events['fecha'].max()
+    dates = pd.date_range(start, end, freq='D')
+
+    # Los eventos anteriores al inicio se acumulan en el primer día
+    events['fecha'] = events['fecha'].clip(lower=start)
+    events = events[events['fecha'] <= end]
+
+    if by is None:
+        deltas = events.groupby('fecha', sort=True)['delta'].sum()
+        series = deltas.reindex(dates, fill_value=0).cumsum().astype('int32')
+        series.index.name = 'fecha'
+        return series.rename('baches_activos').reset_index()
+
+    # Los grupos se manejan por código (con los nulos como un grupo más), ya
+    # que una etiqueta nula no sobrevive al unstack/stack
+    codes, groups = pd.factorize(events[by], use_na_sentinel=False)
+    events['_grupo'] = codes
+    deltas = events.groupby(['_grupo', 'fecha'], sort=True)['delta'].sum()
+
+    wide = deltas.unstack('_grupo', fill_value=0).reindex(dates, fill_value=0)
+    wide = wide.cumsum().astype('int32')
+    wide.index.name = 'fecha'
+
+    long = wide.stack().rename('baches_activos').reset_index()
+    long = long[long['baches_activos'] > 0].reset_index(drop=True)
+    long[by] = pd.Categorical(pd.Index(groups).take(long['_grupo'].to_numpy()))
+    return long[['fecha', by, 'baches_activos']]
+
+
+def add_tipo_vialidad(baches):
+    """
+    Agrega a `baches` el tipo de vialidad del tramo asociado por map_matching
+    (nulo si el bache no quedó asociado a ningún tramo).
+    """
+    from map_matching import MATCHES_PATH, TRAMO_KEY, build_tramos_index
+
+    if not MATCHES_PATH.exists():
+        raise FileNotFoundError(f'No existe {MATCHES_PATH.relative_to(ROOT_DIR)}; ejecutar antes map_matching')
+
+    matches = pd.read_parquet(MATCHES_PATH, columns=['fuente', 'id_registro', *TRAMO_KEY])
+    matches = matches[matches['fuente'] == 'baches'].dropna(subset=TRAMO_KEY)
+    matches = matches.astype({c: 'int64' for c in TRAMO_KEY})
+    tipos = build_tramos_index().attributes.set_index(TRAMO_KEY)['tipo_vialidad'].astype(object)
+    # Los tramos que ya no existen en vialidades quedan sin tipo
+    tipo = matches.join(tipos, on=TRAMO_KEY).set_index('id_registro')['tipo_vialidad']
+    tipo = tipo.reindex(baches['id'].to_numpy())
+    found = tipo.notna().to_numpy()
+
+    baches = baches.copy()
+    baches['tipo_vialidad'] = pd.Categorical(tipo.to_numpy())
+    logger.info(f'Tipo de vialidad asignado a {int(found.sum())} de {len(baches)} baches')
+    return baches
+
+
+def process_backlog_baches(group_cols=('colonia', 'tipo_vialidad')):
+    start = datetime.now()
+    logger.info('Inicia la construcción de la serie diaria de baches activos')
+
+    baches = load_baches()
+    if 'tipo_vialidad' in group_cols:
+        baches = add_tipo_vialidad(baches)
+    PROCESSED_BACKLOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    outputs = []
+    path = PROCESSED_BACKLOG_DIR / "backlog_diario.parquet"
+    backlog_series(baches).to_parquet(path, index=False)
+    outputs.append(path)
+
+    for col in group_cols:
+        if col not in baches.columns:
+            raise KeyError(f'Columna {col} no disponible en los datos de baches')
+        path = PROCESSED_BACKLOG_DIR / f"backlog_diario_{col}.parquet"
+        backlog_series(baches, by=col).to_parquet(path, index=False)
+        outputs.append(path)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Serie diaria de baches activos completada en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_BACKLOG_DIR.relative_to(ROOT_DIR)}')
+
+    return outputs
+
+
+if __name__ == '__main__':
+    process_backlog_baches()
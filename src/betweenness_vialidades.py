@@ -0,0 +1,226 @@
+"""
+betweenness_vialidades.py
+
+Calcula la centralidad de intermediación (edge betweenness) aproximada de la
+red vial de Hermosillo como proxy de la exposición al tráfico de cada tramo.
+
+La intermediación exacta requiere un recorrido de Dijkstra desde cada nodo del
+grafo sin simplificar, lo cual no es práctico. En su lugar se usa el algoritmo
+de Brandes desde una muestra de `k` nodos fuente, repartida en un pool de
+procesos, y se reescala la suma por n/k. El grafo se convierte a arreglos CSR
+(ponderados por longitud) para enviarlo una sola vez a cada proceso.
+
+El resultado se guarda en cache en data/interim/vialidades/ con el hash del
+grafo, el tamaño de la muestra y la semilla, y se une a los tramos de
+clean_vialidades por (u, v, key).
+
+Guarda los resultados en data/processed/vialidades/
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from extract_vialidades import download_hmo_roads
+from clean_vialidades import PROCESSED_VIALIDADES_DIR, save_geo_data
+import os
+import hashlib
+import heapq
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+BETWEENNESS_CACHE_DIR = INTERIM_DIR / "vialidades"
+VIALIDADES_PATH = PROCESSED_DIR / "vialidades" / "vialidades_hmo.gpkg"
+
+# Parámetros por defecto
+N_FUENTES = 1000
+LOTE = 25
+SEMILLA = 20240601
+EDGE_KEYS = ['u', 'v', 'key']
+
+
+class RoadGraph:
+    """
+    Grafo dirigido en formato CSR. Entre aristas paralelas (u, v) sólo se
+    conserva la más corta, que es la única que puede estar en un camino mínimo.
+    """
+
+    def __init__(self, edges):
+        edges = edges.sort_values('length').drop_duplicates(['u', 'v'], keep='first')
+
+        self.nodes, codes = np.unique(np.concatenate([edges['u'], edges['v']]), return_inverse=True)
+        src, dst = codes[:len(edges)], codes[len(edges):]
+
+        order = np.lexsort((dst, src))
+        self.edges = edges.iloc[order][EDGE_KEYS].reset_index(drop=True)
+        self.indices = dst[order]
+        self.weights = edges['length'].to_numpy(dtype='float64')[order]
+        self.indptr = np.searchsorted(src[order], np.arange(len(self.nodes) + 1))
+
+    @classmethod
+    def from_osmnx(cls, G, weight='length'):
+        edges = pd.DataFrame(
+            [(u, v, k, d) for u, v, k, d in G.edges(keys=True, data=weight, default=1.0)],
+            columns=EDGE_KEYS + ['length'],
+        )
+        return cls(edges)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    def signature(self):
+        """Hash del grafo (aristas y longitudes) para la cache."""
+        h = pd.util.hash_pandas_object(
+            self.edges.assign(length=self.weights), index=False
+        ).to_numpy()
+        return hashlib.sha1(h.tobytes()).hexdigest()[:16]
+
+    def accumulate(self, source, betweenness):
+        """
+        Un paso de Brandes: Dijkstra desde `source` y acumulación de la
+        dependencia de cada arista sobre el arreglo `betweenness`.
+        """
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        n = self.n_nodes
+
+        dist = np.full(n, np.inf)
+        sigma = np.zeros(n)
+        preds = [[] for _ in range(n)]
+        order = []
+
+        dist[source] = 0.0
+        sigma[source] = 1.0
+        heap = [(0.0, source)]
+        done = np.zeros(n, dtype=bool)
+
+        while heap:
+            d, v = heapq.heappop(heap)
+            if done[v]:
+                continue
+            done[v] = True
+            order.append(v)
+            for e in range(indptr[v], indptr[v + 1]):
+                w = indices[e]
+                nd = d + weights[e]
+                if nd < dist[w]:
+                    dist[w] = nd
+                    sigma[w] = sigma[v]
+                    preds[w] = [(v, e)]
+                    heapq.heappush(heap, (nd, w))
+                elif nd == dist[w]:
+                    sigma[w] += sigma[v]
+                    preds[w].append((v, e))
+
+        delta = np.zeros(n)
+        for w in reversed(order):
+            coeff = (1.0 + delta[w]) / sigma[w]
+            for v, e in preds[w]:
+                c = sigma[v] * coeff
+                betweenness[e] += c
+                delta[v] += c
+
+    def sources_betweenness(self, sources):
+        betweenness = np.zeros(len(self.indices))
+        for s in sources:
+            self.accumulate(s, betweenness)
+        return betweenness
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _run_batch(sources):
+    return _worker_graph.sources_betweenness(sources)
+
+
+def approximate_edge_betweenness(graph, k=N_FUENTES, seed=SEMILLA, batch_size=LOTE, n_workers=None):
+    """
+    Intermediación aproximada de cada arista del grafo, normalizada por
+    n(n-1) como en networkx. Con k >= n el resultado es exacto.
+    """
+    n = graph.n_nodes
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(n, k, replace=False) if k < n else np.arange(n)
+    batches = [sources[i:i + batch_size] for i in range(0, k, batch_size)]
+
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        results = [graph.sources_betweenness(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(graph,)) as executor:
+            results = list(executor.map(_run_batch, batches))
+
+    total = np.sum(results, axis=0)
+    scale = n / k / (n * (n - 1)) if n > 1 else 0.0
+    return graph.edges.assign(betweenness=total * scale)
+
+
+def cache_path(signature, k, seed):
+    return BETWEENNESS_CACHE_DIR / f"betweenness_{signature}_k{k}_s{seed}.parquet"
+
+
+def compute_betweenness(G=None, k=N_FUENTES, seed=SEMILLA, n_workers=None, rebuild=False):
+    """
+    Regresa la tabla (u, v, key, betweenness), usando la cache del grafo cuando existe.
+    """
+    start = datetime.now()
+    G = G if G is not None else download_hmo_roads(simplify=False)
+    graph = RoadGraph.from_osmnx(G)
+
+    path = cache_path(graph.signature(), k, seed)
+    if path.exists() and not rebuild:
+        logger.info(f'Intermediación cargada desde cache: {path.relative_to(ROOT_DIR)}')
+        return pd.read_parquet(path)
+
+    logger.info(f'Calculando intermediación: {graph.n_nodes} nodos, {len(graph.indices)} aristas, k={k}')
+    result = approximate_edge_betweenness(graph, k=k, seed=seed, n_workers=n_workers)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    result.to_parquet(path, index=False)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Intermediación calculada en {elapsed:.2f} s')
+    return result
+
+
+def join_betweenness(vialidades, betweenness):
+    """
+    Agrega la columna `betweenness` a los tramos; las aristas paralelas que no
+    son la más corta entre sus nodos quedan con 0.
+    """
+    keys = vialidades[EDGE_KEYS].astype('int64')
+    b = betweenness.astype({c: 'int64' for c in EDGE_KEYS})
+    merged = keys.merge(b, on=EDGE_KEYS, how='left')
+    vialidades = vialidades.copy()
+    vialidades['betweenness'] = merged['betweenness'].fillna(0).to_numpy(dtype='float32')
+    return vialidades
+
+
+def process_betweenness_vialidades(k=N_FUENTES, seed=SEMILLA, n_workers=None):
+    start = datetime.now()
+    logger.info('Inicia el cálculo de intermediación de la red vial')
+
+    betweenness = compute_betweenness(k=k, seed=seed, n_workers=n_workers)
+    vialidades = join_betweenness(gpd.read_file(VIALIDADES_PATH), betweenness)
+    gpkg_path, geojson_path = save_geo_data(vialidades, PROCESSED_VIALIDADES_DIR, 'vialidades_hmo_centralidad')
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Intermediación de la red vial completada en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_VIALIDADES_DIR.relative_to(ROOT_DIR)}')
+    return gpkg_path, geojson_path
+
+
+if __name__ == '__main__':
+    process_betweenness_vialidades()
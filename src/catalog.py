@@ -0,0 +1,144 @@
+"""
+catalog.py
+
+Catálogo de los datasets limpios para notebooks y etapas de análisis:
+
+    from catalog import load
+    atus = load('atus', columns=['datetime', 'x', 'y'])
+    baches = load('baches', filters=[('anio', '>=', 2022)])
+
+Cada nombre apunta a la copia Parquet que escribe su etapa de limpieza (ver
+schemas.py), que se lee con memory mapping, sólo con las columnas pedidas y
+con los filtros de filas de pyarrow (que descartan grupos de filas y, en el
+dataset de baches, particiones completas antes de leerlas). El resultado se
+guarda en una cache LRU del proceso; cargar de nuevo el mismo dataset con la
+misma proyección sólo cuesta revisar la firma de sus archivos:
+
+* validate='mtime' (por defecto): ruta, tamaño y fecha de modificación,
+* validate='hash': SHA-1 del contenido, para copias o sincronizaciones que no
+  conservan la fecha de modificación.
+
+Si la firma cambió, la entrada se descarta y el dataset se vuelve a leer.
+Cada llamada regresa una copia completa (df.copy()): sin copy-on-write, que
+no es el modo por omisión de pandas 2, modificar una copia superficial
+alteraría la entrada de la cache. Copiar en memoria sigue siendo mucho más
+barato que volver a leer el Parquet.
+
+Los archivos y directorios que empiezan con '.' o '_' (temporales de una
+escritura en curso o interrumpida) no forman parte del dataset, igual que
+para pyarrow.
+"""
+
+from config import ROOT_DIR, get_logger
+from schemas import read_dataset
+import hashlib
+import importlib
+from pathlib import Path
+from collections import OrderedDict
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Nombre -> ('modulo:CONSTANTE' con la ruta, esquema). Las rutas se resuelven al
+# cargar, para no importar geopandas con el catálogo.
+DATASETS = {
+    'atus': ('clean_atus:ATUS_CLEAN_PATH', 'atus'),
+    'baches': ('baches_store:STORE_PATH', 'baches'),
+    'clima': ('clean_clima:HOURLY_PATH', 'clima'),
+    'colonias': ('clean_colonias:COLONIAS_CLEAN_PATH', 'colonias'),
+    'vialidades': ('clean_vialidades:VIALIDADES_CLEAN_PATH', 'vialidades'),
+}
+
+# Entradas (dataset, columnas, filtros) que se conservan en memoria
+CACHE_SIZE = 16
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+_cache = OrderedDict()
+_stats = {'aciertos': 0, 'fallos': 0}
+
+
+def dataset_path(name):
+    if name not in DATASETS:
+        raise KeyError(f'Dataset desconocido: {name}. Disponibles: {sorted(DATASETS)}')
+    module_name, attr = DATASETS[name][0].split(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def dataset_files(path):
+    """Archivos Parquet de un archivo o de un dataset particionado (sin ocultos)."""
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*.parquet")
+                      if not any(part.startswith(('.', '_')) for part in p.relative_to(path).parts))
+    return [path] if path.exists() else []
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_signature(path, validate='mtime'):
+    """Firma de los archivos de un dataset; cambia si alguno se modifica."""
+    files = dataset_files(path)
+    if not files:
+        raise FileNotFoundError(f'No existe el dataset {path}')
+    if validate == 'hash':
+        return tuple((str(p), file_sha1(p)) for p in files)
+    if validate == 'mtime':
+        return tuple((str(p), s.st_size, s.st_mtime_ns) for p, s in ((p, p.stat()) for p in files))
+    raise ValueError(f"validate debe ser 'mtime' o 'hash', no {validate!r}")
+
+
+def cache_key(name, path, columns, filters):
+    columns = None if columns is None else tuple(columns)
+    filters = None if filters is None else repr(filters)
+    return (name, str(path), columns, filters)
+
+
+def load(name, columns=None, filters=None, path=None, validate='mtime', cache=True):
+    """
+    Dataset `name` con su esquema, opcionalmente sólo con `columns` y las
+    filas que cumplen `filters` (formato de pyarrow, p. ej.
+    [('anio', 'in', [2022, 2023])]). `path` sustituye la ruta del catálogo.
+    """
+    path = Path(path) if path is not None else dataset_path(name)
+    schema = DATASETS[name][1] if name in DATASETS else name
+    signature = source_signature(path, validate)
+    key = cache_key(name, path, columns, filters)
+
+    entry = _cache.get(key) if cache else None
+    if entry is not None and entry[0] == signature:
+        _cache.move_to_end(key)
+        _stats['aciertos'] += 1
+        return entry[1].copy()
+
+    _stats['fallos'] += 1
+    df = read_dataset(path, schema, columns=columns, filters=filters, memory_map=True)
+    shown = path.relative_to(ROOT_DIR) if path.is_relative_to(ROOT_DIR) else path
+    logger.debug(f'{name}: {len(df)} filas leídas de {shown}')
+
+    if cache:
+        _cache[key] = (signature, df)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return df.copy()
+
+
+def clear_cache(name=None):
+    """Vacía la cache completa o sólo las entradas de un dataset."""
+    for key in [k for k in _cache if name is None or k[0] == name]:
+        del _cache[key]
+
+
+def cache_info():
+    return {**_stats, 'entradas': len(_cache), 'maximo': CACHE_SIZE}
+
+
+def available():
+    """Datasets del catálogo cuyos archivos existen."""
+    return [name for name in DATASETS if dataset_files(dataset_path(name))]
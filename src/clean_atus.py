@@ -9,8 +9,10 @@ El diccionario de datos de referencia: raw/atus/diccionario_de_datos.xlsx
 Guarda los resultados limpios en data/processed/atus/
 """
 
-from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
-from extract_atus import ATUS_DIR
+from config import ROOT_DIR, RAW_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from instrumentation import instrument, instrumented
+from schemas import write_dataset
+from projection import add_xy
 import re
 from pathlib import Path
 from datetime import datetime
@@ -18,12 +20,11 @@ import pandas as pd
 import geopandas as gpd
 from shapely.geometry import box, Point
 
-# Paths
+# Paths (los directorios se crean al ejecutar la limpieza, no al importar)
+ATUS_DIR = RAW_DIR / "atus"
 INTERIM_ATUS_DIR = INTERIM_DIR / "atus"
-INTERIM_ATUS_DIR.mkdir(exist_ok=True)
-
 PROCESSED_ATUS_DIR = PROCESSED_DIR / "atus"
-PROCESSED_ATUS_DIR.mkdir(exist_ok=True)
+ATUS_CLEAN_PATH = PROCESSED_ATUS_DIR / "atus_clean.parquet"
 
 # Logger
 logger = get_logger(Path(__file__).name)
@@ -200,19 +201,26 @@ def filter_urban_data(gdf):
     return filtered
 
 
+@instrumented('process_cleaning_atus')
 def process_cleaning_atus(csv_paths=None):
     start = datetime.now()
     logger.info('Inicia el proceso de limpieza ATUS')
+    INTERIM_ATUS_DIR.mkdir(parents=True, exist_ok=True)
+    PROCESSED_ATUS_DIR.mkdir(parents=True, exist_ok=True)
 
     if not csv_paths:
         csv_paths = get_all_csvs(ATUS_DIR)
         logger.info(f'Se cargarán todos los archivos CSV en {ATUS_DIR.relative_to(ROOT_DIR)}')
 
-    paths_atus_hmo = filter_all_csvs(csv_paths)
+    with instrument('filtrar_hermosillo') as m:
+        m.bytes_in(sum(p.stat().st_size for p in csv_paths))
+        paths_atus_hmo = filter_all_csvs(csv_paths)
 
     # Carga y concatenación
-    dfs = [pd.read_csv(p) for p in paths_atus_hmo]
-    gdf = pd.concat(dfs, ignore_index=True)
+    with instrument('cargar_csvs') as m:
+        dfs = [pd.read_csv(p) for p in paths_atus_hmo]
+        gdf = pd.concat(dfs, ignore_index=True)
+        m.rows_out(len(gdf))
 
     gdf.columns = gdf.columns.str.lower()
     gdf.drop(columns=["edo", "mpio"], inplace=True, errors="ignore")
@@ -227,18 +235,32 @@ def process_cleaning_atus(csv_paths=None):
     )
 
     # Filtrado espacial
-    gdf = filter_urban_data(gdf)
+    with instrument('filtrar_zona_urbana') as m:
+        m.rows_in(len(gdf))
+        gdf = filter_urban_data(gdf)
+        m.rows_out(len(gdf))
 
     # Campos derivados
-    gdf = create_datetime(gdf)
-    gdf = decode_all(gdf)
+    with instrument('decodificar') as m:
+        m.rows_in(len(gdf))
+        gdf = create_datetime(gdf)
+        gdf = decode_all(gdf)
+        m.rows_out(len(gdf))
 
     # Guardado
     clean_csv_path = PROCESSED_ATUS_DIR / "atus_clean.csv"
     clean_geojson_path = PROCESSED_ATUS_DIR / "atus_clean.geojson"
 
-    gdf.to_csv(clean_csv_path, index=False)
-    gdf.to_file(clean_geojson_path, driver="GeoJSON")
+    with instrument('guardar') as m:
+        gdf.to_csv(clean_csv_path, index=False)
+        gdf.to_file(clean_geojson_path, driver="GeoJSON")
+        # Copia tipada para los análisis: lon/lat y x/y proyectadas sustituyen a la geometría
+        atus = add_xy(pd.DataFrame(gdf.drop(columns='geometry')), lon_col, lat_col)
+        write_dataset(atus, ATUS_CLEAN_PATH, 'atus')
+        m.rows_out(len(gdf))
+        m.file_out(clean_csv_path)
+        m.file_out(clean_geojson_path)
+        m.file_out(ATUS_CLEAN_PATH)
 
     elapsed = (datetime.now() - start).total_seconds()
     logger.info(f'Proceso de limpieza ATUS completado en {elapsed:.2f} s')
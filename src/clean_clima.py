@@ -1,110 +1,188 @@
-import pandas as pd
+"""
+clean_clima.py
+
+Limpia los datos horarios de clima descargados por download_clima
+(data/raw/clima/clima_hermosillo.csv).
+
+Genera una tabla horaria indexada por fecha (UTC) con tipos compactos
+(float32/int8) y sus agregados diarios y mensuales precalculados, para que las
+uniones posteriores no tengan que volver a remuestrear.
+
+Guarda los resultados en data/processed/clima/ en formato Parquet.
+"""
+
+from config import ROOT_DIR, RAW_DIR, PROCESSED_DIR, get_logger
+from schemas import apply_schema
+from instrumentation import instrument, instrumented
 from pathlib import Path
-import sys
-
-# ----------------------------------------------------------------------
-# A. ARREGLO DE PATH PARA IMPORTAR MÓDULOS DEL PROYECTO (SRC)
-# Nota: Esta sección es crucial para que el script encuentre 'src.config'.
-# Se asume que el script se ejecuta desde la raíz del proyecto o un nivel inferior.
-# ----------------------------------------------------------------------
-current_dir = Path(__file__).resolve().parent if '__file__' in locals() else Path.cwd()
-project_root = current_dir
-
-# Buscamos la raíz del proyecto (donde está la carpeta 'src')
-for _ in range(5):
-    if (project_root / 'src').is_dir():
-        break
-    project_root = project_root.parent
-else:
-    raise FileNotFoundError("No se pudo encontrar la carpeta 'src'. Verifica la estructura del proyecto.")
-
-# Añadir la raíz del proyecto al path de Python si no está
-if str(project_root) not in sys.path:
-    sys.path.append(str(project_root))
-
-# ----------------------------------------------------------------------
-
-# B. IMPORTAR HERRAMIENTAS Y CONFIGURACIÓN
-# Ahora importamos PROCESSED_DIR en lugar de INTERIM_DIR
-from src.config import RAW_DIR, PROCESSED_DIR, get_logger, init_paths
-
-# Inicializar logger
-logger = get_logger(__name__)
-
-# Asegurar que las carpetas existan
-init_paths()
-
-# Definir la ruta del archivo a cargar y guardar
-INPUT_FILE = RAW_DIR / "clima_hermosillo.csv"
-OUTPUT_FILE = PROCESSED_DIR / "clima_final_processed.csv"
-
-print("Rutas, logger y PATH inicializados correctamente para el procesamiento.")
-# ----------------------------------------------------------------------
-# C. LÓGICA DE CARGA Y LIMPIEZA DE DATOS
-# ----------------------------------------------------------------------
-
-df_clima = pd.DataFrame()
-
-# 1. Cargar el archivo CSV
-try:
-    df_clima = pd.read_csv(INPUT_FILE)
-    print(f"Dataset cargado exitosamente. Filas: {len(df_clima)}, Columnas: {len(df_clima.columns)}")
-
-except FileNotFoundError:
-    logger.error(f"ERROR: El archivo no fue encontrado en la ruta: {INPUT_FILE}")
-    logger.error("Asegúrate de haber ejecutado previamente el script 'download_clima.py'.")
-except Exception as e:
-    logger.error(f"Error al cargar el CSV: {e}")
-
-
-if not df_clima.empty:
-
-    # 2. Conversión a Datetime e Índice
-    df_clima['date'] = pd.to_datetime(df_clima['date'])
-    df_clima = df_clima.set_index('date')
-    print("Columna 'date' convertida a tipo datetime y establecida como índice.")
-
-    # 3. Revisión e Imputación de Nulos (ffill)
-    nulos_por_columna = df_clima.isnull().sum()
-    nulos_existentes = nulos_por_columna[nulos_por_columna > 0]
-
-    if not nulos_existentes.empty:
-        logger.warning("Se encontraron nulos. Aplicando imputación 'ffill'.")
-        df_clima.fillna(method='ffill', inplace=True)
-        print(f"Nulos restantes: {df_clima.isnull().sum().sum()}")
-    else:
-        print("No se detectaron valores nulos. La integridad es buena.")
-
-    # 4. Definición del mapeo y Renombrar columnas
-    columnas_renombrar = {
-        'temperature_2m': 'temperatura',
-        'precipitation': 'precipitacion',
-        'weather_code': 'codigo_clima',
-        'is_day': 'es_de_dia',
-        'relative_humidity_2m': 'humedad',
-        'cloud_cover': 'nubosidad',
-        'wind_speed_10m': 'velocidad_viento'
-    }
-    df_clima.rename(columns=columnas_renombrar, inplace=True)
-    print("Columnas renombradas a español.")
-
-    # 5. Redondear valores numéricos
-    columnas_a_redondear = ['temperatura', 'precipitacion', 'humedad', 'nubosidad', 'velocidad_viento']
-
-    for col in columnas_a_redondear:
-        if col in df_clima.columns:
-            df_clima[col] = df_clima[col].round(1)
-
-    print("Valores numéricos redondeados a un decimal para estandarización.")
-
-    # 6. Guardar el DataFrame PROCESADO
-    try:
-        df_clima.to_csv(OUTPUT_FILE)
-        print("\n--- Inspección Final ---")
-        print(f"Dataset de clima PROCESADO guardado exitosamente en: {OUTPUT_FILE}")
-        print(f"Columnas finales y dtypes:\n{df_clima.dtypes}")
-    except Exception as e:
-        logger.error(f"Error al guardar el archivo: {e}")
-
-else:
-    logger.error("Procesamiento finalizado sin guardar archivo porque el DataFrame está vacío.")
\ No newline at end of file
+from datetime import datetime
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths (mismo archivo que escribe download_clima, sin importar su cliente HTTP)
+RAW_DATA_PATH = RAW_DIR / "clima" / "clima_hermosillo.csv"
+PROCESSED_CLIMA_DIR = PROCESSED_DIR / "clima"
+
+HOURLY_PATH = PROCESSED_CLIMA_DIR / "clima_final_processed.parquet"
+DAILY_PATH = PROCESSED_CLIMA_DIR / "clima_diario.parquet"
+MONTHLY_PATH = PROCESSED_CLIMA_DIR / "clima_mensual.parquet"
+
+# Zona horaria local para los agregados diarios y mensuales
+LOCAL_TZ = "America/Hermosillo"
+
+COLUMNAS_RENOMBRAR = {
+    'temperature_2m': 'temperatura',
+    'precipitation': 'precipitacion',
+    'weather_code': 'codigo_clima',
+    'is_day': 'es_de_dia',
+    'relative_humidity_2m': 'humedad',
+    'cloud_cover': 'nubosidad',
+    'wind_speed_10m': 'velocidad_viento'
+}
+
+COLUMNAS_FLOAT = ['temperatura', 'precipitacion', 'humedad', 'nubosidad', 'velocidad_viento']
+COLUMNAS_INT = ['codigo_clima', 'es_de_dia']
+
+AGG_DIARIO = {
+    'temperatura_media': ('temperatura', 'mean'),
+    'temperatura_min': ('temperatura', 'min'),
+    'temperatura_max': ('temperatura', 'max'),
+    'precipitacion': ('precipitacion', 'sum'),
+    'horas_lluvia': ('lluvia', 'sum'),
+    'humedad': ('humedad', 'mean'),
+    'nubosidad': ('nubosidad', 'mean'),
+    'velocidad_viento': ('velocidad_viento', 'mean'),
+    'velocidad_viento_max': ('velocidad_viento', 'max'),
+    'codigo_clima_max': ('codigo_clima', 'max'),
+}
+
+AGG_MENSUAL = {
+    'temperatura_media': ('temperatura_media', 'mean'),
+    'temperatura_min': ('temperatura_min', 'min'),
+    'temperatura_max': ('temperatura_max', 'max'),
+    'precipitacion': ('precipitacion', 'sum'),
+    'dias_lluvia': ('dia_lluvia', 'sum'),
+    'horas_lluvia': ('horas_lluvia', 'sum'),
+    'humedad': ('humedad', 'mean'),
+    'nubosidad': ('nubosidad', 'mean'),
+    'velocidad_viento': ('velocidad_viento', 'mean'),
+    'velocidad_viento_max': ('velocidad_viento_max', 'max'),
+}
+
+
+def load_raw_clima(input_path=RAW_DATA_PATH):
+    df = pd.read_csv(input_path)
+    logger.info(f'Dataset cargado: {len(df)} filas, {len(df.columns)} columnas')
+
+    df['date'] = pd.to_datetime(df['date'], utc=True)
+    df = df.set_index('date').sort_index()
+    df = df[~df.index.duplicated(keep='last')]
+    return df.rename(columns=COLUMNAS_RENOMBRAR)
+
+
+def drop_trailing_nulls(df):
+    """
+    Quita las horas finales en las que todas las variables son nulas: son los
+    días que el archivo de Open-Meteo aún no publica (download_clima descarga
+    hasta ayer), y imputarlas repetiría la última hora publicada.
+    """
+    cols = COLUMNAS_FLOAT + COLUMNAS_INT
+    valid = df[cols].notna().any(axis=1).to_numpy()
+    last = valid.nonzero()[0].max() + 1 if valid.any() else 0
+    dropped = len(df) - last
+    if dropped:
+        logger.warning(f'Se descartan {dropped} horas finales sin datos publicados '
+                       f'(desde {df.index[last]})')
+    return df.iloc[:last]
+
+
+def impute_nulls(df):
+    """
+    Imputa nulos con el último valor válido (y el siguiente para los nulos iniciales).
+    """
+    nulos = int(df.isnull().sum().sum())
+    if nulos:
+        logger.warning(f'Se encontraron {nulos} nulos. Aplicando imputación ffill.')
+        df = df.ffill().bfill()
+    return df
+
+
+def compact_dtypes(df):
+    """
+    Redondea las variables continuas a un decimal y aplica el esquema 'clima'
+    (float32/int8).
+    """
+    df[COLUMNAS_FLOAT] = df[COLUMNAS_FLOAT].round(1)
+    df[COLUMNAS_INT] = df[COLUMNAS_INT].round()
+    return apply_schema(df, 'clima')
+
+
+def rollup_daily(df):
+    """
+    Agrega la tabla horaria por día calendario en hora local de Hermosillo.
+    """
+    local = df.tz_convert(LOCAL_TZ).assign(lluvia=(df['precipitacion'] > 0).astype('int8'))
+    daily = local.groupby(local.index.normalize()).agg(**AGG_DIARIO)
+    daily.index = daily.index.tz_localize(None)
+    daily.index.name = 'fecha'
+    return daily
+
+
+def rollup_monthly(daily):
+    daily = daily.assign(dia_lluvia=(daily['precipitacion'] > 0).astype('int8'))
+    monthly = daily.groupby(daily.index.to_period('M')).agg(**AGG_MENSUAL)
+    monthly.index = monthly.index.to_timestamp()
+    monthly.index.name = 'mes'
+    return monthly
+
+
+def compact_rollup(df):
+    int_cols = [c for c in df.columns if c.startswith(('horas_', 'dias_', 'codigo_'))]
+    float_cols = df.columns.difference(int_cols)
+    df[float_cols] = df[float_cols].round(1).astype('float32')
+    df[int_cols] = df[int_cols].astype('int16')
+    return df
+
+
+@instrumented('process_cleaning_clima')
+def process_cleaning_clima(input_path=RAW_DATA_PATH):
+    start = datetime.now()
+    logger.info('Inicia el proceso de limpieza CLIMA')
+
+    PROCESSED_CLIMA_DIR.mkdir(parents=True, exist_ok=True)
+    with instrument('cargar_csv') as m:
+        m.file_in(input_path)
+        df = load_raw_clima(input_path)
+        m.rows_out(len(df))
+
+    with instrument('imputar_nulos') as m:
+        m.rows_in(len(df))
+        df = drop_trailing_nulls(df)
+        df = impute_nulls(df)
+        df = compact_dtypes(df)
+        m.rows_out(len(df))
+
+    with instrument('agregar_diario_mensual') as m:
+        m.rows_in(len(df))
+        daily = compact_rollup(rollup_daily(df))
+        monthly = compact_rollup(rollup_monthly(daily))
+        m.rows_out(len(daily) + len(monthly))
+
+    with instrument('guardar') as m:
+        df.to_parquet(HOURLY_PATH)
+        daily.to_parquet(DAILY_PATH)
+        monthly.to_parquet(MONTHLY_PATH)
+        for path in (HOURLY_PATH, DAILY_PATH, MONTHLY_PATH):
+            m.file_out(path)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Proceso de limpieza CLIMA completado en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_CLIMA_DIR.relative_to(ROOT_DIR)}')
+
+    return HOURLY_PATH, DAILY_PATH, MONTHLY_PATH
+
+
+if __name__ == '__main__':
+    process_cleaning_clima()
@@ -5,8 +5,10 @@ Filtra y limpia el conjunto de datos de colonias descargado desde INEGI.
 Guarda los resultados filtrados en data/processed
 """
 
-from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
-from extract_colonias import COLONIAS_DIR
+from config import ROOT_DIR, RAW_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from schemas import write_dataset, lower_text_columns
+from projection import WGS84, reproject
+from instrumentation import instrument, instrumented
 from pathlib import Path
 from datetime import datetime
 import geopandas as gpd
@@ -14,12 +16,11 @@ import geopandas as gpd
 # Logger
 logger = get_logger(Path(__file__).name)
 
-# Paths
+# Paths (los directorios se crean al ejecutar la limpieza, no al importar)
+COLONIAS_DIR = RAW_DIR / "colonias"
 INTERIM_COLONIAS_DIR = INTERIM_DIR / "colonias"
-INTERIM_COLONIAS_DIR.mkdir(exist_ok=True)
-
 PROCESSED_COLONIAS_DIR = PROCESSED_DIR / "colonias"
-PROCESSED_COLONIAS_DIR.mkdir(exist_ok=True)
+COLONIAS_CLEAN_PATH = PROCESSED_COLONIAS_DIR / "colonias_hmo.parquet"
 
 # CRS real según documentación del INEGI (data/raw/colonias/794551132180_s/catalogos/contenido)
 CSR_INEGI = (
@@ -51,7 +52,7 @@ def save_geo_data(gdf, dest_path, filestem):
     gdf.to_file(gpkg_path, driver='GPKG')
 
     # Guardar GeoJSON (proyección EPSG:4326)
-    gdf_wgs84 = gdf.to_crs(epsg=4326)
+    gdf_wgs84 = reproject(gdf, WGS84)
     geojson_path = dest_path / f"{filestem}.geojson"
     gdf_wgs84.to_file(geojson_path, driver='GeoJSON')
 
@@ -71,25 +72,29 @@ def filter_hermosillo_colonias(gdf):
 
 
 def columns_to_lower(gdf):
-    obj_cols = gdf.select_dtypes(include='object')
-    
-    for col in obj_cols.columns:
-        gdf[col] = gdf[col].str.lower()
-    
-    return gdf
+    return lower_text_columns(gdf)
 
 
+@instrumented('process_cleaning_colonias')
 def process_cleaning_colonias():    
     start = datetime.now()
     logger.info('Inicia el proceso de limpieza COLONIAS-INEGI:')
+    INTERIM_COLONIAS_DIR.mkdir(parents=True, exist_ok=True)
+    PROCESSED_COLONIAS_DIR.mkdir(parents=True, exist_ok=True)
 
     shp_path = get_shp_path(COLONIAS_DIR)
 
     # Cargar datos
-    gdf = gpd.read_file(shp_path)
+    with instrument('cargar_shp') as m:
+        m.file_in(shp_path)
+        gdf = gpd.read_file(shp_path)
+        m.rows_out(len(gdf))
     
     # Filtrar zona urbana de Hermosillo
-    gdf_hmo = filter_hermosillo_colonias(gdf)
+    with instrument('filtrar_hermosillo') as m:
+        m.rows_in(len(gdf))
+        gdf_hmo = filter_hermosillo_colonias(gdf)
+        m.rows_out(len(gdf_hmo))
 
     # Asignar el CRS INEGI
     gdf_hmo = gdf_hmo.set_crs(CSR_INEGI, allow_override=True)
@@ -103,7 +108,12 @@ def process_cleaning_colonias():
     # Eliminar columnas {'cve_ent', 'cve_mun', 'cve_loc', 'fecha_act', 'institucio'}
     gdf_hmo.drop(columns=['cve_ent', 'cve_mun', 'cve_loc', 'fecha_act', 'institucio'], inplace=True)
 
-    gpkg_path, geojson_path = save_geo_data(gdf_hmo, PROCESSED_COLONIAS_DIR, 'colonias_hmo')
+    with instrument('guardar') as m:
+        gpkg_path, geojson_path = save_geo_data(gdf_hmo, PROCESSED_COLONIAS_DIR, 'colonias_hmo')
+        write_dataset(gdf_hmo, COLONIAS_CLEAN_PATH, 'colonias')
+        m.rows_out(len(gdf_hmo))
+        for path in (gpkg_path, geojson_path, COLONIAS_CLEAN_PATH):
+            m.file_out(path)
 
     logger.info(f'Archivos limpios guardados en: {PROCESSED_COLONIAS_DIR.relative_to(ROOT_DIR)}')
 
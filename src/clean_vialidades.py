@@ -6,7 +6,9 @@ Guarda los resultados filtrados en data/processed/vialidades
 """
 
 from config import ROOT_DIR, RAW_DIR,  INTERIM_DIR, PROCESSED_DIR, get_logger
-from extract_vialidades import RAW_VIALIDADES_DIR
+from schemas import write_dataset, lower_text_columns
+from projection import WGS84, reproject
+from instrumentation import instrument, instrumented
 from datetime import datetime
 from pathlib import Path
 from shapely.geometry import box
@@ -16,13 +18,11 @@ import pandas as pd
 # Logger
 logger = get_logger(Path(__file__).name)
 
-# Paths
-# Paths
+# Paths (los directorios se crean al guardar, no al importar)
+RAW_VIALIDADES_DIR = RAW_DIR / "vialidades"
 INTERIM_VIALIDADES_DIR = INTERIM_DIR / "vialidades"
-INTERIM_VIALIDADES_DIR.mkdir(exist_ok=True)
-
 PROCESSED_VIALIDADES_DIR = PROCESSED_DIR / "vialidades"
-PROCESSED_VIALIDADES_DIR.mkdir(exist_ok=True)
+VIALIDADES_CLEAN_PATH = PROCESSED_VIALIDADES_DIR / "vialidades_hmo.parquet"
 
 
 def filter_urban_roads(gdf): 
@@ -41,8 +41,9 @@ def filter_urban_roads(gdf):
 
 
 def drop_cols(gdf):
+    # u, v y key se conservan para unir los tramos con el grafo de OSMnx
     cols_to_drop = [
-        'u', 'v', 'key', 'osmid',
+        'osmid',
         'bridge', 
         'tunnel', 
         'width',
@@ -89,13 +90,14 @@ def rename_tipo_vialidad(gdf):
 
 
 def save_geo_data(gdf, dest_path, filestem):
+    dest_path.mkdir(parents=True, exist_ok=True)
 
     # Guardar GeoPackage (manteniendo CRS proyectado)
     gpkg_path = dest_path / f"{filestem}.gpkg"
     gdf.to_file(gpkg_path, driver='GPKG')
 
     # Guardar GeoJSON (proyección EPSG:4326)
-    gdf_wgs84 = gdf.to_crs(epsg=4326)
+    gdf_wgs84 = reproject(gdf, WGS84)
     geojson_path = dest_path / f"{filestem}.geojson"
     gdf_wgs84.to_file(geojson_path, driver='GeoJSON')
 
@@ -103,12 +105,7 @@ def save_geo_data(gdf, dest_path, filestem):
 
 
 def columns_to_lower(gdf):
-    obj_cols = gdf.select_dtypes(include='object')
-    
-    for col in obj_cols.columns:
-        gdf[col] = gdf[col].str.lower()
-    
-    return gdf
+    return lower_text_columns(gdf)
 
 
 def dissolve_roads(gdf):
@@ -143,16 +140,23 @@ def dissolve_roads(gdf):
     return gdf_dissolved
 
 
+@instrumented('process_cleaning_vialidades')
 def process_cleaning_vialidades(): 
 
     start = datetime.now()
     logger.info('Inicia proceso de limpieza VIALIDADES-OSM: ')
 
     raw_path = RAW_VIALIDADES_DIR.joinpath("edges/hermosillo_edges.geojson")
-    gdf = gpd.read_file(raw_path)
+    with instrument('cargar_geojson') as m:
+        m.file_in(raw_path)
+        gdf = gpd.read_file(raw_path)
+        m.rows_out(len(gdf))
 
     # Filtrar vialidades en la zona urbana de Hermosillo
-    gdf = filter_urban_roads(gdf)
+    with instrument('filtrar_zona_urbana') as m:
+        m.rows_in(len(gdf))
+        gdf = filter_urban_roads(gdf)
+        m.rows_out(len(gdf))
 
     # Eliminar columnas innecesarias
     gdf = drop_cols(gdf)
@@ -170,11 +174,19 @@ def process_cleaning_vialidades():
     gdf["nombre_vialidad"] = gdf["nombre_vialidad"].fillna("SIN_NOMBRE")
 
     # Disolver los tramos con el mismo nombre de vialidad
-    gdf_dissolved = dissolve_roads(gdf)
+    with instrument('disolver') as m:
+        m.rows_in(len(gdf))
+        gdf_dissolved = dissolve_roads(gdf)
+        m.rows_out(len(gdf_dissolved))
 
     # Guardar datos 
-    gpkg_path, geojson_path = save_geo_data(gdf, PROCESSED_VIALIDADES_DIR, 'vialidades_hmo')
-    _, geojson_dissolved_path = save_geo_data(gdf_dissolved, PROCESSED_VIALIDADES_DIR, 'vialidades_hmo_disolved')
+    with instrument('guardar') as m:
+        gpkg_path, geojson_path = save_geo_data(gdf, PROCESSED_VIALIDADES_DIR, 'vialidades_hmo')
+        write_dataset(gdf, VIALIDADES_CLEAN_PATH, 'vialidades')
+        _, geojson_dissolved_path = save_geo_data(gdf_dissolved, PROCESSED_VIALIDADES_DIR, 'vialidades_hmo_disolved')
+        m.rows_out(len(gdf) + len(gdf_dissolved))
+        for path in (gpkg_path, geojson_path, VIALIDADES_CLEAN_PATH, geojson_dissolved_path):
+            m.file_out(path)
     logger.info(f'Archivos limpios guardados en: {PROCESSED_VIALIDADES_DIR.relative_to(ROOT_DIR)}')
     
     end = datetime.now()
@@ -1,12 +1,80 @@
-import pandas as pd
+"""
+cleaning_data_bachometro.py
+
+Limpia los archivos del Bachómetro descargados por extract_bachometro
+(data/raw/baches_<año>.json o .jsonl): quita columnas no necesarias y
+convierte las fechas en español a datetime.
+
+Todos los archivos encontrados se procesan en paralelo y por bloques, y se
+consolidan en un solo dataset Parquet, data/processed/bachometro/baches.parquet/,
+con una partición por archivo de origen (fuente=baches_<año>). Los registros
+sin `id` válido se descartan y se reportan por archivo.
+"""
+
+from config import RAW_DIR, PROCESSED_DIR
+from schemas import storage_schema, astype_schema, read_dataset
+from projection import add_xy
+from instrumentation import instrument, instrumented
+import os
+import re
+import json
+import shutil
 import pathlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Paths
+BACHES_DIR = PROCESSED_DIR / "bachometro"
+BACHES_PATH = BACHES_DIR / "baches.parquet"
+
+# Lectura por bloques: registros por bloque y caracteres por lectura del archivo
+CHUNK_FILAS = 50_000
+BLOQUE_LECTURA = 4 * 1024 * 1024
+
+COLUMNAS_A_ELIMINAR = [
+    'descripcion', 'description', 'material',
+    'imagenes', 'date', 'neighborhoods', 'no_reparemos'
+]
+
+# Columnas y tipos del dataset consolidado (iguales en todos los bloques): el
+# esquema 'baches' de schemas.py, con las categorías guardadas como texto
+ESQUEMA = storage_schema('baches')
+
+# Mapeo de meses en español a números
+MONTH_MAP = {
+    'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4, 'Mayo': 5, 'Junio': 6,
+    'Julio': 7, 'Agosto': 8, 'Septiembre': 9, 'Octubre': 10, 'Noviembre': 11, 'Diciembre': 12
+}
+
+# Fechas del Bachómetro: 'Diciembre 30, 2022' (mes, día y año)
+PATRON_FECHA = re.compile(r'(?P<mes>[^\W\d_]+)\W*(?P<dia>\d{1,2})\W+(?P<anio>\d{4})')
 
-def procesar_columna_fecha(df, col, month_map):
+
+def parsear_fechas(valores, month_map=MONTH_MAP):
+    """
+    Convierte textos de fecha en español a datetime con un solo patrón
+    compilado. Los valores que no coinciden o cuyo mes no está en month_map
+    quedan como NaT.
+    """
+    partes = pd.Series(valores, dtype=object).astype(str).str.extract(PATRON_FECHA)
+    meses = {mes.lower(): num for mes, num in month_map.items()}
+    componentes = pd.DataFrame({
+        'year': pd.to_numeric(partes['anio']),
+        'month': partes['mes'].str.lower().map(meses),
+        'day': pd.to_numeric(partes['dia']),
+    })
+    return pd.DatetimeIndex(pd.to_datetime(componentes, errors='coerce'))
+
+
+def procesar_columna_fecha(df, col, month_map=MONTH_MAP):
     """
     Procesa una columna de fecha en formato español a datetime de pandas.
     
-    Convierte fechas en formato texto con meses en español (ej: '15 Enero 2023')
-    a objetos datetime de pandas.
+    Convierte fechas en formato texto con meses en español (ej: 'Enero 15, 2023')
+    a objetos datetime de pandas. Las fechas se repiten mucho, así que sólo se
+    interpretan los valores únicos y el resultado se reparte a todas las filas.
     
     Args:
         df (pd.DataFrame): DataFrame con la columna a procesar
@@ -16,143 +84,208 @@ def procesar_columna_fecha(df, col, month_map):
     Returns:
         pd.DataFrame: DataFrame con la columna de fecha convertida a datetime
     """
-    # Máscara para filas válidas (no nulas)
-    mask = df[col].notna()
+    # Códigos por valor único (-1 para nulos)
+    codigos, unicos = pd.factorize(df[col])
+    fechas = parsear_fechas(unicos, month_map)
 
-    # Si no hay filas válidas, omite el procesamiento
-    if mask.sum() == 0:
-        return df
+    # Avisar de los valores que no se pudieron interpretar
+    invalidos = fechas.isna().sum()
+    if invalidos:
+        print(f"'{col}': {invalidos} valores distintos no se reconocieron como fecha (quedan como NaT)")
 
-    # Convertir a string
-    df.loc[mask, col] = df.loc[mask, col].astype(str)
+    df[col] = fechas.take(codigos, allow_fill=True, fill_value=pd.NaT)
+    return df
 
-    # Limpiar caracteres no alfanuméricos
-    df.loc[mask, col] = df.loc[mask, col].str.replace(r'[^a-zA-Z0-9 ]', '', regex=True)
 
-    # Reemplazar nombres de meses por números
-    for month, num in month_map.items():
-        df.loc[mask, col] = df.loc[mask, col].str.replace(month, str(num), regex=False)
+def iter_json_array(path, chunk_size=CHUNK_FILAS, block_size=BLOQUE_LECTURA):
+    """
+    Lee un archivo JSON con un arreglo de registros (como los que guarda
+    extract_bachometro) por bloques, sin cargarlo completo en memoria, y
+    regresa listas de hasta chunk_size registros.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        # El arreglo puede empezar después de espacios (o un BOM) de más de un bloque
+        buffer = ''
+        while True:
+            more = f.read(block_size)
+            buffer = (buffer + more).lstrip('\ufeff \t\r\n')
+            if buffer or not more:
+                break
+        if not buffer:
+            print(f"Archivo vacío, sin registros: {path}")
+            return
+        if buffer[0] != '[':
+            raise ValueError(f"{path} no contiene un arreglo JSON (empieza con {buffer[:20]!r})")
 
-    # Cambiar None por NA
-    df[col] = df[col].replace({None: pd.NA})
+        pos, eof = 1, False
+        chunk = []
+        while True:
+            # Saltar espacios y separadores entre registros
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                break
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError('fin del bloque', buffer, pos)
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Registro incompleto: leer el siguiente bloque
+                if eof:
+                    raise
+                more = f.read(block_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-    # Split en 3 columnas
-    splitted = df[col].str.split(' ', expand=True)
 
-    # Verifica si el split tiene exactamente 3 columnas
-    if splitted.shape[1] != 3:
-        #print(f"El split de '{col}' produjo {splitted.shape[1]} columnas en vez de 3")
-        return df
+def iter_chunks(path, chunk_size=CHUNK_FILAS):
+    """DataFrames de hasta chunk_size registros de un archivo .json o .jsonl."""
+    path = pathlib.Path(path)
+    if path.suffix == '.jsonl':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False,
+                              convert_dates=False, precise_float=True)
+    else:
+        for records in iter_json_array(path, chunk_size):
+            yield pd.DataFrame.from_records(records)
 
-    df[['month', 'day', 'year']] = splitted
 
-    # Rellenar vacíos con "0"
-    df['day'] = df['day'].fillna('0')
-    df['month'] = df['month'].fillna('0')
-    df['year'] = df['year'].fillna('0')
+def limpiar_registros(df):
+    """
+    Quita las columnas no necesarias y los registros sin `id` numérico,
+    convierte las fechas, agrega las coordenadas proyectadas x/y y ajusta el
+    resultado a ESQUEMA (las columnas faltantes quedan nulas).
+    """
+    df = df.drop(columns=[col for col in COLUMNAS_A_ELIMINAR if col in df.columns])
 
-    # Unir a datetime
-    df[col] = pd.to_datetime(df[['day', 'month', 'year']], errors='coerce')
+    # Un id faltante haría fallar la conversión a int64 de todo el archivo
+    if 'id' in df.columns:
+        ids = pd.to_numeric(df['id'], errors='coerce')
+    else:
+        ids = pd.Series(float('nan'), index=df.index)
+    df = df[ids.notna()].assign(id=ids[ids.notna()])
 
-    # Eliminar columnas auxiliares
-    df = df.drop(columns=['day', 'month', 'year'])
-    return df
+    for col in ['fecha_reporte', 'fecha_atencion']:
+        if col in df.columns:
+            df = procesar_columna_fecha(df, col)
 
+    df = df.reindex(columns=list(ESQUEMA))
+    # Se proyecta antes de reducir latitude/longitude a float32
+    df = add_xy(df, 'longitude', 'latitude')
+    return astype_schema(df, ESQUEMA)
 
-def procesar_dataset(json_file_path, output_dir):
+
+def esquema_arrow():
+    vacio = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in ESQUEMA.items()})
+    schema = pa.Schema.from_pandas(vacio, preserve_index=False)
+    # En pandas 2 una columna 'str' vacía es de tipo objeto y pyarrow la infiere como null
+    for col, dtype in ESQUEMA.items():
+        if dtype == 'str':
+            i = schema.get_field_index(col)
+            schema = schema.set(i, schema.field(i).with_type(pa.string()))
+    return schema
+
+
+def partition_path(json_file_path, dataset_path=BACHES_PATH):
+    return pathlib.Path(dataset_path) / f"fuente={pathlib.Path(json_file_path).stem}"
+
+
+def procesar_dataset(json_file_path, dataset_path=BACHES_PATH, chunk_size=CHUNK_FILAS):
     """
-    Procesa un archivo JSON de baches y lo guarda como CSV limpio.
+    Procesa un archivo de baches (.json o .jsonl) por bloques y lo escribe
+    como una partición del dataset Parquet consolidado.
     
     Args:
-        json_file_path (str): Ruta al archivo JSON de entrada
-        output_dir (str): Directorio donde guardar el CSV resultante
+        json_file_path (str): Ruta al archivo de entrada
+        dataset_path (str): Directorio del dataset Parquet consolidado
+        chunk_size (int): Registros por bloque de lectura (y grupo de filas)
     
     Returns:
-        pd.DataFrame: DataFrame procesado
+        int: Registros escritos, o None si hubo un error
     """
+    destino = partition_path(json_file_path, dataset_path)
+    # Oculto para pyarrow: una partición temporal huérfana no se lee con el dataset
+    temporal = destino.with_name(f".{destino.name}.tmp")
     try:
-        # Cargar el archivo JSON
-        df = pd.read_json(json_file_path)
-        
-        # Eliminar columnas no necesarias
-        columnas_a_eliminar = [
-            'descripcion', 'description', 'material', 
-            'imagenes', 'date', 'neighborhoods', 'no_reparemos'
-        ]
-        
-        # Eliminar solo las columnas que existen en el DataFrame
-        columnas_existentes = [col for col in columnas_a_eliminar if col in df.columns]
-        df = df.drop(columns=columnas_existentes)
-        
-        # Mapeo de meses en español a números
-        month_map = { 
-            'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4, 'Mayo': 5, 'Junio': 6,
-            'Julio': 7, 'Agosto': 8, 'Septiembre': 9, 'Octubre': 10, 'Noviembre': 11, 'Diciembre': 12 
-        }
-
-        # Procesar columnas de fecha si existen
-        if 'fecha_reporte' in df.columns:
-            df = procesar_columna_fecha(df, 'fecha_reporte', month_map)
-        
-        if 'fecha_atencion' in df.columns:
-            df = procesar_columna_fecha(df, 'fecha_atencion', month_map)
-
-        # Crear carpeta processed si no existe
-        pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        # Generar nombre de archivo de salida
-        archivo_entrada = pathlib.Path(json_file_path).stem  # ej: 'baches_2022'
-        archivo_salida = f"{archivo_entrada}_limpio.csv"
-        ruta_salida = pathlib.Path(output_dir) / archivo_salida
-        
-        # Exportar el DataFrame limpio a CSV
-        df.to_csv(ruta_salida, index=False)
-        print(f"Archivo CSV limpio creado: '{ruta_salida}'")
-        
-        return df
-        
+        shutil.rmtree(temporal, ignore_errors=True)
+        temporal.mkdir(parents=True)
+
+        # Un grupo de filas por bloque, sin juntar el archivo completo en memoria
+        schema = esquema_arrow()
+        filas = sin_id = 0
+        with pq.ParquetWriter(temporal / "part-0.parquet", schema) as writer:
+            for chunk in iter_chunks(json_file_path, chunk_size):
+                df = limpiar_registros(chunk)
+                writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                filas += len(df)
+                sin_id += len(chunk) - len(df)
+
+        # Reemplazar la partición anterior sólo cuando la nueva está completa
+        shutil.rmtree(destino, ignore_errors=True)
+        temporal.rename(destino)
+        print(f"Partición creada: '{destino}' ({filas} registros)")
+        if sin_id:
+            print(f"Advertencia: {sin_id} registros sin id descartados de {json_file_path}")
+        return filas
+
     except Exception as e:
+        shutil.rmtree(temporal, ignore_errors=True)
         print(f"Error procesando {json_file_path}: {e}")
         return None
 
 
-def main():
+def discover_datasets(raw_dir=RAW_DIR):
+    """Todos los archivos de baches descargados (baches_<año>.json o .jsonl)."""
+    return sorted(p for p in raw_dir.glob("baches_*.json*") if p.suffix in ('.json', '.jsonl'))
+
+
+@instrumented('cleaning_data_bachometro')
+def main(raw_dir=RAW_DIR, dataset_path=BACHES_PATH, n_workers=None):
     """
-    Función principal que procesa múltiples datasets de baches.
+    Procesa en paralelo todos los archivos de baches de raw_dir y los
+    consolida en un dataset Parquet particionado por archivo de origen.
     """
-    # Obtener el directorio actual del script
-    script_dir = pathlib.Path(__file__).parent
-    project_root = script_dir.parent  # Subir un nivel para llegar a la raíz del proyecto
-    
-    # Configuración de rutas RELATIVAS desde el script
-    RAW_DIR = project_root / "data" / "raw"
-    PROCESSED_DIR = project_root / "data" / "processed"
-    
-    print(f"Buscando datos en: {RAW_DIR.absolute()}")
-    
-    # Lista de datasets a procesar - usar los archivos que realmente existen
-    datasets = [
-        RAW_DIR / "baches_2021.json",
-        RAW_DIR / "baches_2022.json",
-        RAW_DIR / "baches_2023.json"
-        # No incluir 2024 y 2025 si no existen
-    ]
-    
-    print(f"Iniciando procesamiento de datasets...")
+    datasets = discover_datasets(raw_dir)
+    print(f"Buscando datos en: {raw_dir.absolute()}")
+    print(f"Archivos encontrados: {[p.name for p in datasets]}")
     print("=" * 60)
-    
-    # Procesar solo los archivos que existen
-    archivos_procesados = 0
-    for dataset_path in datasets:
-        if dataset_path.exists():
-            print(f"Procesando: {dataset_path.name}")
-            procesar_dataset(dataset_path, PROCESSED_DIR)
-            archivos_procesados += 1
-        else:
-            print(f"Archivo no encontrado: {dataset_path.name} - Saltando...")
-    
-    print(f"Procesamiento completado. Archivos procesados: {archivos_procesados}")
+
+    # Quitar particiones de archivos que ya no existen
+    dataset_path = pathlib.Path(dataset_path)
+    vigentes = {partition_path(p, dataset_path).name for p in datasets}
+    if dataset_path.exists():
+        for particion in dataset_path.iterdir():
+            if particion.name not in vigentes:
+                shutil.rmtree(particion)
+
+    n_workers = n_workers or min(len(datasets), os.cpu_count() or 1) or 1
+    # Los archivos se procesan en otros procesos: su CPU cuenta como cpu_hijos_s
+    with instrument('procesar_archivos', archivos=len(datasets)) as m:
+        for p in datasets:
+            m.file_in(p)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            resultados = list(executor.map(procesar_dataset, datasets, [dataset_path] * len(datasets)))
+
+        errores = [p.name for p, filas in zip(datasets, resultados) if filas is None]
+        total = sum(filas for filas in resultados if filas is not None)
+        m.rows_out(total)
+    print(f"Procesamiento completado. Archivos procesados: {len(datasets) - len(errores)}, registros: {total}")
+    if errores:
+        raise RuntimeError(f"No se pudieron procesar: {errores}")
+    return dataset_path
+
+
+def load_baches(dataset_path=BACHES_PATH, columns=None):
+    """Lee el dataset consolidado de baches (todas las particiones)."""
+    return read_dataset(dataset_path, 'baches', columns=columns)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,99 @@
+"""
+cli.py
+
+Punto de entrada único para las etapas del proyecto. Cada subcomando apunta a
+'modulo:funcion' y el módulo se importa sólo cuando el subcomando se ejecuta,
+de modo que `--help` o una etapa ligera no cargan geopandas, scipy ni OSMnx ni
+crean directorios o sesiones HTTP.
+
+Uso:
+    python src/cli.py --help
+    python src/cli.py pipeline atus_clean --force      # mismas opciones que pipeline.py
+    python src/cli.py proximidad
+    python src/cli.py centralidad -p k=500 -p n_workers=4
+    python src/cli.py benchmarks --stages imports
+"""
+
+from config import ROOT_DIR
+import ast
+import sys
+import argparse
+import importlib
+
+# Subcomandos que reenvían sus argumentos al `main(argv)` de otro script
+REENVIOS = {
+    'pipeline': ('pipeline:main', 'Extracción y limpieza con dependencias (ver pipeline.py --help)'),
+    'benchmarks': ('benchmarks.run:main', 'Benchmarks con datos sintéticos (ver benchmarks/run.py --help)'),
+}
+
+# Etapas de análisis: se ejecutan con sus parámetros por defecto o con -p clave=valor
+ETAPAS = {
+    'colonias_indice': ('assign_colonias:build_colonias_index', 'Índice espacial de colonias',
+                        {'rebuild': True}),
+    'proximidad': ('proximity_baches:process_proximity_baches', 'Baches activos cerca de cada accidente', {}),
+    'rezago': ('backlog_baches:process_backlog_baches', 'Rezago de baches sin atender', {}),
+    'malla': ('hex_grid:process_grid_aggregation', 'Conteos por celda de la malla', {}),
+    'kde': ('kde_rasters:process_kde_rasters', 'Rásters de densidad (KDE)', {}),
+    'permutaciones': ('permutation_proximity:process_permutation_test', 'Prueba de permutaciones', {}),
+    'hotspots': ('hotspots:process_hotspots', 'Puntos calientes (Getis-Ord Gi*)', {}),
+    'clima_join': ('join_clima:process_join_clima', 'Clima a la hora de cada accidente', {}),
+    'tramos': ('map_matching:process_map_matching', 'Tramo vial más cercano a cada punto', {}),
+    'tasas_tramo': ('segment_rates:process_segment_rates', 'Tasas mensuales por tramo y vialidad', {}),
+    'centralidad': ('betweenness_vialidades:process_betweenness_vialidades',
+                    'Intermediación aproximada de la red vial', {}),
+    'memoria': ('schemas:process_memory_report', 'Memoria de cada dataset limpio con y sin su esquema', {}),
+}
+
+
+def load_function(target):
+    """Importa 'modulo:funcion' (aquí es donde se paga el costo de importación)."""
+    module_name, func_name = target.split(':')
+    if module_name.startswith('benchmarks') and str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def parse_param(text):
+    """'clave=valor' -> (clave, valor), con el valor como literal de Python si es posible."""
+    key, sep, value = text.partition('=')
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f'Parámetro inválido: {text!r} (se espera clave=valor)')
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return key, value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description='Etapas de extracción, limpieza y análisis de baches y accidentes')
+    sub = parser.add_subparsers(dest='comando', metavar='comando', required=True)
+
+    # Sólo para la ayuda: sus argumentos los interpreta el script destino
+    for name, (_, help_text) in REENVIOS.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+
+    for name, (_, help_text, _) in ETAPAS.items():
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('-p', '--param', action='append', type=parse_param, default=[],
+                       metavar='CLAVE=VALOR', help='Argumento para la función de la etapa')
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in REENVIOS:
+        target, _ = REENVIOS[argv[0]]
+        return load_function(target)(argv[1:])
+
+    args = build_parser().parse_args(argv)
+    target, _, defaults = ETAPAS[args.comando]
+    from instrumentation import instrument
+
+    with instrument(args.comando):
+        return load_function(target)(**{**defaults, **dict(args.param)})
+
+
+if __name__ == '__main__':
+    main()
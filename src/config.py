@@ -9,6 +9,9 @@ RAW_DIR = DATA_DIR / "raw"
 PROCESSED_DIR = DATA_DIR / "processed"
 INTERIM_DIR = DATA_DIR / "interim"
 
+# CRS métrico para cálculos de distancia (UTM zona 12N, donde se ubica Hermosillo)
+METRIC_CRS = "EPSG:32612"
+
 def init_paths(): 
     for path in [DATA_DIR, RAW_DIR, PROCESSED_DIR, INTERIM_DIR]: 
         path.mkdir(parents=True, exist_ok=True)
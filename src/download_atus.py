@@ -7,6 +7,7 @@ de datos ATUS y los guarda en data/raw/atus.
 
 from config import RAW_DIR, get_logger
 from zip_utils import download_zip
+from instrumentation import instrument, instrumented
 from itertools import repeat
 from datetime import datetime
 from pathlib import Path
@@ -14,7 +15,6 @@ from concurrent.futures import ThreadPoolExecutor
 
 # Paths
 ATUS_DIR = RAW_DIR / "atus"
-ATUS_DIR.mkdir(exist_ok=True)
 
 # logger
 logger = get_logger(Path(__file__).name)
@@ -26,17 +26,22 @@ URL_2023 = r"https://www.inegi.org.mx/contenidos/programas/accidentes/datosabier
 
 
 def shoot_parallel_download(zip_urls, downloader=download_zip):
+    ATUS_DIR.mkdir(parents=True, exist_ok=True)
     with ThreadPoolExecutor() as executor:
         results = list(executor.map(downloader, zip_urls, repeat(ATUS_DIR)))
     return results
 
 
+@instrumented('download_atus')
 def download_atus():
     zip_urls = [URL_2021, URL_2022, URL_2023]
     start = datetime.now()
     logger.info(f'Inicia proceso de descarga ATUS:')
 
-    zip_paths = shoot_parallel_download(zip_urls)
+    with instrument('descargar_zips') as m:
+        zip_paths = shoot_parallel_download(zip_urls)
+        for path in filter(None, zip_paths):
+            m.file_out(path)
 
     end = datetime.now()
     elapsed = (end - start).total_seconds()
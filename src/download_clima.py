@@ -3,23 +3,36 @@ download_clima.py
 
 Descarga los archivos del clima de Hermosillo desde el API de Open-Meteo.
 
+El rango START_DATE–END_DATE se divide en ventanas mensuales que se descargan en
+paralelo y se guardan por separado en data/raw/clima/ventanas. En cada ejecución
+sólo se descargan las ventanas faltantes o incompletas (por ejemplo el mes en
+curso), y si END_DATE es None el rango se extiende automáticamente hasta ayer.
+Los nulos sólo marcan una ventana como incompleta si se descargó a menos de
+RECENT_DAYS días de su fin, cuando el API todavía no publicaba esas horas; la
+fecha de descarga se guarda junto a cada ventana (clima_<mes>.json). Los nulos
+de una ventana descargada después son huecos permanentes del API y volver a
+descargarla no los llena.
+
 Uso:
     python download_clima.py
 """
 
+import json
 import pandas as pd
-import requests_cache
+import requests
 from retry_requests import retry
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
 from pathlib import Path
 
 from config import ROOT_DIR, RAW_DIR, get_logger
+from instrumentation import instrument, instrumented
 
 logger = get_logger(Path(__file__).name)
 
 # Parámetros
 START_DATE = "2021-01-01"
-END_DATE = "2023-12-31"
+END_DATE = None  # None = hasta ayer
 
 LATITUDE = 29.1026
 LONGITUDE = -110.9773
@@ -28,75 +41,187 @@ DATA_SOURCE_1 = "Open-Meteo Archive API (Clima)"
 DATA_URL_1 = "https://open-meteo.com/en/docs/archive-api"
 
 # Rutas
-CACHE_DIR = RAW_DIR / "cache_clima"
 CLIMA_DIR = RAW_DIR / "clima"
-
-CACHE_DIR.mkdir(parents=True, exist_ok=True)   # Crear cache_clima/
-CLIMA_DIR.mkdir(parents=True, exist_ok=True)   # Crear clima/
+WINDOWS_DIR = CLIMA_DIR / "ventanas"
 
 # Archivos de salida
 RAW_DATA_PATH = CLIMA_DIR / "clima_hermosillo.csv"
 RAW_METADATA_PATH = RAW_DIR / "info_descargas_clima.txt"
 
-# Cliente HTTP con cache + retry
-cache = requests_cache.CachedSession(CACHE_DIR / "http_cache.sqlite", expire_after=-1)
-session = retry(cache, retries=5, backoff_factor=0.2)
-
 API_URL = "https://archive-api.open-meteo.com/v1/archive"
 
+# Ventanas: "MS" = mensual, "YS" = anual
+WINDOW_FREQ = "MS"
+MAX_WORKERS = 4
+
+# El archivo de Open-Meteo publica los datos con unos días de retraso
+RECENT_DAYS = 7
+
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "precipitation",
+    "weather_code",
+    "is_day",
+    "relative_humidity_2m",
+    "cloud_cover",
+    "wind_speed_10m"
+]
+
 PARAMS = {
     "latitude": LATITUDE,
     "longitude": LONGITUDE,
-    "start_date": START_DATE,
-    "end_date": END_DATE,
-    "hourly": [
-        "temperature_2m",
-        "precipitation",
-        "weather_code",
-        "is_day",
-        "relative_humidity_2m",
-        "cloud_cover",
-        "wind_speed_10m"
-    ],
+    "hourly": HOURLY_VARIABLES,
     "timezone": "UTC"
 }
 
 
-# Descarga y procesamiento
-def download_and_process_data():
-    """Descarga los datos del API y los convierte a DataFrame."""
-    logger.info(f"Conectando a {DATA_SOURCE_1}…")
+def get_session():
+    """Cliente HTTP con reintentos."""
+    return retry(requests.Session(), retries=5, backoff_factor=0.2)
+
+
+def resolve_end_date(end_date=END_DATE, today=None):
+    if end_date is None:
+        return (today or date.today()) - timedelta(days=1)
+    return pd.Timestamp(end_date).date()
+
+
+def build_windows(start_date=START_DATE, end_date=END_DATE, freq=WINDOW_FREQ):
+    """
+    Divide el rango de fechas en ventanas [inicio, fin] alineadas al mes o al año.
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(resolve_end_date(end_date))
+
+    offset = pd.tseries.frequencies.to_offset(freq)
+    starts = pd.date_range(offset.rollback(start), end, freq=freq)
+
+    windows = []
+    for window_start in starts:
+        window_end = window_start + offset - pd.Timedelta(days=1)
+        windows.append((max(window_start, start).date(), min(window_end, end).date()))
+    return windows
+
+
+def window_path(window, freq=WINDOW_FREQ):
+    window_start, _ = window
+    label = window_start.strftime("%Y") if freq == "YS" else window_start.strftime("%Y-%m")
+    return WINDOWS_DIR / f"clima_{label}.csv"
+
+
+def fetch_date_path(path):
+    return path.with_suffix(".json")
+
+
+def save_fetch_date(path, fetched=None):
+    fetched = fetched or date.today()
+    fetch_date_path(path).write_text(json.dumps({"descargado": fetched.isoformat()}), encoding="utf-8")
 
-    try:
-        resp = session.get(API_URL, params=PARAMS)
-        resp.raise_for_status()
-        data = resp.json()
 
-        if "hourly" not in data:
-            raise ValueError("La respuesta no contiene datos horarios ('hourly').")
+def fetch_date(path):
+    """
+    Fecha en que se descargó la ventana; las descargadas antes de guardarse
+    esta fecha usan la fecha de modificación del CSV.
+    """
+    meta = fetch_date_path(path)
+    if meta.exists():
+        return date.fromisoformat(json.loads(meta.read_text(encoding="utf-8"))["descargado"])
+    return date.fromtimestamp(path.stat().st_mtime)
 
-        hourly = data["hourly"]
 
-        df = pd.DataFrame(hourly)
-        df["time"] = pd.to_datetime(df["time"], utc=True)
-        df.rename(columns={"time": "date"}, inplace=True)
+def is_window_complete(window, path):
+    """
+    Una ventana está completa si su archivo tiene todas las horas del rango y,
+    si se descargó a menos de RECENT_DAYS días de su fin, ningún valor nulo
+    (el API regresa nulos en los días aún no publicados).
+    """
+    if not path.exists():
+        return False
 
-        logger.info(f"Descargados {len(df)} registros de clima.")
-        return df
+    window_start, window_end = window
+    expected_hours = ((window_end - window_start).days + 1) * 24
 
+    df = pd.read_csv(path)
+    if len(df) != expected_hours:
+        return False
+
+    fetched_recent = (fetch_date(path) - window_end).days <= RECENT_DAYS
+    return not (fetched_recent and df[HOURLY_VARIABLES].isnull().any().any())
+
+
+# Descarga y procesamiento
+def download_window(window, api_url=API_URL, session=None):
+    """Descarga los datos horarios de una ventana y los convierte a DataFrame."""
+    window_start, window_end = window
+    session = session or get_session()
+
+    params = {
+        **PARAMS,
+        "start_date": window_start.isoformat(),
+        "end_date": window_end.isoformat(),
+    }
+    resp = session.get(api_url, params=params)
+    resp.raise_for_status()
+    data = resp.json()
+
+    if "hourly" not in data:
+        raise ValueError("La respuesta no contiene datos horarios ('hourly').")
+
+    df = pd.DataFrame(data["hourly"])
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    df.rename(columns={"time": "date"}, inplace=True)
+    return df
+
+
+def fetch_window(window, api_url=API_URL):
+    path = window_path(window)
+    try:
+        df = download_window(window, api_url=api_url)
+        save_csv(df, path)
+        save_fetch_date(path)
+        return path
     except Exception as e:
-        logger.error(f"Error al descargar o procesar los datos: {e}")
+        logger.error(f"Error al descargar la ventana {window[0]} – {window[1]}: {e}")
         return None
 
 
+def download_and_process_data(start_date=START_DATE, end_date=END_DATE, api_url=API_URL,
+                              max_workers=MAX_WORKERS):
+    """
+    Descarga en paralelo las ventanas faltantes o incompletas y regresa el
+    DataFrame con todas las ventanas disponibles.
+    """
+    logger.info(f"Conectando a {DATA_SOURCE_1}…")
+
+    windows = build_windows(start_date, end_date)
+    pending = [w for w in windows if not is_window_complete(w, window_path(w))]
+    logger.info(f"Ventanas: {len(windows)} en total, {len(pending)} por descargar.")
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(fetch_window, pending, [api_url] * len(pending)))
+
+    paths = [window_path(w) for w in windows if window_path(w).exists()]
+    if not paths:
+        logger.error("No se pudo obtener ninguna ventana de datos de clima.")
+        return None
+
+    df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    df = df.drop_duplicates(subset="date").sort_values("date", ignore_index=True)
+
+    logger.info(f"Descargados {len(df)} registros de clima.")
+    return df
+
+
 # Guardado y documentación
 
 def save_csv(df, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(path, index=False)
     logger.info(f"Datos guardados exitosamente en: {path.relative_to(ROOT_DIR)}")
 
 
-def generate_documentation():
+def generate_documentation(start_date=START_DATE, end_date=END_DATE):
     contenido = f"""
 # ===============================================
 # DESCRIPCIÓN DE FUENTES DE DATOS - CLIMA HMO
@@ -107,7 +232,7 @@ def generate_documentation():
 - **Enlace:** {DATA_URL_1}
 - **Fecha de Descarga:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 - **Ubicación:** {CITY_NAME} (Lat: {LATITUDE}, Lon: {LONGITUDE})
-- **Rango de Fechas de los Datos:** {START_DATE} a {END_DATE}
+- **Rango de Fechas de los Datos:** {start_date} a {resolve_end_date(end_date)}
 
 - **Variables Descargadas:**
     - temperature_2m
@@ -119,20 +244,30 @@ def generate_documentation():
     - wind_speed_10m
 
 - **Frecuencia Temporal:** Horaria
-- **Formato de los Datos:** CSV
+- **Formato de los Datos:** CSV (una ventana mensual por archivo en clima/ventanas)
 """
 
     RAW_METADATA_PATH.write_text(contenido, encoding="utf-8")
     logger.info(f"Documentación generada en: {RAW_METADATA_PATH.relative_to(ROOT_DIR)}")
 
 
-if __name__ == "__main__":
-    logger.info("Estructura de carpetas verificada.")
-
-    df = download_and_process_data()
+@instrumented('process_download_clima')
+def process_download_clima():
+    with instrument('descargar_ventanas') as m:
+        df = download_and_process_data()
+        m.rows_out(0 if df is None else len(df))
 
     if df is not None:
-        save_csv(df, RAW_DATA_PATH)
-        generate_documentation()
+        with instrument('guardar') as m:
+            save_csv(df, RAW_DATA_PATH)
+            generate_documentation()
+            m.rows_out(len(df))
+            m.file_out(RAW_DATA_PATH)
 
     logger.info("Proceso de descarga de clima completado.")
+    return RAW_DATA_PATH
+
+
+if __name__ == "__main__":
+    logger.info("Estructura de carpetas verificada.")
+    process_download_clima()
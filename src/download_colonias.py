@@ -7,12 +7,12 @@ Guarda los datos en data/raw/colonias
 
 from config import RAW_DIR, get_logger
 from zip_utils import download_zip
+from instrumentation import instrument, instrumented
 from datetime import datetime
 from pathlib import Path
 
 # Paths
 COLONIAS_DIR = RAW_DIR / "colonias"
-COLONIAS_DIR.mkdir(exist_ok=True)
 
 # Logger
 logger = get_logger(Path(__file__).name)
@@ -21,11 +21,16 @@ logger = get_logger(Path(__file__).name)
 URL_COLONIAS = r"https://www.inegi.org.mx/contenidos/productos/prod_serv/contenidos/espanol/bvinegi/productos/geografia/delimitaciones/794551132180_s.zip"
 
 
+@instrumented('download_colonias')
 def download_colonias():
     start = datetime.now()
     logger.info("Inicia proceso de descarga COLONIAS-INEGI: ")
 
-    zip_path = download_zip(URL_COLONIAS, COLONIAS_DIR)
+    COLONIAS_DIR.mkdir(parents=True, exist_ok=True)
+    with instrument('descargar_zip') as m:
+        zip_path = download_zip(URL_COLONIAS, COLONIAS_DIR)
+        if zip_path is not None:
+            m.file_out(zip_path)
 
     elapsed = (datetime.now() - start).total_seconds()
 
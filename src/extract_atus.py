@@ -7,6 +7,7 @@ Automatiza la extracción del conjunto de datos ATUS: descarga y descomprime los
 from config import ROOT_DIR, get_logger
 from zip_utils import extract_all_zips, get_zip_paths
 from download_atus import download_atus, ATUS_DIR
+from instrumentation import instrument, instrumented
 from pathlib import Path
 from datetime import datetime
 
@@ -15,6 +16,7 @@ from datetime import datetime
 logger = get_logger(Path(__file__).name)
 
 
+@instrumented('process_extraction_atus')
 def process_extraction_atus():
     start = datetime.now()
     logger.info(f'Inicia proceso de exrtacción ATUS:')
@@ -25,7 +27,10 @@ def process_extraction_atus():
         logger.warning(f'No se encontraron archivos ZIP en el directorio {ATUS_DIR.relative_to(ROOT_DIR)}. ')
         zip_paths = download_atus()
     
-    extracted_paths = extract_all_zips(zip_paths, ATUS_DIR)
+    with instrument('descomprimir') as m:
+        m.bytes_in(sum(p.stat().st_size for p in filter(None, zip_paths)))
+        extracted_paths = extract_all_zips(zip_paths, ATUS_DIR)
+        m.rows_out(len(extracted_paths))
     
     end = datetime.now()
     elapsed = (end - start).total_seconds()
@@ -13,6 +13,7 @@ from pathlib import Path
 from datetime import datetime
 import requests
 from bs4 import BeautifulSoup
+from instrumentation import instrument, instrumented
 
 # Configuración de rutas para almacenamiento de datos
 ROOT = Path().resolve()  # Directorio raíz del proyecto
@@ -353,6 +354,7 @@ def get_available_years():
         return []
 
 
+@instrumented('extract_bachometro')
 def main(years=None):
     """
     Función principal que orquesta la extracción de datos del Bachómetro.
@@ -377,7 +379,9 @@ def main(years=None):
     # Procesa cada año solicitado
     for year in years: 
         print(f'\nObteniendo datos del año {year}...')
-        dataset = client.get_full_dataset(year, parse_bache_details)
+        with instrument('descargar_anio', anio=year) as m:
+            dataset = client.get_full_dataset(year, parse_bache_details)
+            m.rows_out(len(dataset or []))
 
         if not dataset: 
             print(f'Error al obtener los datos del año {year}, siguiente...')
@@ -386,8 +390,11 @@ def main(years=None):
         
         # Guarda los datos en archivo JSON
         output_file = output_dir / f"baches_{year}.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(dataset, f, indent=2, ensure_ascii=False)        
+        with instrument('guardar_json', anio=year) as m:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(dataset, f, indent=2, ensure_ascii=False)        
+            m.rows_out(len(dataset))
+            m.file_out(output_file)
         
         print(f'Datos guardados en: {output_file.relative_to(ROOT)}')
         
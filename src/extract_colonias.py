@@ -8,6 +8,7 @@ Guarda los resultados filtrados en data/raw/colonias
 from config import ROOT_DIR, get_logger
 from zip_utils import get_zip_paths, extract_all_zips
 from download_colonias import COLONIAS_DIR, download_colonias
+from instrumentation import instrument, instrumented
 from pathlib import Path
 from datetime import datetime
 
@@ -15,6 +16,7 @@ from datetime import datetime
 logger = get_logger(Path(__file__).name)
 
 
+@instrumented('process_extraction_colonias')
 def process_extraction_colonias():
     start = datetime.now()
     logger.info('Inicia proceso de extracción COLONIAS-INEGI: ')
@@ -24,7 +26,10 @@ def process_extraction_colonias():
         logger.warning(f'No se encontraron archivos ZIP en el directorio {COLONIAS_DIR.relative_to(ROOT_DIR)}')
         zip_paths = download_colonias()
 
-    extracted_paths = extract_all_zips(zip_paths, COLONIAS_DIR)
+    with instrument('descomprimir') as m:
+        m.bytes_in(sum(p.stat().st_size for p in filter(None, zip_paths)))
+        extracted_paths = extract_all_zips(zip_paths, COLONIAS_DIR)
+        m.rows_out(len(extracted_paths))
         
     elapsed = (datetime.now() - start).total_seconds()
     logger.info(f'Proceso de extracción COLONIAS-INEGI completado en {elapsed:.2f} s')
@@ -7,27 +7,35 @@ Guarda los resultados limpios en data/processed
 """
 
 from config import ROOT_DIR, RAW_DIR, get_logger
+from instrumentation import instrument, instrumented
 from datetime import datetime
 import warnings
 from pathlib import Path
-import osmnx as ox
-
-warnings.filterwarnings('ignore')
 
 # Paths
 RAW_VIALIDADES_DIR = RAW_DIR / "vialidades"
-RAW_VIALIDADES_DIR.mkdir(exist_ok=True)
-
 CACHE_DIR = RAW_VIALIDADES_DIR / "cache_osmnx"
-CACHE_DIR.mkdir(exist_ok=True)
 
 # Logger
 logger = get_logger(Path(__file__).name)
 
-# Configuración de OSMnx
-ox.settings.use_cache = True
-ox.settings.cache_folder = str(CACHE_DIR)
-ox.settings.log_console = False
+
+def get_osmnx():
+    """
+    Importa y configura OSMnx al usarse por primera vez; importarlo (y crear su
+    caché) al cargar el módulo hacía lento cualquier script que sólo necesitara
+    las rutas de este archivo.
+    """
+    import osmnx as ox
+
+    warnings.filterwarnings('ignore')
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Configuración de OSMnx
+    ox.settings.use_cache = True
+    ox.settings.cache_folder = str(CACHE_DIR)
+    ox.settings.log_console = False
+    return ox
 
 
 def download_hmo_roads(network_type="drive", simplify=False):
@@ -36,6 +44,7 @@ def download_hmo_roads(network_type="drive", simplify=False):
     start = datetime.now()
     logger.info(f'Descargando red vial de {place} (tipo={network_type})...')
 
+    ox = get_osmnx()
     G = ox.graph_from_place(place, network_type=network_type, simplify=simplify)
 
     end = datetime.now()
@@ -47,7 +56,7 @@ def download_hmo_roads(network_type="drive", simplify=False):
 
 def export_graph_to_shapefiles(G, output_dir=RAW_VIALIDADES_DIR):
     logger.info('Convirtiendo grafo a shapefiles...')
-    nodes, edges = ox.graph_to_gdfs(G)
+    nodes, edges = get_osmnx().graph_to_gdfs(G)
 
     edges_dir = output_dir / "edges"
     nodes_dir = output_dir / "nodes"
@@ -71,7 +80,7 @@ def export_graph_to_shapefiles(G, output_dir=RAW_VIALIDADES_DIR):
 def export_graph_to_geojson(G, output_dir=RAW_VIALIDADES_DIR):
 
     logger.info('Convirtiendo grafo a GeoJSON...')
-    nodes, edges = ox.graph_to_gdfs(G)
+    nodes, edges = get_osmnx().graph_to_gdfs(G)
 
     # Crear directorios
     edges_dir = output_dir / "edges"
@@ -93,13 +102,24 @@ def export_graph_to_geojson(G, output_dir=RAW_VIALIDADES_DIR):
     return nodes_path, edges_path
 
 
+@instrumented('process_extraction_vialidades')
 def process_extraction_vialidades(): 
     start = datetime.now()
     logger.info('Inicia proceso de extracción VIALIDADES-OSM: ')
 
-    G = download_hmo_roads()
-    nodes_path, edges_path, = export_graph_to_shapefiles(G)
-    nodes_geojson_path, edges_geojson_path = export_graph_to_geojson(G)
+    with instrument('descargar_red') as m:
+        G = download_hmo_roads()
+        m.rows_out(G.number_of_edges())
+
+    with instrument('exportar_shapefiles') as m:
+        nodes_path, edges_path, = export_graph_to_shapefiles(G)
+        m.file_out(edges_path)
+        m.file_out(nodes_path)
+
+    with instrument('exportar_geojson') as m:
+        nodes_geojson_path, edges_geojson_path = export_graph_to_geojson(G)
+        m.file_out(edges_geojson_path)
+        m.file_out(nodes_geojson_path)
 
     end = datetime.now()
     elapsed = (end - start).total_seconds()
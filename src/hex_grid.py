@@ -0,0 +1,300 @@
+"""
+hex_grid.py
+
+Agrega baches y accidentes en una malla regular (hexagonal o cuadrada) a
+varias resoluciones, como alternativa a las colonias, cuyo tamaño varía mucho.
+
+La celda de cada punto se calcula con aritmética sobre las coordenadas
+proyectadas (METRIC_CRS), sin operaciones de geometría por punto. Para cada
+conjunto de datos y resolución se guarda una matriz dispersa celda × mes en
+data/interim/grid/ junto con una huella (hash) de los registros de cada mes;
+al actualizar sólo se recalculan los meses cuya huella cambió, incluidos los
+meses antiguos que reciben registros tardíos.
+
+Sólo se agregan los puntos dentro de la zona urbana de Hermosillo (BBOX_HMO):
+una coordenada errónea (p. ej. 0, 0) extendería la malla, y la matriz de pesos
+de hotspots, que cubre todo el rectángulo de la malla, por miles de km.
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from proximity_baches import load_baches
+from projection import frame_xy
+from schemas import read_dataset
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+GRID_DIR = INTERIM_DIR / "grid"
+ATUS_CLEAN_PATH = PROCESSED_DIR / "atus" / "atus_clean.parquet"
+
+# Zona urbana de Hermosillo (lon/lat), la misma que usa clean_atus
+BBOX_HMO = (-111.075, 28.900, -110.900, 29.200)
+
+# Resoluciones por defecto (m): radio del hexágono o lado del cuadrado
+RESOLUCIONES_M = (250, 500, 1000)
+
+SQRT3 = np.sqrt(3)
+
+# Columnas de coordenadas y fecha de cada conjunto de datos
+DATASETS = {
+    'atus': {'lon': 'longitud', 'lat': 'latitud', 'fecha': 'datetime'},
+    'baches': {'lon': 'longitude', 'lat': 'latitude', 'fecha': 'fecha_reporte'},
+}
+
+
+def hex_cells(x, y, size):
+    """
+    Coordenadas axiales (q, r) del hexágono (vértice arriba, radio `size`) que
+    contiene cada punto, con redondeo cúbico vectorizado.
+    """
+    q = (SQRT3 / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype('int64'), rr.astype('int64')
+
+
+def square_cells(x, y, size):
+    return np.floor(x / size).astype('int64'), np.floor(y / size).astype('int64')
+
+
+def cell_centers(q, r, size, kind='hex'):
+    """
+    Centro proyectado de cada celda, para graficar o unir con otras mallas.
+    """
+    q, r = np.asarray(q), np.asarray(r)
+    if kind == 'hex':
+        return size * SQRT3 * (q + r / 2), size * 1.5 * r
+    return (q + 0.5) * size, (r + 0.5) * size
+
+
+def encode_cells(q, r):
+    """Codifica (q, r) en un solo entero de 64 bits."""
+    return (q.astype('int64') << 32) | (r.astype('int64') & 0xFFFFFFFF)
+
+
+def decode_cells(codes):
+    q = codes >> 32
+    r = (codes & 0xFFFFFFFF).astype('int64')
+    r = np.where(r >= 2**31, r - 2**32, r)
+    return q, r
+
+
+def extent_cells(cells, kind='hex'):
+    """
+    Códigos (ordenados) de todas las celdas del rectángulo que cubre a `cells`,
+    incluidas las vacías. En la malla hexagonal el rectángulo se toma en
+    coordenadas de desplazamiento (columna, fila) para no cubrir un rombo.
+    """
+    cells = np.asarray(cells, dtype='int64')
+    if not len(cells):
+        return cells
+    q, r = decode_cells(cells)
+    col = q + r // 2 if kind == 'hex' else q
+    cols, rows = np.meshgrid(np.arange(col.min(), col.max() + 1), np.arange(r.min(), r.max() + 1))
+    cols, rows = cols.ravel(), rows.ravel()
+    q_all = cols - rows // 2 if kind == 'hex' else cols
+    return np.sort(encode_cells(q_all, rows))
+
+
+class GridCounts:
+    """
+    Conteos celda × mes en formato disperso (CSR), con los catálogos de celdas
+    (códigos ordenados) y meses (ordinales de periodo mensual) que indexan las
+    filas y columnas, y la huella de los registros de cada mes agregado.
+    """
+
+    def __init__(self, size, kind='hex', cells=None, months=None, matrix=None, fingerprints=None):
+        self.size = size
+        self.kind = kind
+        self.cells = np.array([], dtype='int64') if cells is None else np.asarray(cells)
+        self.months = np.array([], dtype='int64') if months is None else np.asarray(months)
+        self.matrix = (
+            sparse.csr_matrix((len(self.cells), len(self.months)), dtype='int32')
+            if matrix is None else matrix.tocsr()
+        )
+        self.fingerprints = pd.Series(dtype='uint64') if fingerprints is None else fingerprints
+
+    def locate(self, x, y):
+        cell_fn = hex_cells if self.kind == 'hex' else square_cells
+        return encode_cells(*cell_fn(x, y, self.size))
+
+    def update(self, x, y, months, replace=()):
+        """
+        Agrega los puntos dados; los meses presentes en la entrada y los de
+        `replace` reemplazan por completo a las columnas existentes de esos
+        meses (un mes de `replace` sin puntos queda vacío). Las celdas que se
+        quedan sin conteos salen del catálogo, igual que en una reconstrucción.
+        """
+        valid = np.isfinite(x) & np.isfinite(y) & (months >= 0)
+        codes = self.locate(x[valid], y[valid])
+        months = months[valid]
+
+        new_months = np.unique(months)
+        keep = ~np.isin(self.months, np.union1d(new_months, np.asarray(replace, dtype='int64')))
+        all_cells = np.union1d(self.cells, codes)
+        all_months = np.union1d(self.months[keep], new_months)
+
+        # Reubicar los conteos conservados en los nuevos catálogos
+        old = self.matrix[:, np.flatnonzero(keep)].tocoo()
+        rows = np.searchsorted(all_cells, self.cells[old.row])
+        cols = np.searchsorted(all_months, self.months[keep][old.col])
+
+        new_rows = np.searchsorted(all_cells, codes)
+        new_cols = np.searchsorted(all_months, months)
+
+        self.matrix = sparse.csr_matrix(
+            (
+                np.concatenate([old.data, np.ones(len(codes), dtype='int32')]),
+                (np.concatenate([rows, new_rows]), np.concatenate([cols, new_cols])),
+            ),
+            shape=(len(all_cells), len(all_months)),
+            dtype='int32',
+        )
+        occupied = np.diff(self.matrix.indptr) > 0
+        self.matrix = self.matrix[occupied]
+        self.cells, self.months = all_cells[occupied], all_months
+        return self
+
+    def to_frame(self):
+        """
+        Tabla larga (q, r, x, y, mes, conteo) con las celdas no vacías.
+        """
+        coo = self.matrix.tocoo()
+        q, r = decode_cells(self.cells[coo.row])
+        cx, cy = cell_centers(q, r, self.size, self.kind)
+        months = pd.PeriodIndex.from_ordinals(self.months[coo.col], freq='M')
+        return pd.DataFrame({
+            'q': q, 'r': r, 'x': cx, 'y': cy,
+            'mes': months.to_timestamp(),
+            'conteo': coo.data,
+        })
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        m = self.matrix
+        np.savez_compressed(
+            path, size=self.size, kind=self.kind, cells=self.cells, months=self.months,
+            data=m.data, indices=m.indices, indptr=m.indptr, shape=m.shape,
+            fp_months=self.fingerprints.index.to_numpy(dtype='int64'),
+            fp_values=self.fingerprints.to_numpy(dtype='uint64'),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            # Las mallas guardadas sin huellas se recalculan completas
+            fingerprints = (pd.Series(f['fp_values'], index=f['fp_months'], dtype='uint64')
+                            if 'fp_months' in f else None)
+            return cls(float(f['size']), str(f['kind']), f['cells'], f['months'], matrix, fingerprints)
+
+
+def month_ordinals(times):
+    """Ordinal del periodo mensual de cada fecha (-1 para fechas nulas)."""
+    periods = pd.to_datetime(times, errors='coerce').dt.to_period('M')
+    return np.where(periods.isna(), -1, periods.array.asi8).astype('int64')
+
+
+def monthly_fingerprints(df, dataset, months):
+    """
+    Huella de cada mes: suma (módulo 2**64) de los hashes de fecha y
+    coordenadas de sus registros, como en segment_rates.
+    """
+    cols = DATASETS[dataset]
+    hashes = pd.util.hash_pandas_object(df[[cols['fecha'], cols['lon'], cols['lat']]], index=False)
+    fp = pd.Series(hashes.to_numpy(), dtype='uint64').groupby(months).sum()
+    return fp[fp.index >= 0]
+
+
+def changed_months(new, old):
+    """Meses con huella distinta, nuevos o que ya no tienen registros."""
+    new, old = new.to_dict(), old.to_dict()
+    return np.array(sorted(m for m in new.keys() | old.keys() if new.get(m) != old.get(m)), dtype='int64')
+
+
+def in_bbox(df, dataset, bbox=BBOX_HMO):
+    """Máscara de los registros con lon/lat dentro de bbox (falso si son nulas)."""
+    cols = DATASETS[dataset]
+    lon, lat = df[cols['lon']], df[cols['lat']]
+    return ((lon >= bbox[0]) & (lon <= bbox[2]) & (lat >= bbox[1]) & (lat <= bbox[3])).to_numpy()
+
+
+def grid_path(dataset, size, kind='hex'):
+    return GRID_DIR / f"{dataset}_{kind}{size:g}m.npz"
+
+
+def build_grid(df, dataset, size, kind='hex', incremental=True):
+    """
+    Construye (o actualiza) la matriz celda × mes de `dataset` a una resolución.
+    En modo incremental sólo se recalculan los meses cuya huella cambió
+    respecto a la guardada (meses nuevos, con registros tardíos o corregidos,
+    o que se quedaron sin registros).
+    """
+    cols = DATASETS[dataset]
+    path = grid_path(dataset, size, kind)
+
+    inside = in_bbox(df, dataset)
+    if not inside.all():
+        logger.warning(f'{dataset}: {int((~inside).sum())} registros fuera de BBOX_HMO o sin coordenadas, se omiten')
+        df = df[inside]
+    months = month_ordinals(df[cols['fecha']])
+    fingerprints = monthly_fingerprints(df, dataset, months)
+
+    if incremental and path.exists():
+        grid = GridCounts.load(path)
+        changed = changed_months(fingerprints, grid.fingerprints)
+        rows = np.isin(months, changed)
+        df, months = df[rows], months[rows]
+        logger.info(f'{path.name}: {len(changed)} meses con cambios, {len(df)} registros a recalcular')
+    else:
+        grid = GridCounts(size, kind)
+        changed = ()
+
+    x, y = frame_xy(df, cols['lon'], cols['lat'])
+    grid.update(x, y, months, replace=changed)
+    grid.fingerprints = fingerprints
+    grid.save(path)
+    return grid
+
+
+def process_grid_aggregation(resolutions=RESOLUCIONES_M, kind='hex', incremental=True):
+    start = datetime.now()
+    logger.info('Inicia la agregación en malla de baches y accidentes')
+
+    frames = {
+        'atus': read_dataset(ATUS_CLEAN_PATH, 'atus'),
+        'baches': load_baches(),
+    }
+
+    paths = []
+    for dataset, df in frames.items():
+        for size in resolutions:
+            grid = build_grid(df, dataset, size, kind, incremental=incremental)
+            logger.info(
+                f'{dataset} {kind} {size} m: {len(grid.cells)} celdas × {len(grid.months)} meses, '
+                f'{grid.matrix.nnz} entradas no vacías'
+            )
+            paths.append(grid_path(dataset, size, kind))
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Agregación en malla completada en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {GRID_DIR.relative_to(ROOT_DIR)}')
+    return paths
+
+
+if __name__ == '__main__':
+    process_grid_aggregation()
@@ -0,0 +1,338 @@
+"""
+hotspots.py
+
+Estadísticos de autocorrelación espacial sobre conteos de accidentes y baches
+por colonia o por celda de malla: Getis-Ord Gi*, I de Moran global y local.
+
+Las matrices de pesos espaciales se construyen una sola vez como matrices
+dispersas (contigüidad tipo reina entre polígonos de clean_colonias, o banda
+de distancia entre centros de todas las celdas del rectángulo que cubre la
+malla de hex_grid, con conteo cero en las vacías) y se guardan en
+data/interim/weights/. Los estadísticos se calculan con productos de matrices
+dispersas y la inferencia por permutaciones se reparte en un pool de procesos.
+
+Guarda los resultados en data/processed/hotspots/
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from assign_colonias import COLONIAS_PATH, get_source_signature, assign_colonias
+from hex_grid import GridCounts, grid_path, decode_cells, cell_centers, extent_cells, ATUS_CLEAN_PATH
+from proximity_baches import load_baches
+from schemas import read_dataset
+import os
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import sparse
+from scipy.spatial import cKDTree
+from scipy.stats import norm
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+WEIGHTS_DIR = INTERIM_DIR / "weights"
+HOTSPOTS_DIR = PROCESSED_DIR / "hotspots"
+
+# Parámetros por defecto
+N_PERMUTACIONES = 999
+SEMILLA = 20240601
+LOTE = 100
+
+
+# Matrices de pesos
+
+def queen_weights(gdf):
+    """
+    Contigüidad tipo reina: dos polígonos son vecinos si comparten al menos un punto.
+    """
+    geoms = gdf.geometry.values
+    left, right = gdf.sindex.query(geoms, predicate='intersects')
+    mask = left != right
+    n = len(gdf)
+    return sparse.csr_matrix(
+        (np.ones(mask.sum(), dtype='float64'), (left[mask], right[mask])), shape=(n, n)
+    )
+
+
+def distance_band_weights(x, y, threshold):
+    """
+    Banda de distancia: vecinos a menos de `threshold` metros (pesos binarios).
+    """
+    tree = cKDTree(np.column_stack([x, y]))
+    pairs = tree.query_pairs(threshold, output_type='ndarray')
+    n = len(x)
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+
+
+def row_standardize(w):
+    sums = np.asarray(w.sum(axis=1)).ravel()
+    inv = np.divide(1.0, sums, out=np.zeros_like(sums), where=sums > 0)
+    return sparse.diags(inv) @ w
+
+
+def save_weights(w, ids, path, signature):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sparse.save_npz(path, w.tocsr())
+    meta = {'ids': [str(i) for i in ids], 'signature': list(map(str, signature))}
+    path.with_suffix('.json').write_text(json.dumps(meta), encoding='utf-8')
+
+
+def load_weights(path, signature):
+    meta_path = path.with_suffix('.json')
+    if not path.exists() or not meta_path.exists():
+        return None, None
+    meta = json.loads(meta_path.read_text(encoding='utf-8'))
+    if meta['signature'] != list(map(str, signature)):
+        return None, None
+    return sparse.load_npz(path).tocsr(), meta['ids']
+
+
+def colonias_weights(source_path=COLONIAS_PATH, rebuild=False):
+    """
+    Pesos de contigüidad entre colonias, con cache invalidada por la firma del archivo.
+    """
+    path = WEIGHTS_DIR / "colonias_queen.npz"
+    signature = get_source_signature(source_path)
+
+    if not rebuild:
+        w, ids = load_weights(path, signature)
+        if w is not None:
+            logger.info(f'Pesos de colonias cargados desde cache ({w.shape[0]} colonias)')
+            return w, ids
+
+    gdf = gpd.read_file(source_path)
+    w = queen_weights(gdf)
+    ids = gdf['cvegeo'].astype(str).tolist()
+    save_weights(w, ids, path, signature)
+    logger.info(f'Pesos de colonias construidos: {w.shape[0]} colonias, {w.nnz} vínculos')
+    return w, ids
+
+
+def grid_weights(grid, threshold, rebuild=False):
+    """
+    Pesos de banda de distancia entre todas las celdas del rectángulo que
+    cubre una malla de hex_grid (vacías incluidas), con los códigos de celda
+    en el orden de las filas. La cache se invalida con un hash de esos
+    códigos, la resolución y el tipo de malla.
+    """
+    path = WEIGHTS_DIR / f"grid_{grid.kind}{grid.size:g}m_d{threshold:g}.npz"
+    cells = extent_cells(grid.cells, grid.kind)
+    signature = (hashlib.sha1(cells.tobytes()).hexdigest(), len(cells), f'{grid.size:g}', grid.kind, f'{threshold:g}')
+
+    if not rebuild:
+        w, _ = load_weights(path, signature)
+        if w is not None:
+            return w, cells
+
+    q, r = decode_cells(cells)
+    x, y = cell_centers(q, r, grid.size, grid.kind)
+    w = distance_band_weights(x, y, threshold)
+    save_weights(w, cells.tolist(), path, signature)
+    return w, cells
+
+
+def grid_values(grid, cells):
+    """Conteo total (todos los meses) de cada celda de `cells`; cero en las vacías."""
+    values = np.zeros(len(cells), dtype='int64')
+    values[np.searchsorted(cells, grid.cells)] = np.asarray(grid.matrix.sum(axis=1)).ravel()
+    return values
+
+
+# Estadísticos
+
+def getis_ord_gi_star(values, w):
+    """
+    Gi* (incluye a la propia unidad) como z-score, con su valor p bilateral.
+    """
+    x = np.asarray(values, dtype='float64')
+    n = len(x)
+    w_star = (w + sparse.identity(n, format='csr')).tocsr()
+    w_star.data[:] = 1.0
+
+    x_bar = x.mean()
+    s = np.sqrt((x ** 2).mean() - x_bar ** 2)
+
+    w_sum = np.asarray(w_star.sum(axis=1)).ravel()
+    w_sq_sum = np.asarray(w_star.multiply(w_star).sum(axis=1)).ravel()
+
+    numerator = w_star @ x - x_bar * w_sum
+    denominator = s * np.sqrt((n * w_sq_sum - w_sum ** 2) / (n - 1))
+    z = np.divide(numerator, denominator, out=np.zeros(n), where=denominator > 0)
+    return z, 2 * norm.sf(np.abs(z))
+
+
+def moran_global(values, w):
+    z = np.asarray(values, dtype='float64')
+    z = z - z.mean()
+    w = row_standardize(w)
+    return len(z) / w.sum() * (z @ (w @ z)) / (z @ z)
+
+
+def moran_local(values, w):
+    z = np.asarray(values, dtype='float64')
+    z = z - z.mean()
+    m2 = (z @ z) / len(z)
+    return z / m2 * (row_standardize(w) @ z)
+
+
+class MoranPermutations:
+    """
+    Inferencia condicional por permutaciones para la I de Moran local y global.
+
+    Para la local, en cada permutación se toma una permutación aleatoria de las
+    otras n - 1 unidades, compartida por todas las unidades (como en PySAL), y
+    cada unidad usa sus primeros k_i elementos como vecinos simulados.
+    """
+
+    def __init__(self, values, w):
+        z = np.asarray(values, dtype='float64')
+        self.z = z - z.mean()
+        self.m2 = (self.z @ self.z) / len(z)
+        self.w = row_standardize(w).tocsr()
+        self.s0 = self.w.sum()
+
+        # Pesos de cada unidad rellenados a la máxima cantidad de vecinos
+        counts = np.diff(self.w.indptr)
+        self.k_max = int(counts.max()) if len(counts) else 0
+        self.w_pad = np.zeros((len(z), self.k_max))
+        rows = np.repeat(np.arange(len(z)), counts)
+        slots = np.arange(self.w.nnz) - np.repeat(self.w.indptr[:-1], counts)
+        self.w_pad[rows, slots] = self.w.data
+
+    def local_batch(self, rng, size):
+        n = len(self.z)
+        ids = np.arange(n)[:, None]
+        result = np.empty((size, n))
+        for p in range(size):
+            perm = rng.permutation(n - 1)[:self.k_max]
+            # Saltar a la propia unidad: índices >= i se recorren en uno
+            neighbors = perm[None, :] + (perm[None, :] >= ids)
+            lag = (self.w_pad * self.z[neighbors]).sum(axis=1)
+            result[p] = self.z / self.m2 * lag
+        return result
+
+    def global_batch(self, rng, size):
+        zs = np.stack([rng.permutation(self.z) for _ in range(size)], axis=1)
+        lag = self.w @ zs
+        return len(self.z) / self.s0 * (zs * lag).sum(axis=0) / (self.z @ self.z)
+
+
+_worker_perms = None
+
+
+def _init_worker(perms):
+    global _worker_perms
+    _worker_perms = perms
+
+
+def _run_batch(args):
+    seed, size = args
+    rng = np.random.default_rng(seed)
+    return _worker_perms.local_batch(rng, size), _worker_perms.global_batch(rng, size)
+
+
+def moran_inference(values, w, n_permutations=N_PERMUTACIONES, seed=SEMILLA, batch_size=LOTE,
+                    n_workers=None):
+    """
+    I de Moran global y local con pseudo valores p por permutaciones.
+    """
+    perms = MoranPermutations(values, w)
+    sizes = [batch_size] * (n_permutations // batch_size)
+    if n_permutations % batch_size:
+        sizes.append(n_permutations % batch_size)
+    batches = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        _init_worker(perms)
+        results = [_run_batch(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(perms,)) as executor:
+            results = list(executor.map(_run_batch, batches))
+
+    local_sims = np.concatenate([r[0] for r in results])
+    global_sims = np.concatenate([r[1] for r in results])
+
+    i_local = moran_local(values, w)
+    i_global = moran_global(values, w)
+
+    # Pseudo valores p de una cola en la dirección del valor observado
+    larger = (local_sims >= i_local).sum(axis=0)
+    larger = np.minimum(larger, n_permutations - larger)
+    p_local = (larger + 1) / (n_permutations + 1)
+
+    larger_g = (global_sims >= i_global).sum()
+    larger_g = min(larger_g, n_permutations - larger_g)
+    p_global = (larger_g + 1) / (n_permutations + 1)
+
+    return i_global, p_global, i_local, p_local
+
+
+def hotspot_table(values, w, ids, name, **kwargs):
+    """
+    Tabla con Gi*, I de Moran local y sus valores p para una variable.
+    """
+    gi_z, gi_p = getis_ord_gi_star(values, w)
+    i_global, p_global, i_local, p_local = moran_inference(values, w, **kwargs)
+    logger.info(f'{name}: I de Moran global = {i_global:.4f} (p = {p_global:.4f})')
+
+    return pd.DataFrame({
+        'id': ids,
+        name: np.asarray(values),
+        f'{name}_gi_z': gi_z.astype('float32'),
+        f'{name}_gi_p': gi_p.astype('float32'),
+        f'{name}_moran_local': i_local.astype('float32'),
+        f'{name}_moran_p': p_local.astype('float32'),
+    })
+
+
+def colonia_counts(ids):
+    """
+    Conteo de accidentes y baches por colonia (en el orden de `ids`).
+    """
+    atus = assign_colonias(read_dataset(ATUS_CLEAN_PATH, 'atus'), lon_col='longitud', lat_col='latitud')
+    baches = assign_colonias(load_baches())
+    counts = pd.DataFrame(index=pd.Index(ids, name='cvegeo'))
+    counts['accidentes'] = atus['cvegeo'].astype(str).value_counts().reindex(ids, fill_value=0)
+    counts['baches'] = baches['cvegeo'].astype(str).value_counts().reindex(ids, fill_value=0)
+    return counts
+
+
+def process_hotspots(grid_size=500, threshold=1000, **kwargs):
+    start = datetime.now()
+    logger.info('Inicia el cálculo de puntos calientes (Gi*, I de Moran)')
+    HOTSPOTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Por colonia
+    w, ids = colonias_weights()
+    counts = colonia_counts(ids)
+    tables = [hotspot_table(counts[col].to_numpy(), w, ids, col, **kwargs) for col in counts]
+    result = tables[0].merge(tables[1], on='id').rename(columns={'id': 'cvegeo'})
+    result.to_parquet(HOTSPOTS_DIR / "hotspots_colonias.parquet", index=False)
+
+    # Por celda de malla (conteos totales de todos los meses)
+    for dataset in ['atus', 'baches']:
+        path = grid_path(dataset, grid_size)
+        if not path.exists():
+            logger.warning(f'No existe la malla {path.name}; ejecuta hex_grid.py primero')
+            continue
+        grid = GridCounts.load(path)
+        w, cells = grid_weights(grid, threshold)
+        table = hotspot_table(grid_values(grid, cells), w, cells, dataset, **kwargs)
+        table.to_parquet(HOTSPOTS_DIR / f"hotspots_{dataset}_hex{grid_size}m.parquet", index=False)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Cálculo de puntos calientes completado en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {HOTSPOTS_DIR.relative_to(ROOT_DIR)}')
+
+
+if __name__ == '__main__':
+    process_hotspots()
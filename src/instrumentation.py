@@ -0,0 +1,243 @@
+"""
+instrumentation.py
+
+Mediciones de desempeño por etapa y sub-paso del pipeline: tiempo de reloj,
+tiempo de CPU (propio y de procesos hijos), pico de memoria residente, filas
+de entrada y salida, bytes leídos y escritos y número de peticiones HTTP.
+
+Se usa como decorador o como administrador de contexto:
+
+    @instrumented('atus_clean')
+    def process_cleaning_atus(): ...
+
+    with instrument('cargar_csvs') as m:
+        df = pd.concat(...)
+        m.rows_in(len(df))
+
+Los bloques anidados registran a su bloque padre. Cada bloque agrega una línea
+JSON al reporte de la ejecución (data/interim/runs/reporte_ejecuciones.jsonl);
+todas las líneas de una ejecución comparten el `run_id`, que el pipeline
+propaga a sus procesos con la variable de entorno PIPELINE_RUN_ID.
+
+Los bytes leídos y escritos provienen de /proc/self/io (rchar/wchar) y sólo
+están disponibles en Linux. ru_maxrss sólo conoce el pico de memoria de todo
+el proceso, así que cada bloque registra dos valores:
+
+* rss_pico_mb: pico del proceso desde que inició hasta el final del bloque
+  (el pipeline ejecuta cada etapa en un proceso nuevo, así que para una
+  etapa es su propio pico),
+* rss_pico_delta_mb: cuánto creció ese pico durante el bloque; es cero si el
+  bloque no superó un pico anterior del proceso, aunque haya usado memoria.
+"""
+
+from config import INTERIM_DIR
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import resource
+import functools
+import threading
+from datetime import datetime
+
+# Paths
+RUNS_DIR = INTERIM_DIR / "runs"
+REPORT_PATH = RUNS_DIR / "reporte_ejecuciones.jsonl"
+
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+
+# ru_maxrss está en KB en Linux y en bytes en macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+_local = threading.local()
+_http_lock = threading.Lock()
+_http_count = 0
+_http_installed = False
+
+
+def get_run_id():
+    """Identificador de la ejecución, compartido con los procesos hijos."""
+    run_id = os.environ.get(RUN_ID_ENV)
+    if not run_id:
+        run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        os.environ[RUN_ID_ENV] = run_id
+    return run_id
+
+
+def _install_http_counter():
+    """
+    Cuenta las peticiones que pasan por requests.Session.send (incluye
+    requests.get y las sesiones con reintentos).
+    """
+    global _http_installed
+    if _http_installed:
+        return
+    try:
+        import requests
+    except ImportError:
+        return
+
+    original = requests.Session.send
+
+    @functools.wraps(original)
+    def send(self, request, **kwargs):
+        global _http_count
+        with _http_lock:
+            _http_count += 1
+        return original(self, request, **kwargs)
+
+    requests.Session.send = send
+    _http_installed = True
+
+
+def _io_counters():
+    try:
+        with open('/proc/self/io') as f:
+            values = dict(line.split(':') for line in f)
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+class StageMetrics:
+    """
+    Mediciones de un bloque. `rows_in`, `rows_out`, `bytes_in` y `bytes_out`
+    permiten registrar conteos que sólo conoce el código de la etapa.
+    """
+
+    def __init__(self, name, report_path=None, **extra):
+        self.name = name
+        self.report_path = report_path
+        self.extra = extra
+        self.parent = None
+        self.record = None
+        self._rows_in = 0
+        self._rows_out = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+
+    def rows_in(self, n):
+        self._rows_in += int(n)
+
+    def rows_out(self, n):
+        self._rows_out += int(n)
+
+    def bytes_in(self, n):
+        self._bytes_in += int(n)
+
+    def bytes_out(self, n):
+        self._bytes_out += int(n)
+
+    def file_in(self, path):
+        """Suma el tamaño de un archivo leído por la etapa."""
+        self.bytes_in(os.path.getsize(path))
+
+    def file_out(self, path):
+        """Suma el tamaño de un archivo escrito por la etapa."""
+        self.bytes_out(os.path.getsize(path))
+
+    def __enter__(self):
+        _install_http_counter()
+        stack = _stack()
+        self.parent = stack[-1].name if stack else None
+        # Los bloques anidados escriben en el mismo reporte que su padre
+        if self.report_path is None:
+            self.report_path = stack[-1].report_path if stack else REPORT_PATH
+        stack.append(self)
+
+        self._start = datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._io = _io_counters()
+        self._http = _http_count
+        self._peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_children = (children.ru_utime - self._children.ru_utime) + (children.ru_stime - self._children.ru_stime)
+        rchar, wchar = _io_counters()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+        self.record = {
+            'run_id': get_run_id(),
+            'etapa': self.name,
+            'padre': self.parent,
+            'inicio': self._start.isoformat(timespec='milliseconds'),
+            'estado': 'ok' if exc_type is None else 'error',
+            'error': None if exc is None else f'{exc_type.__name__}: {exc}',
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'cpu_hijos_s': round(cpu_children, 4),
+            'rss_pico_mb': round(peak / 2**20, 1),
+            'rss_pico_delta_mb': round((peak - self._peak) / 2**20, 1),
+            'filas_entrada': self._rows_in,
+            'filas_salida': self._rows_out,
+            'bytes_leidos': None if rchar is None else rchar - self._io[0],
+            'bytes_escritos': None if wchar is None else wchar - self._io[1],
+            'bytes_entrada': self._bytes_in,
+            'bytes_salida': self._bytes_out,
+            'peticiones_http': _http_count - self._http,
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            **self.extra,
+        }
+
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        write_record(self.record, self.report_path)
+        return False
+
+
+def instrument(name, report_path=None, **extra):
+    """Administrador de contexto que mide el bloque `name`."""
+    return StageMetrics(name, report_path=report_path, **extra)
+
+
+def instrumented(name=None, report_path=None):
+    """Decorador que mide cada llamada a la función (por defecto con su nombre)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrument(name or func.__name__, report_path=report_path):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current():
+    """Bloque activo más interno, o None fuera de un bloque instrumentado."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def write_record(record, report_path=REPORT_PATH):
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    # Una sola escritura en modo append por línea, segura entre procesos
+    with open(report_path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+def read_report(report_path=REPORT_PATH, run_id=None):
+    """Lee el reporte como DataFrame, opcionalmente filtrado por ejecución."""
+    import pandas as pd
+
+    if not report_path.exists():
+        return pd.DataFrame()
+    report = pd.read_json(report_path, lines=True)
+    if run_id is not None:
+        report = report[report['run_id'] == run_id]
+    return report
@@ -0,0 +1,146 @@
+"""
+join_clima.py
+
+Une a cada evento (accidente de clean_atus o reporte de bache) el registro
+horario de clima inmediatamente anterior y la precipitación acumulada en las
+24 h, 72 h y 7 días previos.
+
+La unión es un as-of merge sobre los eventos ordenados; las precipitaciones
+acumuladas se obtienen como diferencias de una suma acumulada precalculada,
+por lo que no se filtra la tabla de clima por cada evento. Las acumuladas
+quedan nulas si el evento no tiene registro de clima dentro de TOLERANCE o si
+su ventana empieza antes del primer registro de clima.
+
+Guarda los resultados en data/processed/clima/
+"""
+
+from config import ROOT_DIR, PROCESSED_DIR, get_logger
+from clean_clima import HOURLY_PATH, PROCESSED_CLIMA_DIR, LOCAL_TZ
+from baches_store import load_store
+from schemas import read_dataset
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+ATUS_CLEAN_PATH = PROCESSED_DIR / "atus" / "atus_clean.parquet"
+ATUS_CLIMA_PATH = PROCESSED_CLIMA_DIR / "atus_clima.parquet"
+BACHES_CLIMA_PATH = PROCESSED_CLIMA_DIR / "baches_clima.parquet"
+
+# Ventanas de precipitación acumulada
+PRECIP_WINDOWS = {
+    'precip_24h': pd.Timedelta(hours=24),
+    'precip_72h': pd.Timedelta(hours=72),
+    'precip_7d': pd.Timedelta(days=7),
+}
+
+# Tolerancia máxima entre el evento y el registro de clima anterior
+TOLERANCE = pd.Timedelta(hours=2)
+
+
+def load_hourly_clima(path=HOURLY_PATH):
+    clima = read_dataset(path, 'clima')
+    return clima.sort_index()
+
+
+def to_utc(times, tz=LOCAL_TZ):
+    """
+    Convierte fechas locales sin zona horaria (como las de ATUS y Bachómetro) a
+    UTC sin zona horaria, la misma base de tiempo que el índice de clima.
+    """
+    times = pd.to_datetime(times, errors='coerce')
+    if times.dt.tz is None:
+        times = times.dt.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+    return times.dt.tz_convert('UTC').dt.tz_localize(None).astype('datetime64[ns]')
+
+
+def precip_cumsum(clima):
+    """
+    Suma acumulada de precipitación, con un cero inicial para poder restar
+    desde antes del primer registro.
+    """
+    return np.concatenate([[0.0], clima['precipitacion'].to_numpy(dtype='float64').cumsum()])
+
+
+def rolling_precip(clima_times, cumsum, event_times, windows=PRECIP_WINDOWS, matched=None):
+    """
+    Precipitación en (t - ventana, t] para cada evento, como diferencia de la
+    suma acumulada en las posiciones as-of de t y de t - ventana. Es NaN para
+    los eventos sin registro de clima (`matched` falso) y para las ventanas que
+    empiezan antes del primer registro, donde la suma estaría incompleta.
+    """
+    end = np.searchsorted(clima_times, event_times, side='right')
+    matched = np.ones(len(event_times), dtype=bool) if matched is None else np.asarray(matched)
+
+    result = {}
+    for name, window in windows.items():
+        window_start = event_times - window.to_timedelta64()
+        begin = np.searchsorted(clima_times, window_start, side='right')
+        covered = matched & (window_start >= clima_times[0]) if len(clima_times) else matched & False
+        result[name] = np.where(covered, cumsum[end] - cumsum[begin], np.nan).astype('float32')
+    return result
+
+
+def join_clima(events, time_col, clima=None, tz=LOCAL_TZ, tolerance=TOLERANCE):
+    """
+    Agrega a `events` las variables del registro horario de clima anterior a
+    `time_col` y la precipitación acumulada en las ventanas de PRECIP_WINDOWS.
+    Conserva el orden y el índice originales de `events`.
+    """
+    if clima is None:
+        clima = load_hourly_clima()
+
+    hourly = clima.rename_axis('_t').reset_index()
+    hourly['_t'] = to_utc(hourly['_t'])
+    hourly['_match'] = True
+
+    # Ordenar los eventos válidos para el as-of merge
+    event_times = to_utc(events[time_col], tz)
+    valid = event_times.notna().to_numpy()
+    keys = pd.DataFrame({'_t': event_times[valid].to_numpy(), '_pos': np.flatnonzero(valid)})
+    keys = keys.sort_values('_t', kind='stable')
+
+    joined = pd.merge_asof(keys, hourly, on='_t', direction='backward', tolerance=tolerance)
+
+    cumsum = precip_cumsum(clima)
+    matched = joined.pop('_match').notna().to_numpy()
+    precip = rolling_precip(hourly['_t'].to_numpy(), cumsum, joined['_t'].to_numpy(), matched=matched)
+    joined = joined.assign(**precip)
+
+    # Regresar al orden original
+    joined = joined.drop(columns='_t').set_index('_pos').reindex(np.arange(len(events)))
+    events = events.copy()
+    for col in joined.columns:
+        events[col] = joined[col].to_numpy()
+
+    logger.info(f'Eventos con clima asignado: {int(matched.sum())} de {len(events)}')
+    return events
+
+
+def process_join_clima():
+    start = datetime.now()
+    logger.info('Inicia el proceso de unión con CLIMA')
+
+    clima = load_hourly_clima()
+
+    atus = read_dataset(ATUS_CLEAN_PATH, 'atus')
+    atus_clima = join_clima(atus, 'datetime', clima=clima)
+    atus_clima.to_parquet(ATUS_CLIMA_PATH)
+
+    baches = load_store()
+    baches_clima = join_clima(baches, 'fecha_reporte', clima=clima)
+    baches_clima.to_parquet(BACHES_CLIMA_PATH)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Proceso de unión con CLIMA completado en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_CLIMA_DIR.relative_to(ROOT_DIR)}')
+
+    return ATUS_CLIMA_PATH, BACHES_CLIMA_PATH
+
+
+if __name__ == '__main__':
+    process_join_clima()
@@ -0,0 +1,167 @@
+"""
+kde_rasters.py
+
+Calcula superficies de densidad kernel (KDE gaussiano) de baches y accidentes
+por año o por mes.
+
+Los puntos proyectados (METRIC_CRS) se acumulan en un ráster regular sobre la
+zona urbana de Hermosillo y la densidad se obtiene convolucionando ese ráster
+con un kernel gaussiano mediante FFT, en lugar de evaluar el kernel punto por
+punto. Las superficies se guardan como arreglos float32 con su transformación
+(origen y tamaño de pixel) en data/processed/densidad/, de modo que la densidad
+en la ubicación de cualquier accidente se lee en O(1).
+"""
+
+from config import ROOT_DIR, PROCESSED_DIR, get_logger
+from proximity_baches import load_baches
+from projection import project_lonlat, frame_xy
+from hex_grid import DATASETS, ATUS_CLEAN_PATH, BBOX_HMO
+from schemas import read_dataset
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scipy.signal import fftconvolve
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+DENSIDAD_DIR = PROCESSED_DIR / "densidad"
+
+# Tamaño de pixel y ancho de banda (m)
+PIXEL_M = 50
+BANDWIDTH_M = 250
+
+# Extensión del kernel en desviaciones estándar
+KERNEL_SIGMAS = 4
+
+
+def raster_extent(bbox=BBOX_HMO, pixel=PIXEL_M):
+    """
+    Origen (esquina inferior izquierda) y forma del ráster que cubre el bbox proyectado.
+    """
+    x, y = project_lonlat([bbox[0], bbox[2], bbox[0], bbox[2]], [bbox[1], bbox[1], bbox[3], bbox[3]])
+    x0, y0 = np.floor(x.min() / pixel) * pixel, np.floor(y.min() / pixel) * pixel
+    nx = int(np.ceil((x.max() - x0) / pixel))
+    ny = int(np.ceil((y.max() - y0) / pixel))
+    return x0, y0, nx, ny
+
+
+def gaussian_kernel(bandwidth=BANDWIDTH_M, pixel=PIXEL_M):
+    radius = int(np.ceil(KERNEL_SIGMAS * bandwidth / pixel))
+    offsets = np.arange(-radius, radius + 1) * pixel
+    g = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    kernel = np.outer(g, g)
+    return kernel / kernel.sum()
+
+
+class KDERaster:
+    """
+    Pila de superficies de densidad (periodo, fila, columna) en eventos/km²,
+    con la fila 0 en el extremo sur del ráster.
+    """
+
+    def __init__(self, x0, y0, pixel, periods, surfaces, bandwidth):
+        self.x0, self.y0, self.pixel = x0, y0, pixel
+        self.periods = list(periods)
+        self.surfaces = surfaces
+        self.bandwidth = bandwidth
+
+    def cell_index(self, x, y):
+        col = np.floor((np.asarray(x) - self.x0) / self.pixel).astype('int64')
+        row = np.floor((np.asarray(y) - self.y0) / self.pixel).astype('int64')
+        _, ny, nx = self.surfaces.shape
+        inside = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        return row, col, inside
+
+    def sample(self, x, y, periods):
+        """
+        Densidad en cada punto para su periodo (NaN fuera del ráster o sin periodo).
+        """
+        row, col, inside = self.cell_index(x, y)
+        lookup = {p: i for i, p in enumerate(self.periods)}
+        layer = np.array([lookup.get(p, -1) for p in periods], dtype='int64')
+        ok = inside & (layer >= 0)
+
+        values = np.full(len(layer), np.nan, dtype='float32')
+        values[ok] = self.surfaces[layer[ok], row[ok], col[ok]]
+        return values
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path, x0=self.x0, y0=self.y0, pixel=self.pixel, bandwidth=self.bandwidth,
+            periods=np.array([str(p) for p in self.periods]), surfaces=self.surfaces,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(
+                float(f['x0']), float(f['y0']), float(f['pixel']),
+                f['periods'].tolist(), f['surfaces'], float(f['bandwidth']),
+            )
+
+
+def kde_surfaces(x, y, periods, bandwidth=BANDWIDTH_M, pixel=PIXEL_M, bbox=BBOX_HMO):
+    """
+    Calcula una superficie de densidad por cada periodo distinto en `periods`.
+    """
+    x0, y0, nx, ny = raster_extent(bbox, pixel)
+    x_edges = x0 + np.arange(nx + 1) * pixel
+    y_edges = y0 + np.arange(ny + 1) * pixel
+
+    kernel = gaussian_kernel(bandwidth, pixel)
+    km2_per_pixel = (pixel / 1000) ** 2
+
+    periods = pd.Series(periods)
+    labels = sorted(periods.dropna().unique())
+    surfaces = np.zeros((len(labels), ny, nx), dtype='float32')
+
+    for i, label in enumerate(labels):
+        mask = (periods == label).to_numpy()
+        counts, _, _ = np.histogram2d(y[mask], x[mask], bins=[y_edges, x_edges])
+        density = fftconvolve(counts, kernel, mode='same') / km2_per_pixel
+        surfaces[i] = np.clip(density, 0, None)
+
+    return KDERaster(x0, y0, pixel, labels, surfaces, bandwidth)
+
+
+def period_labels(times, freq='Y'):
+    periods = pd.to_datetime(times, errors='coerce').dt.to_period(freq)
+    return periods.astype(str).where(periods.notna(), None)
+
+
+def raster_path(dataset, freq, bandwidth=BANDWIDTH_M):
+    return DENSIDAD_DIR / f"kde_{dataset}_{freq.lower()}_{bandwidth:g}m.npz"
+
+
+def process_kde_rasters(freqs=('Y', 'M'), bandwidth=BANDWIDTH_M, pixel=PIXEL_M):
+    start = datetime.now()
+    logger.info(f'Inicia el cálculo de densidad kernel (ancho de banda {bandwidth} m)')
+
+    frames = {
+        'atus': read_dataset(ATUS_CLEAN_PATH, 'atus'),
+        'baches': load_baches(),
+    }
+
+    paths = []
+    for dataset, df in frames.items():
+        cols = DATASETS[dataset]
+        x, y = frame_xy(df, cols['lon'], cols['lat'])
+        for freq in freqs:
+            raster = kde_surfaces(x, y, period_labels(df[cols['fecha']], freq), bandwidth, pixel)
+            path = raster_path(dataset, freq, bandwidth)
+            raster.save(path)
+            paths.append(path)
+            logger.info(f'{dataset} ({freq}): {len(raster.periods)} superficies de {raster.surfaces.shape[1:]} pixeles')
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Cálculo de densidad kernel completado en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {DENSIDAD_DIR.relative_to(ROOT_DIR)}')
+    return paths
+
+
+if __name__ == '__main__':
+    process_kde_rasters()
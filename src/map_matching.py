@@ -0,0 +1,235 @@
+"""
+map_matching.py
+
+Asocia puntos (accidentes de ATUS y baches del Bachómetro) al tramo de vialidad
+más cercano de clean_vialidades, regresando el identificador del tramo, la
+distancia al tramo y la posición del punto proyectado a lo largo de él.
+
+El identificador del tramo es la arista (u, v, key) del grafo de OSMnx que
+clean_vialidades conserva, de modo que no cambia si cambia el orden o el
+número de filas de vialidades_hmo.gpkg al modificar la limpieza.
+
+Los tramos se reproyectan una sola vez a METRIC_CRS, de modo que distancias y
+posiciones están en metros, y se indexan con un STRtree que se guarda en
+data/interim/vialidades/tramos_index.pkl para reutilizarlo entre ejecuciones
+mientras el archivo de vialidades no cambie.
+
+Guarda los resultados en data/processed/vialidades/
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, METRIC_CRS, get_logger
+from assign_colonias import get_source_signature
+from proximity_baches import load_baches
+from projection import frame_xy, reproject
+from schemas import read_dataset
+import pickle
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+VIALIDADES_PATH = PROCESSED_DIR / "vialidades" / "vialidades_hmo.gpkg"
+INDEX_CACHE_PATH = INTERIM_DIR / "vialidades" / "tramos_index.pkl"
+ATUS_CLEAN_PATH = PROCESSED_DIR / "atus" / "atus_clean.parquet"
+MATCHES_PATH = PROCESSED_DIR / "vialidades" / "puntos_tramos.parquet"
+
+# Distancia máxima (m) para asociar un punto a un tramo
+MAX_DIST_M = 100
+
+# Atributos del tramo que se agregan a cada punto
+TRAMO_COLS = ['nombre_vialidad', 'tipo_vialidad', 'longitud']
+
+# Identificador estable del tramo: arista (u, v, key) del grafo de OSMnx
+TRAMO_KEY = ['u', 'v', 'key']
+TRAMO_KEY_DTYPES = {'u': 'Int64', 'v': 'Int64', 'key': 'Int8'}
+
+
+class TramosIndex:
+    """
+    STRtree sobre los tramos de vialidad proyectados, con sus atributos.
+    Internamente cada tramo se ubica por su fila en el índice (fila_tramo), que
+    sólo es válida para este índice; lo que se guarda es la llave TRAMO_KEY.
+    """
+
+    def __init__(self, gdf, source_signature=None):
+        gdf = reproject(gdf, METRIC_CRS).reset_index(drop=True)
+        missing = [c for c in TRAMO_KEY if c not in gdf.columns]
+        if missing:
+            raise ValueError(f'Faltan columnas de la llave del tramo: {missing}')
+        if gdf.duplicated(TRAMO_KEY).any():
+            raise ValueError(f'La llave {TRAMO_KEY} no es única en los tramos')
+
+        self.geometries = np.asarray(gdf.geometry.values)
+        self.attributes = pd.DataFrame(gdf.drop(columns='geometry'))
+        self.attributes.index.name = 'fila_tramo'
+        self.tree = STRtree(self.geometries)
+        self.source_signature = source_signature
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def keys(self, filas):
+        """Llave TRAMO_KEY de cada fila_tramo (nula donde la fila es -1)."""
+        filas = np.asarray(filas, dtype='int64')
+        found = filas >= 0
+        keys = self.attributes[TRAMO_KEY].iloc[np.where(found, filas, 0)].reset_index(drop=True)
+        keys = keys.astype(TRAMO_KEY_DTYPES)
+        keys.loc[~found] = pd.NA
+        return keys
+
+    def snap(self, x, y, max_distance=MAX_DIST_M):
+        """
+        Para puntos proyectados regresa fila_tramo (-1 si no hay tramo a menos
+        de `max_distance`), distancia al tramo (m), posición a lo largo del
+        tramo (m) y posición normalizada (0 a 1).
+        """
+        points = shapely.points(np.asarray(x, dtype='float64'), np.asarray(y, dtype='float64'))
+        n = len(points)
+
+        ids = np.full(n, -1, dtype='int64')
+        dist = np.full(n, np.nan)
+        pos = np.full(n, np.nan)
+        frac = np.full(n, np.nan)
+
+        valid = ~shapely.is_empty(points) & ~shapely.is_missing(points)
+        valid &= np.isfinite(shapely.get_x(points)) & np.isfinite(shapely.get_y(points))
+
+        (point_idx, tramo_idx), d = self.tree.query_nearest(
+            points[valid], max_distance=max_distance, return_distance=True, all_matches=False
+        )
+        rows = np.flatnonzero(valid)[point_idx]
+        segs = self.geometries[tramo_idx]
+
+        ids[rows] = tramo_idx
+        dist[rows] = d
+        pos[rows] = shapely.line_locate_point(segs, points[rows])
+        frac[rows] = shapely.line_locate_point(segs, points[rows], normalized=True)
+
+        return pd.DataFrame({
+            'fila_tramo': ids,
+            'dist_tramo_m': dist.astype('float32'),
+            'pos_tramo_m': pos.astype('float32'),
+            'pos_tramo_frac': frac.astype('float32'),
+        })
+
+    def match(self, frames, cols=TRAMO_COLS, max_distance=MAX_DIST_M):
+        """
+        Asocia en una sola llamada varios conjuntos de puntos. `frames` es un
+        dict nombre -> (df, lon_col, lat_col); regresa un dict con cada df y
+        la llave y las columnas del tramo asociado.
+        """
+        xs, ys, sizes = [], [], []
+        for df, lon_col, lat_col in frames.values():
+            x, y = frame_xy(df, lon_col, lat_col)
+            xs.append(x)
+            ys.append(y)
+            sizes.append(len(df))
+
+        x, y = np.concatenate(xs), np.concatenate(ys)
+        snapped = self.snap(x, y, max_distance=max_distance)
+
+        filas = snapped['fila_tramo'].to_numpy()
+        found = filas >= 0
+        attrs = self.attributes[cols].iloc[np.where(found, filas, 0)].reset_index(drop=True)
+        attrs[~found] = None
+        # 'longitud' del tramo choca con la longitud geográfica de ATUS
+        attrs = attrs.rename(columns={'longitud': 'longitud_tramo'})
+        snapped = pd.concat([self.keys(filas), snapped, attrs], axis=1)
+
+        result = {}
+        offsets = np.cumsum([0] + sizes)
+        for (name, (df, _, _)), a, b in zip(frames.items(), offsets[:-1], offsets[1:]):
+            part = snapped.iloc[a:b].set_axis(df.index)
+            result[name] = df.join(part)
+            logger.info(f'{name}: {int(found[a:b].sum())} de {b - a} puntos asociados a un tramo')
+        return result
+
+
+def save_index(index, cache_path=INDEX_CACHE_PATH):
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info(f'Índice de tramos guardado en: {cache_path.relative_to(ROOT_DIR)}')
+
+
+def load_cached_index(source_path, cache_path=INDEX_CACHE_PATH):
+    if not cache_path.exists():
+        return None
+
+    try:
+        with open(cache_path, 'rb') as f:
+            index = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+        logger.warning(f'No se pudo leer el índice en cache: {e}')
+        return None
+
+    if index.source_signature != get_source_signature(source_path):
+        logger.info('El archivo de vialidades cambió, se reconstruirá el índice.')
+        return None
+
+    return index
+
+
+def build_tramos_index(source_path=VIALIDADES_PATH, cache_path=INDEX_CACHE_PATH, rebuild=False):
+    """
+    Regresa el índice de tramos, usando la versión en cache cuando es válida.
+    """
+    start = datetime.now()
+
+    if not rebuild:
+        index = load_cached_index(source_path, cache_path)
+        if index is not None:
+            logger.info(f'Índice de tramos cargado desde cache ({len(index)} tramos)')
+            return index
+
+    logger.info(f'Construyendo índice de tramos desde {source_path.relative_to(ROOT_DIR)}')
+    gdf = gpd.read_file(source_path)
+    index = TramosIndex(gdf, source_signature=get_source_signature(source_path))
+    save_index(index, cache_path)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Índice de tramos construido en {elapsed:.2f} s ({len(index)} tramos)')
+    return index
+
+
+def process_map_matching():
+    start = datetime.now()
+    logger.info('Inicia la asociación de accidentes y baches a tramos de vialidad')
+
+    index = build_tramos_index()
+    atus = read_dataset(ATUS_CLEAN_PATH, 'atus')
+    baches = load_baches()
+
+    matched = index.match({
+        'atus': (atus, 'longitud', 'latitud'),
+        'baches': (baches, 'longitude', 'latitude'),
+    })
+
+    keep = [*TRAMO_KEY, 'dist_tramo_m', 'pos_tramo_m', 'pos_tramo_frac']
+    tables = []
+    for fuente, df in matched.items():
+        key = 'id' if fuente == 'baches' else None
+        table = df[keep].copy()
+        table.insert(0, 'fuente', fuente)
+        table.insert(1, 'id_registro', df[key].to_numpy() if key else np.arange(len(df)))
+        tables.append(table)
+
+    result = pd.concat(tables, ignore_index=True)
+    result['fuente'] = result['fuente'].astype('category')
+    result.to_parquet(MATCHES_PATH, index=False)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Asociación a tramos completada en {elapsed:.2f} s')
+    logger.info(f'Archivo guardado en {MATCHES_PATH.relative_to(ROOT_DIR)}')
+    return MATCHES_PATH
+
+
+if __name__ == '__main__':
+    process_map_matching()
@@ -0,0 +1,219 @@
+"""
+match_colonias.py
+
+Empareja el texto libre del campo `colonia` del Bachómetro con las colonias de
+INEGI (`nom_asen`) generadas por clean_colonias.
+
+Los nombres se normalizan (acentos, mayúsculas, prefijos como "col." o
+"fracc.") y se indexan por trigramas; cada consulta sólo compara contra las
+colonias que comparten trigramas con ella en lugar de contra todo el catálogo.
+Los resultados se guardan en data/interim/colonias/colonias_match_cache.json
+junto con la firma del archivo de colonias y `min_score`; si alguno cambia, la
+cache se descarta.
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from projection import WGS84, reproject
+from assign_colonias import get_source_signature
+import re
+import json
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+from datetime import datetime
+import pandas as pd
+import geopandas as gpd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+COLONIAS_PATH = PROCESSED_DIR / "colonias" / "colonias_hmo.gpkg"
+MATCH_CACHE_PATH = INTERIM_DIR / "colonias" / "colonias_match_cache.json"
+
+# Parámetros del emparejamiento
+NGRAM_SIZE = 3
+MAX_CANDIDATES = 20
+MIN_SCORE = 0.8
+
+# Prefijos genéricos que no aportan al nombre de la colonia
+PREFIJOS = re.compile(
+    r'^(col|colonia|fracc|fraccionamiento|residencial|res|ampl|ampliacion|barrio|conj|conjunto)\b\.?\s*'
+)
+
+
+def normalize_name(text):
+    """
+    Normaliza un nombre de colonia: minúsculas, sin acentos, sin signos de
+    puntuación y sin prefijos genéricos.
+    """
+    if text is None or pd.isna(text):
+        return ''
+
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.lower()
+    text = re.sub(r'[^a-z0-9 ]', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = PREFIJOS.sub('', text)
+    return text
+
+
+def get_ngrams(text, n=NGRAM_SIZE):
+    padded = f' {text} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class ColoniaMatcher:
+    """
+    Índice de bloqueo por n-gramas sobre los nombres de colonias.
+
+    Cada nombre normalizado se indexa por sus trigramas; al consultar, sólo las
+    colonias que comparten más trigramas con el texto se comparan con
+    SequenceMatcher.
+    """
+
+    def __init__(self, colonias, name_col='nom_asen', id_col='cvegeo',
+                 max_candidates=MAX_CANDIDATES, min_score=MIN_SCORE, source_signature=None):
+        self.max_candidates = max_candidates
+        self.min_score = min_score
+        self.source_signature = source_signature
+
+        colonias = colonias.reset_index(drop=True)
+        self.ids = colonias[id_col].tolist()
+        self.names = colonias[name_col].tolist()
+        self.normalized = [normalize_name(name) for name in self.names]
+
+        # Punto representativo para ubicar los registros sin coordenadas
+        if isinstance(colonias, gpd.GeoDataFrame):
+            points = reproject(colonias, WGS84).geometry.representative_point()
+            self.lon = points.x.tolist()
+            self.lat = points.y.tolist()
+        else:
+            self.lon = self.lat = [None] * len(colonias)
+
+        self.blocks = defaultdict(list)
+        for i, name in enumerate(self.normalized):
+            for gram in get_ngrams(name):
+                self.blocks[gram].append(i)
+
+        self.cache = {}
+
+    def candidates(self, normalized):
+        shared = Counter()
+        for gram in get_ngrams(normalized):
+            shared.update(self.blocks.get(gram, ()))
+        return [i for i, _ in shared.most_common(self.max_candidates)]
+
+    def match_one(self, text):
+        """
+        Regresa el mejor emparejamiento para un texto, o None si ningún
+        candidato alcanza `min_score`.
+        """
+        normalized = normalize_name(text)
+        if normalized in self.cache:
+            return self.cache[normalized]
+
+        best, best_score = None, 0.0
+        if normalized:
+            for i in self.candidates(normalized):
+                score = SequenceMatcher(None, normalized, self.normalized[i]).ratio()
+                if score > best_score:
+                    best, best_score = i, score
+
+        if best is None or best_score < self.min_score:
+            result = None
+        else:
+            result = {
+                'cvegeo': self.ids[best],
+                'nom_asen': self.names[best],
+                'score': round(best_score, 4),
+                'lon': self.lon[best],
+                'lat': self.lat[best],
+            }
+
+        self.cache[normalized] = result
+        return result
+
+    def match(self, texts):
+        """
+        Empareja una serie de textos; cada valor distinto se resuelve una sola vez.
+        """
+        texts = pd.Series(texts)
+        uniques = texts.dropna().unique()
+        resolved = {text: self.match_one(text) for text in uniques}
+
+        records = [resolved.get(text) if pd.notna(text) else None for text in texts]
+        cols = ['cvegeo', 'nom_asen', 'score', 'lon', 'lat']
+        return pd.DataFrame(
+            [r if r is not None else dict.fromkeys(cols) for r in records],
+            columns=cols,
+            index=texts.index,
+        )
+
+    def cache_metadata(self):
+        signature = None if self.source_signature is None else list(self.source_signature)
+        return {'firma': signature, 'min_score': self.min_score}
+
+    def load_cache(self, cache_path=MATCH_CACHE_PATH):
+        """
+        Carga los emparejamientos guardados si fueron calculados con el mismo
+        archivo de colonias y el mismo `min_score`; si no, los descarta.
+        """
+        if not cache_path.exists():
+            return
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+
+        metadata = {k: stored.get(k) for k in ('firma', 'min_score')} if 'emparejamientos' in stored else None
+        if metadata != self.cache_metadata():
+            logger.info('Cache de emparejamientos descartada: cambió el archivo de colonias o min_score')
+            return
+        self.cache.update(stored['emparejamientos'])
+        logger.info(f'{len(self.cache)} emparejamientos cargados desde cache')
+
+    def save_cache(self, cache_path=MATCH_CACHE_PATH):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({**self.cache_metadata(), 'emparejamientos': self.cache}, f, ensure_ascii=False, indent=2)
+        shown = cache_path.relative_to(ROOT_DIR) if cache_path.is_relative_to(ROOT_DIR) else cache_path
+        logger.info(f'Cache de emparejamientos guardada en: {shown}')
+
+
+def build_colonia_matcher(source_path=COLONIAS_PATH, cache_path=MATCH_CACHE_PATH):
+    """
+    Construye el emparejador a partir de clean_colonias y carga la cache en disco.
+    """
+    gdf = gpd.read_file(source_path)
+    matcher = ColoniaMatcher(gdf, source_signature=get_source_signature(source_path))
+    matcher.load_cache(cache_path)
+    return matcher
+
+
+def match_colonias(df, col='colonia', matcher=None, cache_path=MATCH_CACHE_PATH):
+    """
+    Agrega a df las columnas cvegeo, nom_asen, score_colonia y las coordenadas
+    del punto representativo de la colonia emparejada con `col`. Las columnas
+    que ya existan se reemplazan; las filas se alinean por posición, así que
+    el índice de df no necesita ser único.
+    """
+    start = datetime.now()
+
+    if matcher is None:
+        matcher = build_colonia_matcher(cache_path=cache_path)
+
+    matches = matcher.match(df[col])
+    matches = matches.rename(columns={
+        'score': 'score_colonia',
+        'lon': 'lon_colonia',
+        'lat': 'lat_colonia',
+    })
+    df = df.assign(**{c: matches[c].to_numpy() for c in matches.columns})
+
+    matcher.save_cache(cache_path)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    found = matches['cvegeo'].notna().sum()
+    logger.info(f'Colonias emparejadas: {found} de {len(df)} en {elapsed:.2f} s')
+    return df
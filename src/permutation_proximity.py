@@ -0,0 +1,246 @@
+"""
+permutation_proximity.py
+
+Prueba de significancia por Monte Carlo para el porcentaje de accidentes con un
+bache activo a menos de R metros (el `bache_cercano_10m` de la notebook 2.3).
+
+La distribución nula se construye de dos maneras:
+
+* 'tiempo': se permutan los intervalos [fecha_reporte, fecha_atencion] entre
+  los baches, manteniendo su ubicación. Los pares (accidente, bache) a menos de
+  R metros no cambian, así que se calculan una sola vez con el KD-tree y cada
+  permutación sólo vuelve a evaluar la actividad de esos pares.
+* 'vialidad': los baches se reubican al azar sobre las vialidades (con
+  probabilidad proporcional a la longitud de cada tramo), manteniendo sus
+  fechas, y se consultan contra un KD-tree de los accidentes construido una vez.
+
+Las permutaciones se procesan en lotes vectorizados repartidos en un pool de
+procesos; cada lote usa su propia semilla derivada de SeedSequence, por lo que
+el resultado no depende del número de procesos.
+
+Guarda los resultados en data/processed/proximidad/
+"""
+
+from config import ROOT_DIR, PROCESSED_DIR, METRIC_CRS, get_logger
+from proximity_baches import (
+    PROCESSED_PROXIMIDAD_DIR, ATUS_CLEAN_PATH, NAT_MAX,
+    to_ns, load_baches,
+)
+from schemas import read_dataset
+from projection import frame_xy, reproject
+import os
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy.spatial import cKDTree
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+VIALIDADES_PATH = PROCESSED_DIR / "vialidades" / "vialidades_hmo.gpkg"
+
+# Parámetros por defecto
+RADIO_M = 10
+N_PERMUTACIONES = 10_000
+LOTE = 100
+SEMILLA = 20240601
+
+
+class ProximityNull:
+    """
+    Estado compartido por las permutaciones: coordenadas y fechas de accidentes
+    y baches, KD-tree de accidentes y pares candidatos a menos del radio.
+    """
+
+    def __init__(self, acc_xy, acc_t, bache_xy, inicio, fin, radius=RADIO_M, segments=None):
+        valid = np.isfinite(acc_xy).all(axis=1) & (acc_t != NAT_MAX)
+        self.acc_xy, self.acc_t = acc_xy[valid], acc_t[valid]
+        self.n_acc = len(self.acc_t)
+
+        ok = np.isfinite(bache_xy).all(axis=1)
+        self.bache_xy, self.inicio, self.fin = bache_xy[ok], inicio[ok], fin[ok]
+        self.radius = radius
+
+        self.acc_tree = cKDTree(self.acc_xy)
+        self.pairs = self.candidate_pairs(self.bache_xy)
+
+        # Baches distintos que participan en algún par y posición de cada par entre ellos
+        self.pair_baches, self.pair_inverse = np.unique(self.pairs[1], return_inverse=True)
+
+        # Tramos de vialidad para la reubicación, con pesos por longitud
+        self.segments = segments
+        if segments is not None:
+            lengths = shapely.length(segments)
+            self.segment_cdf = np.cumsum(lengths) / lengths.sum()
+
+    def candidate_pairs(self, bache_xy):
+        """
+        Pares (accidente, bache) a menos del radio, ordenados por accidente.
+        """
+        pairs = self.acc_tree.sparse_distance_matrix(
+            cKDTree(bache_xy), self.radius, output_type='ndarray'
+        )
+        mask = pairs['v'] < self.radius
+        acc, bache = pairs['i'][mask], pairs['j'][mask]
+        order = np.argsort(acc, kind='stable')
+        return acc[order], bache[order]
+
+    def statistic(self, acc, inicio_pairs, fin_pairs):
+        """
+        Número de accidentes con al menos un par activo. Las fechas de los
+        pares pueden tener una dimensión extra de permutaciones al inicio.
+        """
+        t = self.acc_t[acc]
+        active = (inicio_pairs <= t) & (fin_pairs >= t)
+        if active.shape[-1] == 0:
+            return np.zeros(active.shape[:-1], dtype='int64')
+
+        # Primer par de cada accidente dentro de los pares ordenados
+        starts = np.flatnonzero(np.r_[True, acc[1:] != acc[:-1]])
+        any_active = np.maximum.reduceat(active.astype('int8'), starts, axis=-1)
+        return any_active.sum(axis=-1)
+
+    def observed(self):
+        acc, bache = self.pairs
+        return int(self.statistic(acc, self.inicio[bache], self.fin[bache]))
+
+    def permute_time(self, rng, size):
+        """
+        Lote de estadísticos con los intervalos de fechas permutados. Sólo se
+        necesita la imagen de la permutación en los baches que forman pares, que
+        es una muestra sin reemplazo de todos los baches.
+        """
+        acc, _ = self.pairs
+        n, m = len(self.inicio), len(self.pair_baches)
+        if m == 0:
+            return np.zeros(size, dtype='int64')
+
+        images = np.stack([rng.choice(n, m, replace=False) for _ in range(size)])
+        source = images[:, self.pair_inverse]
+        return self.statistic(acc, self.inicio[source], self.fin[source])
+
+    def relocate(self, rng):
+        """Ubicaciones al azar sobre las vialidades, proporcionales a su longitud."""
+        n = len(self.inicio)
+        seg = np.searchsorted(self.segment_cdf, rng.random(n))
+        points = shapely.line_interpolate_point(self.segments[seg], rng.random(n), normalized=True)
+        return shapely.get_coordinates(points)
+
+    def permute_roads(self, rng, size):
+        """Lote de estadísticos con los baches reubicados sobre las vialidades."""
+        result = np.empty(size, dtype='int64')
+        for i in range(size):
+            acc, bache = self.candidate_pairs(self.relocate(rng))
+            result[i] = self.statistic(acc, self.inicio[bache], self.fin[bache])
+        return result
+
+
+_worker_null = None
+
+
+def _init_worker(null):
+    global _worker_null
+    _worker_null = null
+
+
+def _run_batch(args):
+    seed, size, mode = args
+    rng = np.random.default_rng(seed)
+    if mode == 'vialidad':
+        return _worker_null.permute_roads(rng, size)
+    return _worker_null.permute_time(rng, size)
+
+
+def run_permutations(null, n_permutations=N_PERMUTACIONES, mode='tiempo', seed=SEMILLA,
+                     batch_size=LOTE, n_workers=None):
+    """
+    Regresa el arreglo con el estadístico de cada permutación.
+    """
+    sizes = [batch_size] * (n_permutations // batch_size)
+    if n_permutations % batch_size:
+        sizes.append(n_permutations % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    batches = [(s, size, mode) for s, size in zip(seeds, sizes)]
+
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        _init_worker(null)
+        results = [_run_batch(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(null,)) as executor:
+            results = list(executor.map(_run_batch, batches))
+
+    return np.concatenate(results)
+
+
+def summarize(observed, null_stats, n_acc):
+    """
+    Resumen de la prueba; el valor p es unilateral (más proximidad que el azar).
+    """
+    p_value = (1 + np.sum(null_stats >= observed)) / (1 + len(null_stats))
+    return {
+        'n_accidentes': n_acc,
+        'observado': observed,
+        'pct_observado': 100 * observed / n_acc if n_acc else np.nan,
+        'nulo_media': float(null_stats.mean()),
+        'nulo_std': float(null_stats.std(ddof=1)) if len(null_stats) > 1 else np.nan,
+        'nulo_p95': float(np.percentile(null_stats, 95)),
+        'p_valor': float(p_value),
+        'n_permutaciones': len(null_stats),
+    }
+
+
+def build_null(atus, baches, radius=RADIO_M, segments=None, time_col='datetime',
+               acc_lon='longitud', acc_lat='latitud'):
+    ax, ay = frame_xy(atus, acc_lon, acc_lat)
+    bx, by = frame_xy(baches, 'longitude', 'latitude')
+    return ProximityNull(
+        np.column_stack([ax, ay]), to_ns(atus[time_col], NAT_MAX),
+        np.column_stack([bx, by]),
+        to_ns(baches['fecha_reporte'], NAT_MAX), to_ns(baches['fecha_atencion'], NAT_MAX),
+        radius=radius, segments=segments,
+    )
+
+
+def load_segments(path=VIALIDADES_PATH):
+    vialidades = reproject(gpd.read_file(path), METRIC_CRS)
+    return np.asarray(vialidades.geometry.explode(index_parts=False).values)
+
+
+def process_permutation_test(radius=RADIO_M, n_permutations=N_PERMUTACIONES, mode='tiempo',
+                             seed=SEMILLA, n_workers=None):
+    start = datetime.now()
+    logger.info(f'Inicia la prueba de permutaciones ({mode}, R={radius} m, {n_permutations} permutaciones)')
+
+    atus = read_dataset(ATUS_CLEAN_PATH, 'atus')
+    baches = load_baches()
+    segments = load_segments() if mode == 'vialidad' else None
+
+    null = build_null(atus, baches, radius=radius, segments=segments)
+    observed = null.observed()
+    null_stats = run_permutations(null, n_permutations, mode=mode, seed=seed, n_workers=n_workers)
+    summary = summarize(observed, null_stats, null.n_acc)
+
+    PROCESSED_PROXIMIDAD_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"permutaciones_{mode}_{radius:g}m"
+    pd.DataFrame({'estadistico': null_stats}).to_parquet(PROCESSED_PROXIMIDAD_DIR / f"{stem}.parquet")
+    pd.DataFrame([summary]).to_csv(PROCESSED_PROXIMIDAD_DIR / f"{stem}_resumen.csv", index=False)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(
+        f"Observado: {summary['pct_observado']:.2f}% de accidentes; "
+        f"nulo: {100 * summary['nulo_media'] / max(null.n_acc, 1):.2f}%; p = {summary['p_valor']:.4f}"
+    )
+    logger.info(f'Prueba de permutaciones completada en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_PROXIMIDAD_DIR.relative_to(ROOT_DIR)}')
+
+    return summary
+
+
+if __name__ == '__main__':
+    process_permutation_test()
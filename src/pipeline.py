@@ -0,0 +1,419 @@
+"""
+pipeline.py
+
+Ejecuta las etapas de extracción y limpieza de datos respetando sus
+dependencias, en lugar de correr los scripts uno tras otro como
+run_data_extraction.sh.
+
+Cada etapa declara la función que la ejecuta, las etapas de las que depende y
+los archivos que lee y escribe. Las ramas independientes (ATUS, colonias,
+clima, vialidades y Bachómetro) corren en paralelo en un pool de procesos,
+cada etapa en un proceso nuevo para que su memoria y su pico de memoria
+residente (ver instrumentation.py) no se mezclen con los de otra etapa. Una
+etapa se omite cuando sus salidas existen y no cambiaron ni el contenido de sus
+entradas ni el código de sus módulos desde la última ejecución exitosa; el
+estado se guarda en data/interim/pipeline/estado.json. El código de una etapa
+incluye los módulos de src que sus módulos importan, directa o indirectamente
+(instrumentation, schemas, projection...), de modo que un cambio en un módulo
+compartido vuelve a ejecutar las etapas que lo usan.
+
+Las etapas sin entradas (descargas de fuentes externas) no tienen contenido
+que comparar, así que se vuelven a ejecutar cuando su última ejecución exitosa
+es más antigua que su `max_age` (SOURCE_MAX_AGE por defecto). `--force-stage`
+fuerza etapas individuales.
+
+Uso:
+    python src/pipeline.py                  # todas las etapas
+    python src/pipeline.py atus_clean       # sólo atus_clean y sus dependencias
+    python src/pipeline.py --list
+    python src/pipeline.py atus_clean --force --workers 2
+    python src/pipeline.py --force-stage bachometro_extract
+"""
+
+from config import ROOT_DIR, RAW_DIR, INTERIM_DIR, PROCESSED_DIR, init_paths, get_logger
+from instrumentation import instrument, get_run_id
+import os
+import ast
+import json
+import hashlib
+import argparse
+import importlib
+from pathlib import Path
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+SRC_DIR = Path(__file__).resolve().parent
+PIPELINE_DIR = INTERIM_DIR / "pipeline"
+STATE_PATH = PIPELINE_DIR / "estado.json"
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+# Procesos por defecto: uno por fuente independiente, ya que las descargas
+# pasan la mayor parte del tiempo esperando la red
+MAX_WORKERS = 5
+
+# Antigüedad máxima por defecto de las etapas sin entradas
+SOURCE_MAX_AGE = timedelta(days=7)
+
+
+class Stage:
+    """
+    Etapa del pipeline. `func` es 'modulo:funcion' y se importa sólo al
+    ejecutarse; `inputs` y `outputs` son rutas o patrones glob relativos a
+    ROOT_DIR; `modules` son los módulos de src cuyo código define la versión,
+    junto con los que importan (ver code_modules).
+    `max_age` (timedelta) vence la última ejecución aunque nada haya cambiado;
+    las etapas sin entradas usan SOURCE_MAX_AGE si no se indica.
+    """
+
+    def __init__(self, name, func, deps=(), inputs=(), outputs=(), modules=None, kwargs=None,
+                 max_age=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.modules = tuple(modules) if modules else (func.split(':')[0],)
+        self.kwargs = kwargs or {}
+        self.max_age = max_age if max_age is not None or self.inputs else SOURCE_MAX_AGE
+
+    def __repr__(self):
+        return f'Stage({self.name})'
+
+
+def rel(path):
+    return str(path.relative_to(ROOT_DIR))
+
+
+STAGES = [
+    # ATUS
+    Stage('atus_download', 'download_atus:download_atus',
+          outputs=[rel(RAW_DIR / "atus" / "*.zip")], modules=['download_atus', 'zip_utils'],
+          max_age=timedelta(days=30)),
+    Stage('atus_extract', 'extract_atus:process_extraction_atus', deps=['atus_download'],
+          inputs=[rel(RAW_DIR / "atus" / "*.zip")],
+          outputs=[rel(RAW_DIR / "atus" / "**" / "*.csv")], modules=['extract_atus', 'zip_utils']),
+    Stage('atus_clean', 'clean_atus:process_cleaning_atus', deps=['atus_extract'],
+          inputs=[rel(RAW_DIR / "atus" / "**" / "*.csv")],
+          outputs=[rel(PROCESSED_DIR / "atus" / "atus_clean.csv"),
+                   rel(PROCESSED_DIR / "atus" / "atus_clean.geojson"),
+                   rel(PROCESSED_DIR / "atus" / "atus_clean.parquet")],
+          modules=['clean_atus', 'schemas', 'projection']),
+
+    # Colonias
+    Stage('colonias_download', 'download_colonias:download_colonias',
+          outputs=[rel(RAW_DIR / "colonias" / "*.zip")], modules=['download_colonias', 'zip_utils'],
+          max_age=timedelta(days=30)),
+    Stage('colonias_extract', 'extract_colonias:process_extraction_colonias', deps=['colonias_download'],
+          inputs=[rel(RAW_DIR / "colonias" / "*.zip")],
+          outputs=[rel(RAW_DIR / "colonias" / "**" / "*.shp")], modules=['extract_colonias', 'zip_utils']),
+    Stage('colonias_clean', 'clean_colonias:process_cleaning_colonias', deps=['colonias_extract'],
+          inputs=[rel(RAW_DIR / "colonias" / "**" / "*.shp"), rel(RAW_DIR / "colonias" / "**" / "*.dbf")],
+          outputs=[rel(PROCESSED_DIR / "colonias" / "colonias_hmo.gpkg"),
+                   rel(PROCESSED_DIR / "colonias" / "colonias_hmo.geojson"),
+                   rel(PROCESSED_DIR / "colonias" / "colonias_hmo.parquet")],
+          modules=['clean_colonias', 'schemas', 'projection']),
+
+    # Clima
+    # Diario: cada ejecución extiende el rango hasta ayer
+    Stage('clima_download', 'download_clima:process_download_clima',
+          outputs=[rel(RAW_DIR / "clima" / "clima_hermosillo.csv")], max_age=timedelta(days=1)),
+    Stage('clima_clean', 'clean_clima:process_cleaning_clima', deps=['clima_download'],
+          inputs=[rel(RAW_DIR / "clima" / "clima_hermosillo.csv")],
+          outputs=[rel(PROCESSED_DIR / "clima" / f) for f in [
+              "clima_final_processed.parquet", "clima_diario.parquet", "clima_mensual.parquet"]],
+          modules=['clean_clima', 'schemas']),
+
+    # Vialidades
+    Stage('vialidades_extract', 'extract_vialidades:process_extraction_vialidades',
+          outputs=[rel(RAW_DIR / "vialidades" / "edges" / "hermosillo_edges.geojson"),
+                   rel(RAW_DIR / "vialidades" / "nodes" / "hermosillo_nodes.geojson")],
+          max_age=timedelta(days=30)),
+    Stage('vialidades_clean', 'clean_vialidades:process_cleaning_vialidades', deps=['vialidades_extract'],
+          inputs=[rel(RAW_DIR / "vialidades" / "edges" / "hermosillo_edges.geojson")],
+          outputs=[rel(PROCESSED_DIR / "vialidades" / "vialidades_hmo.gpkg"),
+                   rel(PROCESSED_DIR / "vialidades" / "vialidades_hmo_disolved.geojson"),
+                   rel(PROCESSED_DIR / "vialidades" / "vialidades_hmo.parquet")],
+          modules=['clean_vialidades', 'schemas', 'projection']),
+
+    # Bachómetro
+    Stage('bachometro_extract', 'extract_bachometro:main',
+          outputs=[rel(RAW_DIR / "baches_*.json")]),
+    Stage('bachometro_clean', 'cleaning_data_bachometro:main', deps=['bachometro_extract'],
+          inputs=[rel(RAW_DIR / "baches_*.json"), rel(RAW_DIR / "baches_*.jsonl")],
+          outputs=[rel(PROCESSED_DIR / "bachometro" / "baches.parquet" / "*" / "*.parquet")],
+          modules=['cleaning_data_bachometro', 'schemas', 'projection']),
+    Stage('bachometro_store', 'baches_store:process_baches_store', deps=['bachometro_clean'],
+          inputs=[rel(PROCESSED_DIR / "bachometro" / "baches.parquet" / "*" / "*.parquet")],
+          outputs=[rel(PROCESSED_DIR / "bachometro" / "baches_store" / "*" / "*.parquet"),
+                   rel(PROCESSED_DIR / "bachometro" / "baches_indice.parquet")],
+          modules=['baches_store', 'cleaning_data_bachometro', 'schemas', 'projection']),
+]
+
+
+def get_stages():
+    return {s.name: s for s in STAGES}
+
+
+def resolve_targets(stages, targets=None):
+    """
+    Etapas necesarias para los objetivos (ellos y sus dependencias), en orden topológico.
+    """
+    targets = list(targets) if targets else list(stages)
+    unknown = [t for t in targets if t not in stages]
+    if unknown:
+        raise KeyError(f'Etapas desconocidas: {unknown}. Disponibles: {sorted(stages)}')
+
+    order, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f'Dependencia circular en la etapa {name}')
+        visiting.add(name)
+        for dep in stages[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for t in targets:
+        visit(t)
+    return order
+
+
+def expand(patterns):
+    paths = set()
+    for pattern in patterns:
+        paths.update(p for p in ROOT_DIR.glob(pattern) if p.is_file())
+    return sorted(paths)
+
+
+def file_digest(path, memo):
+    """
+    SHA-1 del contenido del archivo, reutilizando el de la ejecución anterior
+    si el tamaño y la fecha de modificación no cambiaron.
+    """
+    stat = path.stat()
+    key = rel(path)
+    cached = memo.get(key)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha1']
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    memo[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': h.hexdigest()}
+    return memo[key]['sha1']
+
+
+def inputs_hash(stage, memo):
+    h = hashlib.sha1()
+    for path in expand(stage.inputs):
+        h.update(rel(path).encode())
+        h.update(file_digest(path, memo).encode())
+    return h.hexdigest()
+
+
+def src_imports(module):
+    """
+    Módulos de src que `module` importa, incluidos los imports dentro de
+    funciones. No sigue imports dinámicos (importlib).
+    """
+    tree = ast.parse((SRC_DIR / f"{module}.py").read_bytes())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names.add(node.module.split('.')[0])
+    return {name for name in names if (SRC_DIR / f"{name}.py").exists()}
+
+
+def code_modules(stage):
+    """Módulos de la etapa y los módulos de src que importan, directa o indirectamente."""
+    seen = set()
+    pending = [*stage.modules, 'config']
+    while pending:
+        module = pending.pop()
+        if module not in seen:
+            seen.add(module)
+            pending.extend(src_imports(module) - seen)
+    return sorted(seen)
+
+
+def code_hash(stage):
+    h = hashlib.sha1()
+    for module in code_modules(stage):
+        h.update(module.encode())
+        h.update((SRC_DIR / f"{module}.py").read_bytes())
+    h.update(json.dumps(stage.kwargs, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def outputs_exist(stage):
+    return all(expand([pattern]) for pattern in stage.outputs)
+
+
+def load_state(path=STATE_PATH):
+    if not path.exists():
+        return {'etapas': {}, 'archivos': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def is_expired(stage, previous, now=None):
+    """True si la última ejecución exitosa es más antigua que `max_age`."""
+    if stage.max_age is None:
+        return False
+    now = now or datetime.now()
+    return now - datetime.fromisoformat(previous['fecha']) > stage.max_age
+
+
+def is_up_to_date(stage, state, memo):
+    previous = state['etapas'].get(stage.name)
+    if previous is None or not outputs_exist(stage) or is_expired(stage, previous):
+        return False
+    return previous['inputs'] == inputs_hash(stage, memo) and previous['code'] == code_hash(stage)
+
+
+def run_stage(name, func, kwargs):
+    """Importa y ejecuta la función de la etapa (en el proceso del pool)."""
+    os.chdir(ROOT_DIR)
+    with instrument(name, padre='pipeline') as m:
+        module_name, func_name = func.split(':')
+        module = importlib.import_module(module_name)
+        getattr(module, func_name)(**kwargs)
+    return m.record['wall_s']
+
+
+def run_pipeline(targets=None, force=False, max_workers=None, dry_run=False, force_stages=()):
+    """
+    Ejecuta las etapas necesarias para `targets`; `force` las ejecuta todas y
+    `force_stages` sólo las indicadas aunque estén al día. Regresa un dict
+    etapa -> 'ok' | 'omitida' | 'error' | 'bloqueada'.
+    """
+    start = datetime.now()
+    init_paths()
+    logger.info(f'Ejecución {get_run_id()}')
+
+    stages = get_stages()
+    unknown = set(force_stages) - set(stages)
+    if unknown:
+        raise ValueError(f'Etapas desconocidas: {sorted(unknown)}. Disponibles: {list(stages)}')
+    order = resolve_targets(stages, targets)
+    state = load_state()
+    memo = state['archivos']
+    status = {}
+
+    logger.info(f'Etapas a evaluar: {", ".join(order)}')
+
+    pending = list(order)
+    running = {}
+    max_workers = max_workers or min(len(order), MAX_WORKERS)
+
+    # Un proceso por etapa: ru_maxrss es el pico de todo el proceso
+    pool = ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1)
+    with instrument('pipeline', objetivos=order), pool as executor:
+        while pending or running:
+            # Lanzar las etapas cuyas dependencias ya terminaron
+            for name in list(pending):
+                stage = stages[name]
+                dep_status = [status.get(d) for d in stage.deps]
+                if any(s is None for s in dep_status):
+                    continue
+                pending.remove(name)
+
+                if any(s in ('error', 'bloqueada') for s in dep_status):
+                    status[name] = 'bloqueada'
+                    logger.warning(f'{name}: bloqueada por una dependencia con error')
+                elif not force and name not in force_stages and is_up_to_date(stage, state, memo):
+                    status[name] = 'omitida'
+                    logger.info(f'{name}: sin cambios, se omite')
+                elif dry_run:
+                    status[name] = 'pendiente'
+                    logger.info(f'{name}: se ejecutaría')
+                else:
+                    logger.info(f'{name}: inicia')
+                    running[executor.submit(run_stage, name, stage.func, stage.kwargs)] = name
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = stages[name]
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    status[name] = 'error'
+                    logger.error(f'{name}: error - {e}')
+                    continue
+
+                if not outputs_exist(stage):
+                    status[name] = 'error'
+                    logger.error(f'{name}: terminó sin generar {stage.outputs}')
+                    continue
+
+                status[name] = 'ok'
+                state['etapas'][name] = {
+                    'inputs': inputs_hash(stage, memo),
+                    'code': code_hash(stage),
+                    'fecha': datetime.now().isoformat(timespec='seconds'),
+                    'segundos': round(elapsed, 2),
+                }
+                save_state(state)
+                logger.info(f'{name}: completada en {elapsed:.2f} s')
+
+    save_state(state)
+    elapsed = (datetime.now() - start).total_seconds()
+    summary = ', '.join(f'{n}={s}' for n, s in status.items())
+    logger.info(f'Pipeline finalizado en {elapsed:.2f} s ({summary})')
+    return status
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Pipeline de extracción y limpieza de datos')
+    parser.add_argument('targets', nargs='*', help='Etapas objetivo (por defecto, todas)')
+    parser.add_argument('--force', action='store_true', help='Ejecutar aunque no haya cambios')
+    parser.add_argument('--force-stage', action='append', default=[], metavar='ETAPA',
+                        help='Ejecutar esta etapa aunque esté al día (se puede repetir)')
+    parser.add_argument('--workers', type=int, default=None, help='Número máximo de procesos')
+    parser.add_argument('--dry-run', action='store_true', help='Mostrar qué se ejecutaría')
+    parser.add_argument('--list', action='store_true', help='Listar las etapas y salir')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        for stage in STAGES:
+            deps = f" <- {', '.join(stage.deps)}" if stage.deps else ''
+            max_age = f' (vigencia {stage.max_age})' if stage.max_age is not None else ''
+            print(f'{stage.name}{deps}{max_age}')
+        return {}
+
+    status = run_pipeline(args.targets, force=args.force, max_workers=args.workers, dry_run=args.dry_run,
+                          force_stages=args.force_stage)
+    if any(s in ('error', 'bloqueada') for s in status.values()):
+        raise SystemExit(1)
+    return status
+
+
+if __name__ == '__main__':
+    main()
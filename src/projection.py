@@ -0,0 +1,80 @@
+"""
+projection.py
+
+Proyecciones entre EPSG:4326 y el CRS métrico del proyecto (METRIC_CRS).
+
+Las etapas de limpieza guardan una sola vez las columnas x/y (METRIC_CRS)
+junto a las coordenadas geográficas de cada punto (ATUS y baches), de modo
+que los cálculos de distancia trabajan directamente sobre esos arreglos sin
+volver a proyectar ni construir geometrías. Las reproyecciones que quedan
+(polígonos de colonias y tramos de vialidades) reutilizan los Transformer de
+la cache y no hacen nada si el GeoDataFrame ya está en el CRS destino.
+"""
+
+from config import METRIC_CRS
+import functools
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+WGS84 = "EPSG:4326"
+
+# Columnas con las coordenadas proyectadas (METRIC_CRS) de cada punto
+XY_COLS = ['x', 'y']
+
+
+@functools.lru_cache(maxsize=None)
+def _transformer(src, dst):
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def get_transformer(src, dst=METRIC_CRS):
+    """Transformer (x, y en orden lon/lat) de src a dst, creado una sola vez por par."""
+    return _transformer(CRS.from_user_input(src), CRS.from_user_input(dst))
+
+
+def project_lonlat(lon, lat, crs=METRIC_CRS):
+    """
+    Proyecta arreglos de longitud/latitud (EPSG:4326) a coordenadas métricas.
+    """
+    transformer = get_transformer(WGS84, crs)
+    x, y = transformer.transform(np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64'))
+    return np.asarray(x), np.asarray(y)
+
+
+def add_xy(df, lon_col, lat_col, crs=METRIC_CRS):
+    """Agrega (o reemplaza) las columnas x/y proyectadas a partir de lon/lat."""
+    df['x'], df['y'] = project_lonlat(df[lon_col], df[lat_col], crs)
+    return df
+
+
+def frame_xy(df, lon_col, lat_col):
+    """
+    Coordenadas métricas de los puntos de df: las columnas x/y guardadas por
+    la limpieza si existen, o la proyección de lon/lat si no.
+    """
+    if all(col in df.columns for col in XY_COLS):
+        return df['x'].to_numpy(dtype='float64'), df['y'].to_numpy(dtype='float64')
+    return project_lonlat(df[lon_col], df[lat_col])
+
+
+def reproject(gdf, crs):
+    """
+    Equivalente a gdf.to_crs(crs) con el Transformer de la cache; regresa gdf
+    sin copiarlo si ya está en ese CRS.
+    """
+    crs = CRS.from_user_input(crs)
+    if gdf.crs is None:
+        raise ValueError('No se puede reproyectar un GeoDataFrame sin CRS')
+    if gdf.crs == crs:
+        return gdf
+
+    transformer = get_transformer(gdf.crs, crs)
+
+    def transform(coords):
+        return np.column_stack(transformer.transform(coords[:, 0], coords[:, 1]))
+
+    out = gdf.copy()
+    geometry = shapely.transform(np.asarray(gdf.geometry.values), transform)
+    out[gdf.geometry.name] = gdf.geometry._constructor(geometry, index=gdf.index, crs=crs)
+    return out.set_crs(crs, allow_override=True)
@@ -0,0 +1,331 @@
+"""
+proximity_baches.py
+
+Calcula, para cada accidente, la distancia al bache activo más cercano
+(`dist_bache_min_m`) y su identificador.
+
+Un bache está activo en la fecha del accidente si fue reportado antes o en esa
+fecha y no había sido atendido (fecha_atencion nula o posterior). En lugar de
+filtrar todos los baches por cada accidente, se construye un KD-tree sobre las
+coordenadas proyectadas (METRIC_CRS) por cada mes, con los baches activos en
+algún momento de ese mes, y se consultan los k vecinos más cercanos de todos
+los accidentes del mes a la vez; los intervalos [fecha_reporte, fecha_atencion]
+de esos vecinos se comparan en bloque y k se amplía sólo para los accidentes
+que aún no tienen un bache activo entre sus candidatos.
+
+Con los mismos árboles se cuentan los baches activos dentro de varios radios y
+ventanas de antigüedad del reporte (baches_10m, baches_50m_90d, ...) en una
+sola consulta por bloque de accidentes, repartiendo los bloques entre procesos.
+
+Guarda los resultados en data/processed/proximidad/
+"""
+
+from config import ROOT_DIR, PROCESSED_DIR, get_logger
+from baches_store import STORE_PATH, load_store
+from schemas import read_dataset
+from projection import frame_xy
+import os
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+ATUS_CLEAN_PATH = PROCESSED_DIR / "atus" / "atus_clean.parquet"
+PROCESSED_PROXIMIDAD_DIR = PROCESSED_DIR / "proximidad"
+DIST_BACHE_PATH = PROCESSED_PROXIMIDAD_DIR / "atus_dist_bache.parquet"
+
+# Vecinos consultados en la primera ronda y factor de ampliación
+K_INICIAL = 16
+K_FACTOR = 4
+
+# Radios (m) y ventanas de antigüedad del reporte (días; None = sin límite)
+RADIOS_M = (10, 25, 50, 100)
+VENTANAS_DIAS = (None, 30, 90, 365)
+
+# Accidentes por bloque en el cálculo paralelo de conteos
+CHUNK_SIZE = 5_000
+
+# Periodo de los KD-trees temporales
+PERIODO = 'M'
+
+# Fecha "infinita" para baches no atendidos
+NAT_MAX = np.iinfo('int64').max
+
+
+def to_ns(times, fill):
+    """
+    Convierte fechas a enteros (ns) para comparaciones vectorizadas; NaT -> fill.
+    """
+    times = pd.to_datetime(pd.Series(times), errors='coerce').astype('datetime64[ns]')
+    values = times.to_numpy().astype('int64')
+    values[times.isna().to_numpy()] = fill
+    return values
+
+
+class BachesActivosIndex:
+    """
+    Índice espacio-temporal de baches.
+
+    El tiempo se divide en periodos (mensuales por defecto); para cada periodo
+    se construye, bajo demanda, un KD-tree con los baches cuyo intervalo
+    [fecha_reporte, fecha_atencion] se traslapa con él. Así cada consulta sólo
+    recorre baches que pudieron estar activos en su fecha.
+    """
+
+    def __init__(self, x, y, fecha_reporte, fecha_atencion, ids=None, freq=PERIODO):
+        coords = np.column_stack([x, y])
+        valid = np.isfinite(coords).all(axis=1)
+
+        self.coords = coords[valid]
+        self.freq = freq
+
+        # Sin fecha de reporte el bache nunca se considera activo
+        self.inicio = to_ns(fecha_reporte, NAT_MAX)[valid]
+        self.fin = to_ns(fecha_atencion, NAT_MAX)[valid]
+        ids = np.arange(len(valid)) if ids is None else np.asarray(ids)
+        self.ids = ids[valid]
+
+        self._trees = {}
+
+    @classmethod
+    def from_frame(cls, baches, lon_col='longitude', lat_col='latitude', id_col='id', **kwargs):
+        x, y = frame_xy(baches, lon_col, lat_col)
+        return cls(
+            x, y,
+            baches['fecha_reporte'],
+            baches['fecha_atencion'],
+            ids=baches[id_col].to_numpy() if id_col in baches else None,
+            **kwargs,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def period_tree(self, period):
+        """
+        Regresa (miembros, KD-tree) con los baches activos en algún momento
+        del periodo; los miembros son índices internos del índice.
+        """
+        if period not in self._trees:
+            p0 = period.start_time.value
+            p1 = period.end_time.value
+            members = np.flatnonzero((self.inicio <= p1) & (self.fin >= p0))
+            tree = cKDTree(self.coords[members]) if len(members) else None
+            self._trees[period] = (members, tree)
+        return self._trees[period]
+
+    def group_by_period(self, times):
+        """
+        Agrupa las posiciones de las consultas con fecha válida por periodo.
+        """
+        valid = times != NAT_MAX
+        periods = pd.Series(times[valid].astype('datetime64[ns]')).dt.to_period(self.freq)
+        groups = pd.Series(np.flatnonzero(valid)).groupby(periods.to_numpy())
+        return {period: positions.to_numpy() for period, positions in groups}
+
+    def is_active(self, positions, times):
+        """
+        Máscara (n, k) de baches activos; `positions` son índices internos y
+        `times` las fechas (ns) de cada consulta.
+        """
+        t = times[:, None]
+        return (self.inicio[positions] <= t) & (self.fin[positions] >= t)
+
+    def nearest_active(self, x, y, times, k=K_INICIAL):
+        """
+        Distancia (m) e índice interno del bache activo más cercano a cada punto.
+        Los puntos sin bache activo o sin fecha regresan NaN y -1.
+        """
+        points = np.column_stack([x, y])
+        times = to_ns(times, NAT_MAX)
+        times[~np.isfinite(points).all(axis=1)] = NAT_MAX
+
+        dist = np.full(len(points), np.nan)
+        pos = np.full(len(points), -1, dtype='int64')
+
+        for period, queries in self.group_by_period(times).items():
+            members, tree = self.period_tree(period)
+            if tree is None:
+                continue
+
+            pending = queries
+            k_period = min(k, len(members))
+
+            while len(pending):
+                d, idx = tree.query(points[pending], k=k_period)
+                d = d.reshape(len(pending), k_period)
+                idx = members[idx.reshape(len(pending), k_period)]
+
+                active = self.is_active(idx, times[pending])
+                found = active.any(axis=1)
+                first = active.argmax(axis=1)
+
+                rows = np.flatnonzero(found)
+                dist[pending[rows]] = d[rows, first[rows]]
+                pos[pending[rows]] = idx[rows, first[rows]]
+
+                # Si ya se consultaron todos los baches del periodo, no hay más activos
+                if k_period == len(members):
+                    break
+
+                pending = pending[~found]
+                k_period = min(k_period * K_FACTOR, len(members))
+
+        return dist, pos
+
+    def count_active_within(self, x, y, times, radii=RADIOS_M, windows=VENTANAS_DIAS):
+        """
+        Cuenta, para cada punto, los baches activos a menos de cada radio (m) y
+        reportados dentro de cada ventana de días previa a la fecha (None = sin
+        límite). Todas las combinaciones se obtienen de una sola consulta por
+        periodo con el radio máximo.
+
+        Regresa un arreglo (n_puntos, len(radii), len(windows)).
+        """
+        points = np.column_stack([x, y])
+        times = to_ns(times, NAT_MAX)
+        times[~np.isfinite(points).all(axis=1)] = NAT_MAX
+
+        radii = np.asarray(radii, dtype='float64')
+        limits = np.array([NAT_MAX if w is None else pd.Timedelta(days=w).value for w in windows])
+        counts = np.zeros((len(points), len(radii), len(limits)), dtype='int32')
+
+        for period, queries in self.group_by_period(times).items():
+            members, tree = self.period_tree(period)
+            if tree is None:
+                continue
+
+            # Pares (consulta, bache) a menos del radio máximo
+            pairs = cKDTree(points[queries]).sparse_distance_matrix(
+                tree, radii.max(), output_type='ndarray'
+            )
+            q, b, d = pairs['i'], members[pairs['j']], pairs['v']
+
+            t = times[queries][q]
+            active = (self.inicio[b] <= t) & (self.fin[b] >= t)
+            q, b, d, t = q[active], b[active], d[active], t[active]
+            age = t - self.inicio[b]
+
+            for i, radius in enumerate(radii):
+                near = d < radius
+                for j, limit in enumerate(limits):
+                    mask = near & (age <= limit)
+                    counts[queries, i, j] = np.bincount(q[mask], minlength=len(queries))
+
+        return counts
+
+    def nearest_active_frame(self, x, y, times):
+        dist, pos = self.nearest_active(x, y, times)
+        ids = pd.array(np.where(pos >= 0, self.ids[np.maximum(pos, 0)], None))
+        return pd.DataFrame({'dist_bache_min_m': dist, 'id_bache_min': ids})
+
+
+def compute_dist_bache_min(atus, baches, time_col='datetime', lon_col='longitud', lat_col='latitud',
+                           index=None):
+    """
+    Agrega a `atus` las columnas dist_bache_min_m e id_bache_min en una sola
+    llamada sobre todos los accidentes.
+    """
+    if index is None:
+        index = BachesActivosIndex.from_frame(baches)
+
+    x, y = frame_xy(atus, lon_col, lat_col)
+    result = index.nearest_active_frame(x, y, atus[time_col])
+    result.index = atus.index
+    return atus.join(result)
+
+
+def counts_column(radius, window):
+    name = f'baches_{radius:g}m'
+    return name if window is None else f'{name}_{window}d'
+
+
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _count_chunk(args):
+    x, y, times, radii, windows = args
+    return _worker_index.count_active_within(x, y, times, radii, windows)
+
+
+def count_baches_cercanos(atus, baches=None, radii=RADIOS_M, windows=VENTANAS_DIAS,
+                          time_col='datetime', lon_col='longitud', lat_col='latitud',
+                          index=None, n_workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Agrega a `atus` una columna de conteo por cada combinación de radio y
+    ventana (ej. baches_10m, baches_50m_90d). Los accidentes se procesan en
+    bloques repartidos entre `n_workers` procesos.
+    """
+    if index is None:
+        index = BachesActivosIndex.from_frame(baches)
+
+    x, y = frame_xy(atus, lon_col, lat_col)
+    times = pd.to_datetime(atus[time_col], errors='coerce').to_numpy()
+
+    # Ordenar por fecha para que cada bloque toque pocos periodos
+    order = np.argsort(times, kind='stable')
+    chunks = [
+        (x[c], y[c], times[c], radii, windows)
+        for c in np.array_split(order, max(1, -(-len(order) // chunk_size)))
+    ]
+
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1 or len(chunks) == 1:
+        results = [index.count_active_within(*chunk) for chunk in chunks]
+    else:
+        # Construir los árboles antes de repartir el índice a los procesos
+        for period in index.group_by_period(to_ns(times, NAT_MAX)):
+            index.period_tree(period)
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(index,)) as executor:
+            results = list(executor.map(_count_chunk, chunks))
+
+    counts = np.empty((len(atus), len(radii), len(windows)), dtype='int32')
+    counts[order] = np.concatenate(results)
+
+    atus = atus.copy()
+    for i, radius in enumerate(radii):
+        for j, window in enumerate(windows):
+            atus[counts_column(radius, window)] = counts[:, i, j]
+    return atus
+
+
+def load_baches(store_path=STORE_PATH):
+    # Un registro por id, con las fechas ya como datetime
+    return load_store(store_path=store_path)
+
+
+def process_proximity_baches():
+    start = datetime.now()
+    logger.info('Inicia el cálculo de distancia al bache activo más cercano')
+
+    atus = read_dataset(ATUS_CLEAN_PATH, 'atus')
+    baches = load_baches()
+
+    index = BachesActivosIndex.from_frame(baches)
+    atus = compute_dist_bache_min(atus, baches, index=index)
+    atus = count_baches_cercanos(atus, index=index)
+
+    PROCESSED_PROXIMIDAD_DIR.mkdir(parents=True, exist_ok=True)
+    atus.to_parquet(DIST_BACHE_PATH)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Accidentes con bache activo: {atus["dist_bache_min_m"].notna().sum()} de {len(atus)}')
+    logger.info(f'Cálculo de distancia completado en {elapsed:.2f} s')
+    logger.info(f'Archivo guardado en {DIST_BACHE_PATH.relative_to(ROOT_DIR)}')
+
+    return DIST_BACHE_PATH
+
+
+if __name__ == '__main__':
+    process_proximity_baches()
@@ -0,0 +1,225 @@
+"""
+schemas.py
+
+Registro central de tipos de columna de los datasets limpios. Cada etapa de
+limpieza aplica el esquema de su dataset al escribir la copia Parquet, y los
+lectores lo vuelven a aplicar al leer, de modo que todos trabajan con los
+mismos tipos compactos:
+
+* categorías para los textos con pocos valores distintos (claves decodificadas,
+  tipos de vialidad, colonias),
+* enteros pequeños para fechas desglosadas, conteos y códigos,
+* float32 para coordenadas (resolución < 1 m en Hermosillo) y mediciones,
+* datetime64 con NaT para las fechas faltantes,
+* texto ('str') con nulos para los valores faltantes: pandas 2 convertiría
+  None/NaN en los textos 'None'/'nan' (ver to_text),
+* float64 para las coordenadas proyectadas x/y (METRIC_CRS, ver projection.py),
+  que en metros UTM perderían precisión como float32.
+
+Las columnas que no aparecen en el esquema se conservan sin cambios.
+`memory_report` compara la memoria de cada dataset con tipos por omisión
+(int64, float64 y texto como objeto) contra la que ocupa con su esquema.
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, get_logger
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+ESQUEMAS_DIR = INTERIM_DIR / "esquemas"
+MEMORY_REPORT_PATH = ESQUEMAS_DIR / "reporte_memoria.csv"
+
+ATUS_CATEGORIAS = [
+    'diasemana', 'urbana', 'suburbana', 'tipaccid', 'causaacci', 'caparod',
+    'sexo', 'aliento', 'cinturon', 'clase', 'colonia', 'clavevial',
+]
+
+ESQUEMAS = {
+    'atus': {
+        'anio': 'int16', 'mes': 'int8', 'dia': 'int8', 'hora': 'int8', 'minutos': 'int8',
+        **{col: 'category' for col in ATUS_CATEGORIAS},
+        'condmuerto': 'int16', 'condherido': 'int16',
+        'latitud': 'float32', 'longitud': 'float32',
+        'x': 'float64', 'y': 'float64',
+        'datetime': 'datetime64[us]',
+    },
+    'baches': {
+        'latitude': 'float32', 'longitude': 'float32',
+        'x': 'float64', 'y': 'float64',
+        'id': 'int64',
+        'folio': 'str',
+        'fecha_reporte': 'datetime64[us]', 'fecha_atencion': 'datetime64[us]',
+        'colonia': 'category', 'direccion': 'str',
+    },
+    'clima': {
+        'temperatura': 'float32', 'precipitacion': 'float32', 'humedad': 'float32',
+        'nubosidad': 'float32', 'velocidad_viento': 'float32',
+        'codigo_clima': 'int8', 'es_de_dia': 'int8',
+    },
+    'colonias': {
+        'cvegeo': 'str', 'cve_asen': 'str', 'nom_asen': 'str',
+        'tipo': 'category', 'cp': 'category',
+    },
+    'vialidades': {
+        'u': 'int64', 'v': 'int64', 'key': 'int8',
+        'tipo_vialidad': 'category', 'nombre_vialidad': 'category',
+        'un_sentido': 'bool', 'vel_max': 'category', 'num_carriles': 'category',
+        'longitud': 'float32',
+    },
+}
+
+
+def get_schema(dataset):
+    if dataset not in ESQUEMAS:
+        raise KeyError(f'Dataset sin esquema: {dataset}. Disponibles: {sorted(ESQUEMAS)}')
+    return ESQUEMAS[dataset]
+
+
+def to_text(s):
+    """
+    s.astype('str') conservando los nulos: en pandas 2 astype('str') convierte
+    None y NaN en los textos 'None' y 'nan'.
+    """
+    text = s.astype('str')
+    nulls = s.isna().to_numpy()
+    return text.where(~nulls) if nulls.any() else text
+
+
+def astype_schema(df, schema):
+    """df.astype(schema), con las columnas 'str' convertidas por to_text."""
+    text = [col for col, dtype in schema.items() if dtype == 'str']
+    df = df.astype({col: dtype for col, dtype in schema.items() if dtype != 'str'})
+    for col in text:
+        df[col] = to_text(df[col])
+    return df
+
+
+def apply_schema(df, dataset):
+    """Convierte las columnas presentes en df a los tipos del esquema."""
+    schema = {col: dtype for col, dtype in get_schema(dataset).items() if col in df.columns}
+    return astype_schema(df, schema)
+
+
+def storage_schema(dataset):
+    """
+    Esquema para escribir por bloques: las categorías se guardan como texto,
+    porque cada bloque tendría un diccionario distinto; se restauran al leer.
+    """
+    return {col: 'str' if dtype == 'category' else dtype for col, dtype in get_schema(dataset).items()}
+
+
+def write_dataset(df, path, dataset):
+    """Aplica el esquema y guarda df en Parquet (GeoParquet si tiene geometría)."""
+    df = apply_schema(df, dataset)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, index=False)
+    logger.info(f'{dataset}: {memory_mb(df):.1f} MB en memoria, guardado en {path.relative_to(ROOT_DIR)}')
+    return path
+
+
+def read_dataset(path, dataset, columns=None, **kwargs):
+    """Lee un Parquet (o un dataset particionado) y le aplica el esquema."""
+    import pyarrow.parquet as pq
+
+    # GeoParquet: los archivos escritos desde un GeoDataFrame guardan metadatos 'geo'
+    if Path(path).is_file() and b'geo' in (pq.read_schema(path).metadata or {}):
+        import geopandas as gpd
+        df = gpd.read_parquet(path, columns=columns, **kwargs)
+    else:
+        df = pd.read_parquet(path, columns=columns, **kwargs)
+    return apply_schema(df, dataset)
+
+
+def lower_text_columns(df):
+    """
+    Pasa a minúsculas las columnas de texto transformando sólo sus valores
+    distintos; los valores que no son texto se conservan.
+    """
+    for col in df.select_dtypes(include=['object', 'string', 'category']).columns:
+        codes, uniques = pd.factorize(df[col])
+        lowered = np.array([u.lower() if isinstance(u, str) else u for u in uniques] + [None], dtype=object)
+        dtype = df[col].dtype
+        values = pd.Series(lowered[codes], index=df.index)
+        df[col] = values.astype('category' if isinstance(dtype, pd.CategoricalDtype) else dtype)
+    return df
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def default_dtypes(df):
+    """Los tipos por omisión de pandas: int64, float64 y texto como objeto."""
+    out = df.copy()
+    for col in out.columns:
+        dtype = out[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype):
+            out[col] = out[col].astype(object)
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype):
+            out[col] = out[col].astype('int64')
+        elif pd.api.types.is_float_dtype(dtype):
+            out[col] = out[col].astype('float64')
+    return out
+
+
+def memory_report(frames):
+    """
+    Memoria por dataset con tipos por omisión y con su esquema.
+    `frames` es un diccionario nombre del esquema -> DataFrame.
+    """
+    rows = []
+    for dataset, df in frames.items():
+        antes = memory_mb(default_dtypes(df))
+        despues = memory_mb(apply_schema(default_dtypes(df), dataset))
+        rows.append({
+            'dataset': dataset,
+            'filas': len(df),
+            'columnas': df.shape[1],
+            'mb_por_omision': round(antes, 2),
+            'mb_esquema': round(despues, 2),
+            'reduccion_pct': round(100 * (1 - despues / antes), 1) if antes else 0.0,
+        })
+    return pd.DataFrame(rows)
+
+
+def load_processed_frames():
+    """Los datasets limpios disponibles en el catálogo, con el nombre de su esquema."""
+    import catalog
+
+    frames = {}
+    for dataset in catalog.DATASETS:
+        path = catalog.dataset_path(dataset)
+        if catalog.dataset_files(path):
+            frames[dataset] = catalog.load(dataset, cache=False)
+        else:
+            logger.warning(f'{dataset}: no existe {path.relative_to(ROOT_DIR)}, se omite')
+    return frames
+
+
+def process_memory_report():
+    start = datetime.now()
+    logger.info('Inicia el reporte de memoria por dataset')
+
+    report = memory_report(load_processed_frames())
+    for row in report.itertuples():
+        logger.info(f'{row.dataset}: {row.mb_por_omision:.1f} MB -> {row.mb_esquema:.1f} MB '
+                    f'({row.reduccion_pct:.0f}% menos)')
+
+    ESQUEMAS_DIR.mkdir(parents=True, exist_ok=True)
+    report.to_csv(MEMORY_REPORT_PATH, index=False)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'Reporte de memoria completado en {elapsed:.2f} s')
+    logger.info(f'Archivo guardado en {MEMORY_REPORT_PATH.relative_to(ROOT_DIR)}')
+    return MEMORY_REPORT_PATH
+
+
+if __name__ == '__main__':
+    process_memory_report()
@@ -0,0 +1,281 @@
+"""
+segment_rates.py
+
+Tablas mensuales por tramo y por vialidad con el número de accidentes, los
+días-bache (días en que cada bache estuvo activo sobre el tramo) y sus tasas
+por kilómetro, como versión incremental del `acc_por_vialdiad` de la notebook 2.2.
+
+Cada mes tiene una huella (hash) de los registros que lo afectan: accidentes
+ocurridos en el mes y baches activos en algún día del mes. Al llegar un mes
+nuevo del Bachómetro o un año nuevo de ATUS sólo cambian las huellas de los
+meses tocados (por ejemplo, los meses que abarca un bache que se atendió), así
+que sólo esos registros se asocian a tramos con map_matching y sólo esas filas
+de las tablas se recalculan. Si cambia el archivo de vialidades, se recalcula todo.
+
+Los tramos se identifican por su llave TRAMO_KEY (u, v, key) de map_matching,
+no por su posición en el archivo de vialidades.
+
+Un bache está activo desde su fecha de reporte hasta su fecha de atención
+(inclusive), o hasta la fecha de corte si no ha sido atendido, igual que en
+backlog_baches.
+
+Guarda el estado en data/interim/tramos/ y las tablas en data/processed/tramos/
+"""
+
+from config import ROOT_DIR, INTERIM_DIR, PROCESSED_DIR, get_logger
+from proximity_baches import load_baches
+from map_matching import ATUS_CLEAN_PATH, TRAMO_KEY, build_tramos_index
+from hex_grid import month_ordinals
+from schemas import read_dataset
+from pathlib import Path
+from datetime import datetime
+import json
+import numpy as np
+import pandas as pd
+
+# Logger
+logger = get_logger(Path(__file__).name)
+
+# Paths
+TRAMOS_STATE_DIR = INTERIM_DIR / "tramos"
+PROCESSED_TRAMOS_DIR = PROCESSED_DIR / "tramos"
+FINGERPRINTS_PATH = TRAMOS_STATE_DIR / "huellas_mensuales.parquet"
+STATE_META_PATH = TRAMOS_STATE_DIR / "estado.json"
+TRAMOS_PATH = PROCESSED_TRAMOS_DIR / "tasas_tramo_mensual.parquet"
+VIALIDADES_PATH = PROCESSED_TRAMOS_DIR / "tasas_vialidad_mensual.parquet"
+
+DAY_NS = 86_400 * 10**9
+
+
+def month_start_ns(ordinals):
+    """Inicio (ns) de cada mes a partir de su ordinal de periodo."""
+    return pd.PeriodIndex.from_ordinals(ordinals, freq='M').to_timestamp().as_unit('ns').asi8
+
+
+def row_hashes(df, cols):
+    return pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+
+
+def expand_baches(baches, corte):
+    """
+    Una fila por (bache, mes activo) con los días activos del bache en ese mes.
+    Regresa la posición del bache en `baches`, el ordinal del mes y los días.
+    """
+    reporte = pd.to_datetime(baches['fecha_reporte'], errors='coerce').dt.normalize()
+    atencion = pd.to_datetime(baches['fecha_atencion'], errors='coerce').dt.normalize()
+    fin = atencion.fillna(corte).clip(upper=corte)
+
+    valid = (reporte.notna() & (fin >= reporte)).to_numpy()
+    rows = np.flatnonzero(valid)
+    inicio_ns = reporte[valid].to_numpy().astype('datetime64[ns]').astype('int64')
+    fin_ns = (fin[valid].to_numpy().astype('datetime64[ns]').astype('int64')) + DAY_NS
+
+    m0 = month_ordinals(reporte[valid])
+    m1 = month_ordinals(fin[valid])
+    spans = m1 - m0 + 1
+
+    row = np.repeat(rows, spans)
+    offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    mes = np.repeat(m0, spans) + offsets
+
+    m_start = month_start_ns(mes)
+    m_end = month_start_ns(mes + 1)
+    lo = np.maximum(np.repeat(inicio_ns, spans), m_start)
+    hi = np.minimum(np.repeat(fin_ns, spans), m_end)
+    dias = ((hi - lo) // DAY_NS).astype('int32')
+
+    return pd.DataFrame({'fila': row, 'mes': mes, 'dias': dias})
+
+
+def monthly_fingerprints(atus_mes, atus_hash, bache_meses, bache_hash):
+    """
+    Huella de cada mes: suma (módulo 2**64) de los hashes de los accidentes del
+    mes y de los baches activos en el mes junto con sus días activos.
+    """
+    acc = pd.Series(atus_hash, dtype='uint64').groupby(atus_mes).sum()
+
+    expanded = pd.DataFrame({
+        'h': bache_hash[bache_meses['fila'].to_numpy()],
+        'dias': bache_meses['dias'].to_numpy(),
+    })
+    h = pd.util.hash_pandas_object(expanded, index=False)
+    bch = h.groupby(bache_meses['mes'].to_numpy()).sum()
+
+    fp = pd.DataFrame({'huella_atus': acc, 'huella_baches': bch}).fillna(0).astype('uint64')
+    fp = fp[fp.index >= 0]
+    fp.index.name = 'mes'
+    return fp
+
+
+def changed_months(new, old):
+    if old is None:
+        return new.index.to_numpy()
+    joined = new.join(old, how='outer', rsuffix='_old')
+    diff = (joined['huella_atus'] != joined['huella_atus_old']) | (
+        joined['huella_baches'] != joined['huella_baches_old']
+    )
+    return joined.index[diff.to_numpy()].to_numpy()
+
+
+def segment_table(atus_tramo, atus_mes, bache_tramo, bache_meses, attributes):
+    """
+    Conteos mensuales por tramo: accidentes, baches activos, días-bache y
+    tasas por km de tramo. `atus_tramo` y `bache_tramo` son la fila_tramo del
+    índice (`attributes`); la tabla resultante usa la llave TRAMO_KEY.
+    """
+    acc = (
+        pd.DataFrame({'fila_tramo': atus_tramo, 'mes': atus_mes})
+        .query('fila_tramo >= 0')
+        .groupby(['fila_tramo', 'mes']).size().rename('accidentes')
+    )
+    bch = (
+        pd.DataFrame({
+            'fila_tramo': bache_tramo[bache_meses['fila'].to_numpy()],
+            'mes': bache_meses['mes'].to_numpy(),
+            'dias': bache_meses['dias'].to_numpy(),
+        })
+        .query('fila_tramo >= 0')
+        .groupby(['fila_tramo', 'mes'])['dias'].agg(baches_activos='size', dias_bache='sum')
+    )
+
+    table = pd.concat([acc, bch], axis=1).fillna(0).reset_index()
+    table = table.astype({'accidentes': 'int32', 'baches_activos': 'int32', 'dias_bache': 'int32'})
+    filas = table.pop('fila_tramo').to_numpy().astype('int64')
+    tramos = attributes.iloc[filas].reset_index(drop=True)
+    table = pd.concat([tramos[TRAMO_KEY], table], axis=1)
+    table['longitud_m'] = tramos['longitud'].to_numpy().astype('float32')
+    return add_rates(table)
+
+
+def add_rates(table):
+    km = table['longitud_m'] / 1000
+    table['accidentes_por_km'] = (table['accidentes'] / km).astype('float32')
+    table['dias_bache_por_km'] = (table['dias_bache'] / km).astype('float32')
+    return table
+
+
+def street_table(tramos, attributes):
+    """
+    Agrega la tabla por tramo por nombre de vialidad; la longitud es la de
+    todos los tramos de la vialidad, tengan o no eventos en el mes.
+    """
+    nombres = attributes.set_index(TRAMO_KEY)['nombre_vialidad'].astype(object)
+    longitud_total = attributes.groupby('nombre_vialidad', observed=True)['longitud'].sum()
+
+    table = (
+        tramos.join(nombres, on=TRAMO_KEY)
+        .groupby(['nombre_vialidad', 'mes'], as_index=False)
+        [['accidentes', 'baches_activos', 'dias_bache']].sum()
+    )
+    table['longitud_m'] = table['nombre_vialidad'].map(longitud_total).astype('float32')
+    return add_rates(table)
+
+
+def replace_months(path, months, table):
+    """Sustituye en la tabla guardada las filas de los meses recalculados."""
+    if path.exists():
+        stored = pd.read_parquet(path)
+        stored['mes'] = stored['mes'].dt.to_period('M').array.asi8
+        stored = stored[~stored['mes'].isin(months)]
+        # Una tabla vacía (ningún mes con eventos) no debe cambiar los tipos guardados
+        table = pd.concat([stored, table], ignore_index=True) if len(table) else stored
+
+    key = TRAMO_KEY if 'u' in table.columns else ['nombre_vialidad']
+    table = table.sort_values(['mes', *key], ignore_index=True)
+    table['mes'] = pd.PeriodIndex.from_ordinals(table['mes'], freq='M').to_timestamp()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table.to_parquet(path, index=False)
+    return table
+
+
+def load_state():
+    if not (FINGERPRINTS_PATH.exists() and STATE_META_PATH.exists()):
+        return None, None
+    with open(STATE_META_PATH) as f:
+        meta = json.load(f)
+    # Las tablas guardadas antes de usar TRAMO_KEY se identifican por fila
+    if meta.get('llave_tramo') != TRAMO_KEY:
+        logger.info('Las tablas guardadas usan otra llave de tramo, se recalculan todos los meses.')
+        return None, None
+    return pd.read_parquet(FINGERPRINTS_PATH), meta.get('vialidades')
+
+
+def save_state(fingerprints, signature):
+    TRAMOS_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    fingerprints.to_parquet(FINGERPRINTS_PATH)
+    with open(STATE_META_PATH, 'w') as f:
+        json.dump({'vialidades': list(signature) if signature else None, 'llave_tramo': TRAMO_KEY}, f)
+
+
+def update_segment_rates(atus, baches, index=None, incremental=True, corte=None):
+    """
+    Actualiza las tablas por tramo y por vialidad, recalculando sólo los meses
+    cuya huella cambió. Regresa (tabla_tramos, tabla_vialidades, meses_recalculados).
+    """
+    index = index or build_tramos_index()
+
+    atus_mes = month_ordinals(atus['datetime'])
+    atus_hash = row_hashes(atus, ['datetime', 'longitud', 'latitud'])
+
+    if corte is None:
+        corte = pd.concat([baches['fecha_reporte'], baches['fecha_atencion']]).max()
+    corte = pd.Timestamp(corte).normalize()
+    bache_meses = expand_baches(baches, corte)
+    bache_hash = row_hashes(baches, ['id', 'longitude', 'latitude', 'fecha_reporte', 'fecha_atencion'])
+
+    fingerprints = monthly_fingerprints(atus_mes, atus_hash, bache_meses, bache_hash)
+    old, signature = load_state() if incremental else (None, None)
+    current = list(index.source_signature) if index.source_signature else None
+    if old is not None and signature != current:
+        logger.info('El índice de tramos cambió, se recalculan todos los meses.')
+        old = None
+    if old is None:
+        for path in [TRAMOS_PATH, VIALIDADES_PATH]:
+            path.unlink(missing_ok=True)
+
+    months = changed_months(fingerprints, old)
+    logger.info(f'Meses a recalcular: {len(months)} de {len(fingerprints)}')
+
+    # Sólo se asocian a tramos los registros que tocan los meses recalculados
+    atus_sel = np.isin(atus_mes, months)
+    bache_meses = bache_meses[np.isin(bache_meses['mes'], months)]
+    bache_filas = np.unique(bache_meses['fila'])
+
+    matched = index.match({
+        'atus': (atus.loc[atus_sel, ['longitud', 'latitud']], 'longitud', 'latitud'),
+        'baches': (baches.iloc[bache_filas][['longitude', 'latitude']], 'longitude', 'latitude'),
+    }, cols=[])
+
+    bache_tramo = np.full(len(baches), -1, dtype='int64')
+    bache_tramo[bache_filas] = matched['baches']['fila_tramo'].to_numpy()
+
+    tramos = segment_table(
+        matched['atus']['fila_tramo'].to_numpy(), atus_mes[atus_sel],
+        bache_tramo, bache_meses, index.attributes,
+    )
+    vialidades = street_table(tramos, index.attributes)
+
+    tramos = replace_months(TRAMOS_PATH, months, tramos)
+    vialidades = replace_months(VIALIDADES_PATH, months, vialidades)
+    save_state(fingerprints, index.source_signature)
+
+    return tramos, vialidades, months
+
+
+def process_segment_rates(incremental=True):
+    start = datetime.now()
+    logger.info('Inicia la actualización de tasas mensuales por tramo y vialidad')
+
+    atus = read_dataset(ATUS_CLEAN_PATH, 'atus')
+    baches = load_baches()
+    tramos, vialidades, months = update_segment_rates(atus, baches, incremental=incremental)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f'{len(tramos)} filas tramo × mes y {len(vialidades)} filas vialidad × mes')
+    logger.info(f'Tasas por tramo actualizadas en {elapsed:.2f} s')
+    logger.info(f'Archivos guardados en {PROCESSED_TRAMOS_DIR.relative_to(ROOT_DIR)}')
+    return TRAMOS_PATH, VIALIDADES_PATH
+
+
+if __name__ == '__main__':
+    process_segment_rates()
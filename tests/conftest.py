@@ -0,0 +1,11 @@
+"""
+Los módulos de src se importan como en los scripts (`from config import ...`),
+así que se agrega src al path, igual que en benchmarks.
+"""
+
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
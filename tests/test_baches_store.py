@@ -0,0 +1,25 @@
+"""
+Selección del registro vigente de cada id en baches_store.prepare.
+"""
+
+import pandas as pd
+
+import baches_store
+
+
+def baches(fuente, ids, reporte, atencion):
+    return pd.DataFrame({
+        'id': ids, 'folio': [f'{fuente}-{i}' for i in ids], 'fuente': fuente,
+        'fecha_reporte': pd.to_datetime(reporte), 'fecha_atencion': pd.to_datetime(atencion),
+    })
+
+
+def test_prepare_conserva_la_version_mas_reciente_sin_importar_el_orden():
+    anterior = baches('baches_2022', [1, 2, 3], ['2022-05-01'] * 3, [None, '2022-06-01', None])
+    reciente = baches('baches_2023', [1, 2, 3], ['2022-05-01'] * 3, ['2023-01-10', None, None])
+
+    esperado = {1: 'baches_2023-1', 2: 'baches_2022-2', 3: 'baches_2023-3'}
+    for partes in ([anterior, reciente], [reciente, anterior]):
+        df = baches_store.prepare(pd.concat(partes, ignore_index=True))
+        assert dict(zip(df['id'], df['folio'])) == esperado
+        assert 'fuente' not in df.columns
@@ -0,0 +1,102 @@
+"""
+Serie diaria de baches activos de backlog_baches (línea de barrido) contra un
+conteo exhaustivo día por día con la regla fecha_reporte <= d y fecha_atencion
+nula o >= d.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backlog_baches
+
+
+def make_baches(n, seed):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2022-01-01')
+    reporte = start + pd.to_timedelta(rng.integers(0, 200, n), unit='D')
+    # Horas del día para cubrir la normalización; algunas atenciones anteriores al reporte
+    reporte = reporte + pd.to_timedelta(rng.integers(0, 24, n), unit='h')
+    atencion = reporte + pd.to_timedelta(rng.integers(-10, 90, n), unit='D')
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'fecha_reporte': pd.Series(reporte).where(rng.random(n) > 0.03),
+        'fecha_atencion': pd.Series(atencion).where(rng.random(n) < 0.6),
+        'colonia': pd.Series(rng.choice(['centro', 'pitic', 'modelo'], n)).where(rng.random(n) > 0.2),
+    })
+
+
+def brute_force(baches, dates):
+    """Matriz (días × baches) de actividad."""
+    reporte = baches['fecha_reporte'].dt.normalize().to_numpy()[None, :]
+    atencion = baches['fecha_atencion'].dt.normalize().to_numpy()[None, :]
+    d = dates.to_numpy()[:, None]
+    return (reporte <= d) & (np.isnat(atencion) | (atencion >= d))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_serie_total_coincide_con_conteo_exhaustivo(seed):
+    baches = make_baches(2000, seed)
+    result = backlog_baches.backlog_series(baches)
+
+    dates = pd.DatetimeIndex(result['fecha'])
+    assert (dates == pd.date_range(dates[0], dates[-1], freq='D')).all()
+    expected = brute_force(baches, dates).sum(axis=1)
+    assert (result['baches_activos'].to_numpy() == expected).all()
+
+
+def test_rango_explicito_acumula_eventos_anteriores():
+    baches = make_baches(2000, 2)
+    result = backlog_baches.backlog_series(baches, start='2022-03-01', end='2022-04-15')
+
+    dates = pd.date_range('2022-03-01', '2022-04-15', freq='D')
+    assert (pd.DatetimeIndex(result['fecha']) == dates).all()
+    assert (result['baches_activos'].to_numpy() == brute_force(baches, dates).sum(axis=1)).all()
+
+
+def test_serie_por_grupo_incluye_nulos_y_omite_invertidos():
+    baches = make_baches(2000, 3)
+    invertidos = (baches['fecha_atencion'].dt.normalize() < baches['fecha_reporte'].dt.normalize()).sum()
+    assert invertidos > 0
+
+    result = backlog_baches.backlog_series(baches, by='colonia')
+    dates = pd.date_range(result['fecha'].min(), result['fecha'].max(), freq='D')
+    active = brute_force(baches, dates)
+
+    for group in [*baches['colonia'].dropna().unique(), None]:
+        members = (baches['colonia'].isna() if group is None else baches['colonia'] == group).to_numpy()
+        expected = pd.Series(active[:, members].sum(axis=1), index=dates)
+        expected = expected[expected > 0]
+
+        rows = result['colonia'].isna() if group is None else result['colonia'] == group
+        got = result[rows.to_numpy()].set_index('fecha')['baches_activos']
+        assert got.index.equals(pd.DatetimeIndex(expected.index, name='fecha')), group
+        assert (got.to_numpy() == expected.to_numpy()).all(), group
+
+
+def test_tipo_vialidad_se_une_por_llave_del_tramo(tmp_path, monkeypatch):
+    import map_matching
+
+    # Tramos en un orden distinto al que tenían al asociar los baches
+    attributes = pd.DataFrame({
+        'u': [20, 10], 'v': [21, 11], 'key': pd.array([0, 0], dtype='int8'),
+        'tipo_vialidad': ['primaria', 'residencial'],
+    })
+    index = type('Index', (), {'attributes': attributes})()
+    monkeypatch.setattr(map_matching, 'build_tramos_index', lambda: index)
+
+    matches = pd.DataFrame({
+        'fuente': ['baches'] * 4 + ['atus'],
+        'id_registro': [1, 2, 3, 4, 1],
+        'u': pd.array([10, 20, 30, None, 20], dtype='Int64'),
+        'v': pd.array([11, 21, 31, None, 21], dtype='Int64'),
+        'key': pd.array([0, 0, 0, None, 0], dtype='Int8'),
+    })
+    monkeypatch.setattr(map_matching, 'MATCHES_PATH', tmp_path / "puntos_tramos.parquet")
+    matches.to_parquet(map_matching.MATCHES_PATH, index=False)
+
+    # 3 quedó en un tramo que ya no existe, 4 sin tramo y 5 sin asociar
+    baches = pd.DataFrame({'id': [5, 4, 3, 2, 1]}, index=[10, 11, 12, 13, 14])
+    out = backlog_baches.add_tipo_vialidad(baches)
+    assert out['tipo_vialidad'].tolist()[3:] == ['primaria', 'residencial']
+    assert out['tipo_vialidad'].iloc[:3].isna().all()
@@ -0,0 +1,81 @@
+"""
+Cache de catalog.load: aciertos con la misma proyección, invalidación cuando
+cambian los archivos (por fecha o por contenido) y rutas fuera del catálogo.
+"""
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setitem(catalog._stats, 'aciertos', 0)
+    monkeypatch.setitem(catalog._stats, 'fallos', 0)
+    catalog.clear_cache()
+    yield
+    catalog.clear_cache()
+
+
+def write_clima(path, temperatura):
+    df = pd.DataFrame({'temperatura': np.asarray(temperatura, dtype='float64'), 'codigo_clima': 1})
+    df.to_parquet(path, index=False)
+    return path
+
+
+def test_path_fuera_del_repositorio(tmp_path, caplog, monkeypatch):
+    path = write_clima(tmp_path / "clima.parquet", [20.5, 31.0])
+    with caplog.at_level(logging.DEBUG, logger=catalog.logger.name):
+        df = catalog.load('clima', path=path)
+
+    assert df['temperatura'].dtype == 'float32' and df['codigo_clima'].dtype == 'int8'
+    assert str(path) in caplog.text
+
+    # Una ruta relativa tampoco se puede expresar respecto a ROOT_DIR
+    monkeypatch.chdir(tmp_path)
+    assert len(catalog.load('clima', path="clima.parquet")) == 2
+
+
+def test_cache_acierta_y_regresa_copias(tmp_path):
+    path = write_clima(tmp_path / "clima.parquet", [20.5, 31.0])
+    first = catalog.load('clima', path=path)
+    first.loc[0, 'temperatura'] = -99
+
+    second = catalog.load('clima', path=path)
+    assert second.loc[0, 'temperatura'] == np.float32(20.5)
+    assert catalog.cache_info()['aciertos'] == 1
+
+    # Otra proyección es otra entrada
+    catalog.load('clima', columns=['temperatura'], path=path)
+    assert catalog.cache_info()['fallos'] == 2 and catalog.cache_info()['entradas'] == 2
+
+
+def test_cache_se_invalida_al_cambiar_el_archivo(tmp_path):
+    path = write_clima(tmp_path / "clima.parquet", [20.5, 31.0])
+    catalog.load('clima', path=path)
+
+    write_clima(path, [20.5, 31.0, 25.0])
+    assert len(catalog.load('clima', path=path)) == 3
+    assert catalog.cache_info()['aciertos'] == 0
+
+
+def test_validate_hash_detecta_cambios_con_la_misma_fecha(tmp_path):
+    path = write_clima(tmp_path / "clima.parquet", [20.5, 31.0])
+    stat = path.stat()
+    catalog.load('clima', path=path)
+
+    # Mismo tamaño y fecha de modificación, distinto contenido
+    write_clima(path, [21.5, 31.0])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert path.stat().st_size == stat.st_size
+
+    # La firma por fecha no ve el cambio; la de contenido sí
+    assert catalog.load('clima', path=path)['temperatura'].iloc[0] == np.float32(20.5)
+    assert catalog.load('clima', path=path, validate='hash')['temperatura'].iloc[0] == np.float32(21.5)
+    catalog.load('clima', path=path, validate='hash')
+    assert catalog.cache_info()['aciertos'] == 2
@@ -0,0 +1,33 @@
+"""
+Imputación de nulos de clean_clima: las horas finales aún no publicadas se
+descartan en lugar de repetir la última hora disponible.
+"""
+
+import numpy as np
+import pandas as pd
+
+import clean_clima
+
+
+def horario(n, nulos_finales):
+    index = pd.date_range('2024-03-01', periods=n, freq='h', tz='UTC', name='date')
+    df = pd.DataFrame({col: np.arange(n, dtype='float64')
+                       for col in clean_clima.COLUMNAS_FLOAT + clean_clima.COLUMNAS_INT}, index=index)
+    df.iloc[3, 0] = np.nan  # hueco intermedio: se imputa
+    df.iloc[n - nulos_finales:] = np.nan
+    return df
+
+
+def test_horas_finales_sin_datos_se_descartan():
+    df = clean_clima.impute_nulls(clean_clima.drop_trailing_nulls(horario(48, 30)))
+
+    assert len(df) == 18
+    assert df.index.max() == pd.Timestamp('2024-03-01 17:00', tz='UTC')
+    assert not df.isna().any().any()
+    assert df.iloc[3, 0] == 2
+
+
+def test_sin_nulos_finales_no_cambia():
+    df = horario(24, 0)
+    assert len(clean_clima.drop_trailing_nulls(df)) == 24
+    assert len(clean_clima.drop_trailing_nulls(df.iloc[:0])) == 0
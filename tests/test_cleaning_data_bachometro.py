@@ -0,0 +1,76 @@
+"""
+Limpieza por bloques de cleaning_data_bachometro: registros sin id, textos
+nulos y archivos JSON vacíos o que no son un arreglo.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+import cleaning_data_bachometro as cdb
+
+
+def registro(i, **kwargs):
+    return {
+        'id': i, 'folio': f'F-{i}', 'latitude': 29.08, 'longitude': -110.95,
+        'fecha_reporte': 'Diciembre 30, 2022', 'fecha_atencion': None,
+        'direccion': f'Calle {i}', 'colonia': 'Centro', 'imagenes': [], **kwargs,
+    }
+
+
+def procesar(tmp_path, contenido, nombre='baches_2022.json'):
+    path = tmp_path / nombre
+    path.write_text(contenido, encoding='utf-8')
+    filas = cdb.procesar_dataset(path, tmp_path / "baches.parquet", chunk_size=2)
+    return filas, tmp_path / "baches.parquet"
+
+
+def test_registros_sin_id_se_descartan(tmp_path, capsys):
+    registros = [registro(1), registro(None), registro(3), {**registro(4), 'id': 'x'}, registro(5)]
+    filas, dataset = procesar(tmp_path, json.dumps(registros))
+
+    assert filas == 3
+    assert 'Advertencia: 2 registros sin id' in capsys.readouterr().out
+    df = cdb.load_baches(dataset)
+    assert sorted(df['id']) == [1, 3, 5]
+
+
+def test_textos_nulos_se_conservan_como_nulos(tmp_path):
+    registros = [registro(1, folio=None, direccion=None, colonia=None), registro(2)]
+    _, dataset = procesar(tmp_path, json.dumps(registros))
+
+    df = cdb.load_baches(dataset).set_index('id')
+    for col in ['folio', 'direccion', 'colonia']:
+        assert pd.isna(df.loc[1, col]), col
+        assert not df[col].isin(['None', 'nan']).any(), col
+    assert df.loc[2, 'folio'] == 'F-2'
+
+
+def test_arreglo_despues_de_espacios_de_varios_bloques(tmp_path):
+    path = tmp_path / "baches_2022.json"
+    path.write_text(' ' * 50 + '\n' + json.dumps([registro(1), registro(2), registro(3)]), encoding='utf-8')
+
+    bloques = list(cdb.iter_json_array(path, chunk_size=2, block_size=16))
+    assert [len(b) for b in bloques] == [2, 1]
+
+
+def test_archivo_vacio_no_tiene_registros(tmp_path):
+    path = tmp_path / "baches_2022.json"
+    path.write_text('  \n', encoding='utf-8')
+    assert list(cdb.iter_json_array(path)) == []
+
+    filas, _ = procesar(tmp_path, '')
+    assert filas == 0
+
+
+def test_archivo_que_no_es_arreglo(tmp_path):
+    path = tmp_path / "baches_2022.json"
+    path.write_text('{"id": 1}', encoding='utf-8')
+    with pytest.raises(ValueError, match='no contiene un arreglo JSON'):
+        list(cdb.iter_json_array(path))
+
+    # procesar_dataset reporta el error sin dejar la partición temporal
+    filas, dataset = procesar(tmp_path, '{"id": 1}')
+    assert filas is None
+    assert not any(dataset.glob('*.tmp'))
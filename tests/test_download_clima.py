@@ -0,0 +1,134 @@
+"""
+Descarga por ventanas de download_clima contra un servidor HTTP local que
+imita el API de archivo de Open-Meteo.
+"""
+
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+import download_clima
+
+
+class OpenMeteoStub(BaseHTTPRequestHandler):
+    """Regresa datos horarios para [start_date, end_date]; registra cada petición."""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start, end = query['start_date'][0], query['end_date'][0]
+        self.server.requests.append((start, end))
+
+        times = pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=23), freq='h')
+        hourly = {'time': times.strftime('%Y-%m-%dT%H:%M').tolist()}
+        for i, var in enumerate(download_clima.HOURLY_VARIABLES):
+            values = [float(i)] * len(times)
+            # Horas que el API nunca llena (p. ej. un hueco del reanálisis)
+            for t in self.server.null_hours:
+                if t in times:
+                    values[times.get_loc(t)] = None
+            hourly[var] = values
+
+        body = json.dumps({'hourly': hourly}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OpenMeteoStub)
+    server.requests = []
+    server.null_hours = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_port}/v1/archive'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clima_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_clima, 'ROOT_DIR', tmp_path)
+    monkeypatch.setattr(download_clima, 'WINDOWS_DIR', tmp_path / "ventanas")
+    return tmp_path
+
+
+def set_today(monkeypatch, today):
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(download_clima, 'date', FixedDate)
+
+
+def download(api, start='2024-01-15'):
+    api.requests.clear()
+    df = download_clima.download_and_process_data(start, None, api_url=api.url, max_workers=2)
+    return df, sorted(api.requests)
+
+
+def test_windows_split_by_month_and_clip_to_range():
+    windows = download_clima.build_windows('2024-01-15', '2024-03-10')
+    assert windows == [
+        (date(2024, 1, 15), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 3, 1), date(2024, 3, 10)),
+    ]
+
+
+def test_downloads_only_missing_windows_and_extends_to_yesterday(api, clima_dirs, monkeypatch):
+    set_today(monkeypatch, date(2024, 3, 10))
+    df, requests = download(api)
+    assert requests == [('2024-01-15', '2024-01-31'), ('2024-02-01', '2024-02-29'),
+                        ('2024-03-01', '2024-03-09')]
+    assert len(df) == (31 - 15 + 1 + 29 + 9) * 24
+
+    # Sin cambios de fecha todas las ventanas están completas
+    _, requests = download(api)
+    assert requests == []
+
+    # Al avanzar la fecha sólo se completa marzo y se agrega abril hasta ayer
+    set_today(monkeypatch, date(2024, 4, 3))
+    df, requests = download(api)
+    assert requests == [('2024-03-01', '2024-03-31'), ('2024-04-01', '2024-04-02')]
+    assert df['date'].max().startswith('2024-04-02 23:00')
+    assert df['date'].is_unique
+
+
+def test_nulls_only_refetch_recent_windows(api, clima_dirs, monkeypatch):
+    api.null_hours = [pd.Timestamp('2024-01-20 05:00'), pd.Timestamp('2024-03-08 05:00')]
+    set_today(monkeypatch, date(2024, 3, 10))
+    download(api)
+
+    # Enero tiene un hueco permanente; marzo termina ayer y sus nulos pueden llenarse
+    _, requests = download(api)
+    assert requests == [('2024-03-01', '2024-03-09')]
+
+
+def test_nulls_fetched_while_recent_are_refetched_later(api, clima_dirs, monkeypatch):
+    # Marzo se descarga completo el 2 de abril, cuando sus últimas horas aún no se publican
+    api.null_hours = [pd.Timestamp('2024-03-30 05:00')]
+    set_today(monkeypatch, date(2024, 4, 2))
+    download(api, start='2024-03-01')
+
+    # Semanas después marzo ya no es reciente, pero sus nulos se descargaron recientes
+    set_today(monkeypatch, date(2024, 4, 20))
+    _, requests = download(api, start='2024-03-01')
+    assert requests == [('2024-03-01', '2024-03-31'), ('2024-04-01', '2024-04-19')]
+
+    # Descargados 20 días después del fin de marzo, sus nulos ya son definitivos
+    set_today(monkeypatch, date(2024, 4, 21))
+    _, requests = download(api, start='2024-03-01')
+    assert requests == [('2024-04-01', '2024-04-20')]
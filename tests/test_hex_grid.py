@@ -0,0 +1,125 @@
+"""
+Malla de conteos celda × mes de hex_grid contra un recorrido exhaustivo: la
+celda de cada punto es la de centro más cercano, y las actualizaciones
+incrementales (GridCounts.update con `replace` y build_grid) coinciden con
+reconstruir la malla completa.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import hex_grid
+from projection import project_lonlat
+
+# ~5 km alrededor del centro de Hermosillo
+BBOX = (-111.00, 29.06, -110.95, 29.11)
+
+
+def make_points(n, seed):
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(BBOX[0], BBOX[2], n)
+    lat = rng.uniform(BBOX[1], BBOX[3], n)
+    fecha = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+    df = pd.DataFrame({
+        'id': np.arange(n),
+        'longitude': lon, 'latitude': lat,
+        'fecha_reporte': pd.Series(fecha).where(rng.random(n) > 0.02),
+    })
+    df['x'], df['y'] = project_lonlat(lon, lat)
+    return df
+
+
+def brute_force_counts(df, size, kind):
+    """Conteos (celda, mes) asignando cada punto al centro de celda más cercano."""
+    grid = hex_grid.GridCounts(size, kind)
+    x, y = df['x'].to_numpy(), df['y'].to_numpy()
+    cells = hex_grid.extent_cells(grid.locate(x, y), kind)
+    cx, cy = hex_grid.cell_centers(*hex_grid.decode_cells(cells), size, kind)
+    nearest = cells[np.argmin(np.hypot(x[:, None] - cx[None, :], y[:, None] - cy[None, :]), axis=1)]
+
+    months = hex_grid.month_ordinals(df['fecha_reporte'])
+    counts = pd.Series(1, index=pd.MultiIndex.from_arrays([nearest, months])).groupby(level=[0, 1]).sum()
+    return counts[counts.index.get_level_values(1) >= 0].sort_index()
+
+
+def grid_counts(grid):
+    coo = grid.matrix.tocoo()
+    index = pd.MultiIndex.from_arrays([grid.cells[coo.row], grid.months[coo.col]])
+    counts = pd.Series(coo.data.astype('int64'), index=index)
+    return counts[counts > 0].sort_index()
+
+
+def full_grid(df, size, kind):
+    x, y = df['x'].to_numpy(), df['y'].to_numpy()
+    return hex_grid.GridCounts(size, kind).update(x, y, hex_grid.month_ordinals(df['fecha_reporte']))
+
+
+@pytest.mark.parametrize('kind', ['hex', 'square'])
+def test_conteos_coinciden_con_centro_mas_cercano(kind):
+    df = make_points(3000, 0)
+    expected = brute_force_counts(df, 250, kind)
+    got = grid_counts(full_grid(df, 250, kind))
+    assert got.index.equals(expected.index)
+    assert (got.to_numpy() == expected.to_numpy()).all()
+
+
+def test_update_con_replace_coincide_con_reconstruir():
+    # Un punto de mayo lejos de los demás: su celda queda vacía al quitar mayo
+    lejano = make_points(1, 8).assign(fecha_reporte=pd.Timestamp('2022-05-20'))
+    lejano['x'], lejano['y'] = project_lonlat([-111.06], [29.15])
+    df = pd.concat([make_points(3000, 1), lejano], ignore_index=True)
+    grid = full_grid(df, 500, 'hex')
+
+    # Registros tardíos de un mes antiguo, un mes que se queda sin registros y un mes nuevo
+    months = df['fecha_reporte'].dt.to_period('M')
+    tardios = make_points(200, 2).assign(fecha_reporte=pd.Timestamp('2022-02-15'))
+    nuevo = make_points(100, 3).assign(fecha_reporte=pd.Timestamp('2023-01-10'))
+    actual = pd.concat([df[months != pd.Period('2022-05', 'M')], tardios, nuevo], ignore_index=True)
+
+    changed = np.array([pd.Period(m, 'M').ordinal for m in ['2022-02', '2022-05', '2023-01']])
+    rows = np.isin(hex_grid.month_ordinals(actual['fecha_reporte']), changed)
+    sub = actual[rows]
+    grid.update(sub['x'].to_numpy(), sub['y'].to_numpy(),
+                hex_grid.month_ordinals(sub['fecha_reporte']), replace=changed)
+
+    full = full_grid(actual, 500, 'hex')
+    expected, got = grid_counts(full), grid_counts(grid)
+    assert got.index.equals(expected.index)
+    assert (got.to_numpy() == expected.to_numpy()).all()
+    # Las celdas que sólo tenían puntos de mayo salen del catálogo
+    assert np.array_equal(grid.cells, full.cells)
+    assert pd.Period('2022-05', 'M').ordinal not in grid_counts(grid).index.get_level_values(1)
+
+
+def test_build_grid_incremental_coincide_con_reconstruir(tmp_path, monkeypatch):
+    monkeypatch.setattr(hex_grid, 'GRID_DIR', tmp_path)
+    df = make_points(3000, 4)
+    hex_grid.build_grid(df, 'baches', 500)
+
+    # Un registro tardío de enero y una coordenada corregida en marzo
+    actual = pd.concat([df, make_points(1, 5).assign(fecha_reporte=pd.Timestamp('2022-01-20'))],
+                       ignore_index=True)
+    marzo = (actual['fecha_reporte'].dt.month == 3).to_numpy().nonzero()[0][0]
+    actual.loc[marzo, ['x', 'longitude']] = actual.loc[marzo, ['x', 'longitude']] + [400.0, 0.004]
+
+    incremental = hex_grid.build_grid(actual, 'baches', 500)
+    expected = grid_counts(full_grid(actual, 500, 'hex'))
+    got = grid_counts(incremental)
+    assert got.index.equals(expected.index)
+    assert (got.to_numpy() == expected.to_numpy()).all()
+
+
+def test_puntos_fuera_de_hermosillo_no_extienden_la_malla(tmp_path, monkeypatch):
+    monkeypatch.setattr(hex_grid, 'GRID_DIR', tmp_path)
+    df = make_points(500, 6)
+    hex_grid.build_grid(df, 'baches', 500)
+
+    # Un bache con coordenadas (0, 0) en un mes ya agregado
+    malo = make_points(1, 7).assign(longitude=0.0, latitude=0.0, fecha_reporte=pd.Timestamp('2022-06-01'))
+    malo['x'], malo['y'] = project_lonlat([0.0], [0.0])
+    grid = hex_grid.build_grid(pd.concat([df, malo], ignore_index=True), 'baches', 500)
+
+    expected = full_grid(df, 500, 'hex')
+    assert np.array_equal(grid.cells, expected.cells)
+    assert len(hex_grid.extent_cells(grid.cells)) < 1000
@@ -0,0 +1,66 @@
+"""
+Asociación de puntos a tramos de map_matching: la llave (u, v, key) del tramo
+no depende del orden de las filas del archivo de vialidades.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+import shapely
+
+from map_matching import TRAMO_KEY, TramosIndex
+
+
+def make_gdf():
+    """Tres calles horizontales de cuatro tramos cada una."""
+    lons = np.linspace(-110.99, -110.97, 5)
+    rows = []
+    for i, lat in enumerate([29.08, 29.09, 29.10]):
+        for j in range(4):
+            rows.append({
+                'u': 100 * i + j, 'v': 100 * i + j + 1, 'key': 0,
+                'nombre_vialidad': f'calle {i}', 'tipo_vialidad': 'residencial',
+                'geometry': shapely.LineString([(lons[j], lat), (lons[j + 1], lat)]),
+            })
+    gdf = gpd.GeoDataFrame(rows, crs='EPSG:4326')
+    gdf['longitud'] = gdf.to_crs('EPSG:32612').length
+    return gdf
+
+
+def points():
+    # Dos puntos junto a tramos conocidos y uno lejos de todos
+    return pd.DataFrame({
+        'longitude': [-110.9885, -110.9725, -110.90],
+        'latitude': [29.0801, 29.0999, 29.00],
+    })
+
+
+def match(gdf):
+    return TramosIndex(gdf).match({'baches': (points(), 'longitude', 'latitude')})['baches']
+
+
+def test_match_regresa_la_llave_del_tramo():
+    out = match(make_gdf())
+    assert out[TRAMO_KEY].iloc[:2].astype('int64').values.tolist() == [[0, 1, 0], [203, 204, 0]]
+    assert out[TRAMO_KEY].iloc[2].isna().all()
+    assert out['fila_tramo'].iloc[2] == -1
+
+
+def test_llave_estable_al_reordenar_o_quitar_tramos():
+    gdf = make_gdf()
+    base = match(gdf)
+
+    # Otra limpieza: filas en otro orden y sin un tramo lejano a los puntos
+    other = gdf.drop(index=6).sample(frac=1, random_state=0)
+    out = match(other)
+
+    assert not np.array_equal(out['fila_tramo'], base['fila_tramo'])
+    pd.testing.assert_frame_equal(out[TRAMO_KEY], base[TRAMO_KEY])
+
+
+def test_llave_duplicada_es_error():
+    gdf = make_gdf()
+    gdf.loc[1, ['u', 'v']] = gdf.loc[0, ['u', 'v']].to_numpy()
+    with pytest.raises(ValueError):
+        TramosIndex(gdf)
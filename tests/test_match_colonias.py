@@ -0,0 +1,28 @@
+"""
+Columnas que match_colonias agrega a un DataFrame de baches.
+"""
+
+import pandas as pd
+
+import match_colonias
+
+
+def test_match_colonias_reemplaza_columnas_y_alinea_por_posicion(tmp_path):
+    colonias = pd.DataFrame({'cvegeo': ['A', 'B'], 'nom_asen': ['Centro', 'Pitic']})
+    matcher = match_colonias.ColoniaMatcher(colonias)
+
+    # Índice repetido y columnas de un emparejamiento anterior
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'colonia': ['Col. Centro', 'Fracc. Pitic', 'Desconocida'],
+        'cvegeo': ['viejo'] * 3,
+        'nom_asen': ['viejo'] * 3,
+    }, index=[7, 7, 8])
+
+    out = match_colonias.match_colonias(df, matcher=matcher, cache_path=tmp_path / "cache.json")
+
+    assert list(out.index) == [7, 7, 8]
+    assert out.columns.is_unique
+    assert out['id'].tolist() == [1, 2, 3]
+    assert out['cvegeo'].tolist()[:2] == ['A', 'B'] and pd.isna(out['cvegeo'].iloc[2])
+    assert out['nom_asen'].tolist()[:2] == ['Centro', 'Pitic']
@@ -0,0 +1,40 @@
+"""
+Versión del código de una etapa del pipeline: incluye los módulos de src que
+importa la etapa, directa o indirectamente.
+"""
+
+import pipeline
+
+
+def write_src(src, **modules):
+    for name, code in modules.items():
+        (src / f"{name}.py").write_text(code)
+
+
+def test_code_hash_sigue_imports_de_src(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'SRC_DIR', tmp_path)
+    write_src(
+        tmp_path,
+        config='ROOT = 1\n',
+        etapa='from config import ROOT\nimport ayuda\nimport json\n',
+        ayuda='def f():\n    from interno import g\n    return g()\n',
+        interno='def g():\n    return 1\n',
+        ajeno='X = 1\n',
+    )
+    stage = pipeline.Stage('etapa', 'etapa:main')
+    assert pipeline.code_modules(stage) == ['ayuda', 'config', 'etapa', 'interno']
+
+    before = pipeline.code_hash(stage)
+    write_src(tmp_path, ajeno='X = 2\n')
+    assert pipeline.code_hash(stage) == before
+
+    # Un cambio en un módulo importado dentro de una función también cuenta
+    write_src(tmp_path, interno='def g():\n    return 2\n')
+    assert pipeline.code_hash(stage) != before
+
+
+def test_stages_incluyen_modulos_compartidos():
+    for stage in pipeline.STAGES:
+        modules = pipeline.code_modules(stage)
+        assert 'instrumentation' in modules, stage
+        assert all((pipeline.SRC_DIR / f"{m}.py").exists() for m in modules)
@@ -0,0 +1,96 @@
+"""
+BachesActivosIndex contra un recorrido exhaustivo de todos los pares
+(accidente, bache) con la regla de actividad de la notebook 2.3.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import proximity_baches
+from projection import project_lonlat
+
+# ~2 km alrededor del centro de Hermosillo, para que haya baches a pocos metros
+BBOX = (-110.99, 29.08, -110.97, 29.10)
+
+
+def make_frames(n_baches, n_atus, seed):
+    rng = np.random.default_rng(seed)
+
+    def points(n):
+        return rng.uniform(BBOX[0], BBOX[2], n), rng.uniform(BBOX[1], BBOX[3], n)
+
+    def dates(n):
+        start = pd.Timestamp('2022-01-01').value
+        end = pd.Timestamp('2023-12-31').value
+        return pd.to_datetime(rng.integers(start, end, n))
+
+    b_lon, b_lat = points(n_baches)
+    reporte = dates(n_baches)
+    atencion = reporte + pd.to_timedelta(rng.integers(-5, 400, n_baches), unit='D')
+    baches = pd.DataFrame({
+        'id': np.arange(n_baches) + 1000,
+        'longitude': b_lon, 'latitude': b_lat,
+        # Algunos sin fecha de reporte, muchos sin atender
+        'fecha_reporte': reporte.where(rng.random(n_baches) > 0.02),
+        'fecha_atencion': atencion.where(rng.random(n_baches) < 0.4),
+    })
+
+    a_lon, a_lat = points(n_atus)
+    atus = pd.DataFrame({
+        'longitud': a_lon, 'latitud': a_lat,
+        'datetime': dates(n_atus).where(rng.random(n_atus) > 0.02),
+    })
+    return baches, atus
+
+
+def brute_force(atus, baches):
+    """Matriz (accidentes × baches) de distancias, actividad y antigüedad del reporte."""
+    ax, ay = project_lonlat(atus['longitud'], atus['latitud'])
+    bx, by = project_lonlat(baches['longitude'], baches['latitude'])
+    dist = np.hypot(ax[:, None] - bx[None, :], ay[:, None] - by[None, :])
+
+    t = atus['datetime'].to_numpy()[:, None]
+    reporte = baches['fecha_reporte'].to_numpy()[None, :]
+    atencion = baches['fecha_atencion'].to_numpy()[None, :]
+    active = (reporte <= t) & (np.isnat(atencion) | (atencion >= t))
+    return dist, active, t - reporte
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_dist_bache_min_matches_brute_force(seed):
+    baches, atus = make_frames(3000, 400, seed)
+    dist, active, _ = brute_force(atus, baches)
+
+    result = proximity_baches.compute_dist_bache_min(atus, baches)
+
+    masked = np.where(active, dist, np.inf)
+    expected = masked.min(axis=1)
+    has_active = np.isfinite(expected)
+
+    got = result['dist_bache_min_m'].to_numpy(dtype='float64')
+    assert np.array_equal(np.isnan(got), ~has_active)
+    np.testing.assert_allclose(got[has_active], expected[has_active], rtol=0, atol=1e-6)
+
+    expected_ids = baches['id'].to_numpy()[masked.argmin(axis=1)]
+    got_ids = result['id_bache_min'].to_numpy()
+    assert (got_ids[has_active] == expected_ids[has_active]).all()
+    assert result['id_bache_min'].isna().to_numpy()[~has_active].all()
+
+
+def test_counts_match_brute_force():
+    baches, atus = make_frames(3000, 400, 3)
+    dist, active, age = brute_force(atus, baches)
+    radii, windows = (10, 50, 150), (None, 30, 365)
+
+    # Bloques pequeños para cubrir la partición y el reensamblado del orden
+    result = proximity_baches.count_baches_cercanos(
+        atus, baches, radii=radii, windows=windows, n_workers=1, chunk_size=64)
+
+    for radius in radii:
+        for window in windows:
+            mask = active & (dist < radius)
+            if window is not None:
+                mask &= age <= np.timedelta64(window, 'D')
+            column = proximity_baches.counts_column(radius, window)
+            assert (result[column].to_numpy() == mask.sum(axis=1)).all(), column
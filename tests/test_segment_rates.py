@@ -0,0 +1,174 @@
+"""
+Tablas mensuales por tramo de segment_rates: los días activos de cada bache
+contra un conteo día por día, la sustitución de meses en las tablas guardadas
+y la actualización incremental contra un recálculo completo.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+import shapely
+
+import segment_rates
+from map_matching import TramosIndex
+
+# ~2 km alrededor del centro de Hermosillo
+BBOX = (-110.99, 29.08, -110.97, 29.10)
+
+
+def make_index(order=None):
+    """Diez calles horizontales de cinco tramos cada una."""
+    lons = np.linspace(BBOX[0], BBOX[2], 6)
+    rows = []
+    for i, lat in enumerate(np.linspace(BBOX[1], BBOX[3], 10)):
+        for j in range(5):
+            rows.append({
+                'u': i * 10 + j, 'v': i * 10 + j + 1, 'key': 0,
+                'nombre_vialidad': f'calle {i}', 'tipo_vialidad': 'primaria' if i % 2 else 'residencial',
+                'geometry': shapely.LineString([(lons[j], lat), (lons[j + 1], lat)]),
+            })
+    gdf = gpd.GeoDataFrame(rows, crs='EPSG:4326')
+    gdf['longitud'] = gdf.to_crs('EPSG:32612').length
+    if order is not None:
+        gdf = gdf.iloc[order]
+    return TramosIndex(gdf, source_signature=('vialidades', 1))
+
+
+def make_frames(n_atus, n_baches, seed):
+    rng = np.random.default_rng(seed)
+
+    def points(n):
+        return rng.uniform(BBOX[0], BBOX[2], n), rng.uniform(BBOX[1], BBOX[3], n)
+
+    def dates(n):
+        return pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+
+    lon, lat = points(n_atus)
+    atus = pd.DataFrame({'longitud': lon, 'latitud': lat, 'datetime': dates(n_atus)})
+
+    lon, lat = points(n_baches)
+    reporte = dates(n_baches)
+    atencion = reporte + pd.to_timedelta(rng.integers(-5, 120, n_baches), unit='D')
+    baches = pd.DataFrame({
+        'id': np.arange(n_baches), 'longitude': lon, 'latitude': lat,
+        'fecha_reporte': pd.Series(reporte).where(rng.random(n_baches) > 0.02),
+        'fecha_atencion': pd.Series(atencion).where(rng.random(n_baches) < 0.6),
+    })
+    return atus, baches
+
+
+def test_expand_baches_coincide_con_conteo_diario():
+    _, baches = make_frames(0, 500, 0)
+    corte = pd.Timestamp('2022-12-31')
+    got = segment_rates.expand_baches(baches, corte)
+
+    expected = []
+    for fila, b in enumerate(baches.itertuples()):
+        if pd.isna(b.fecha_reporte):
+            continue
+        fin = corte if pd.isna(b.fecha_atencion) else min(b.fecha_atencion, corte)
+        days = pd.date_range(b.fecha_reporte, fin, freq='D')
+        for mes, dias in pd.Series(1, index=days.to_period('M')).groupby(level=0).sum().items():
+            expected.append((fila, mes.ordinal, dias))
+    expected = pd.DataFrame(expected, columns=['fila', 'mes', 'dias'])
+
+    key = ['fila', 'mes']
+    pd.testing.assert_frame_equal(
+        got.sort_values(key, ignore_index=True).astype('int64'),
+        expected.sort_values(key, ignore_index=True).astype('int64'),
+    )
+
+
+def mes(periodo):
+    return pd.Period(periodo, 'M').ordinal
+
+
+def tabla(meses, tramos=(0, 1)):
+    rows = [{'u': t, 'v': t + 1, 'key': 0, 'mes': mes(m), 'accidentes': 1} for m in meses for t in tramos]
+    return pd.DataFrame(rows, columns=['u', 'v', 'key', 'mes', 'accidentes']).astype('int64')
+
+
+def test_replace_months_sustituye_solo_los_meses_recalculados(tmp_path):
+    path = tmp_path / "tramos.parquet"
+    segment_rates.replace_months(path, [], tabla(['2022-01', '2022-02', '2022-03']))
+
+    # Febrero se quedó sin eventos y abril es nuevo
+    out = segment_rates.replace_months(path, [mes('2022-02'), mes('2022-04')], tabla(['2022-04']))
+    assert out['mes'].dt.strftime('%Y-%m').unique().tolist() == ['2022-01', '2022-03', '2022-04']
+    assert pd.read_parquet(path).equals(out)
+
+
+def test_replace_months_sin_meses_conserva_la_tabla(tmp_path):
+    path = tmp_path / "tramos.parquet"
+    before = segment_rates.replace_months(path, [], tabla(['2022-01', '2022-02']))
+    after = segment_rates.replace_months(path, np.array([], dtype='int64'), tabla([]))
+    pd.testing.assert_frame_equal(after, before)
+
+    # Sin tabla previa ni filas nuevas se guarda una tabla vacía
+    empty = segment_rates.replace_months(tmp_path / "vacia.parquet", [], tabla([]))
+    assert empty.empty and (tmp_path / "vacia.parquet").exists()
+
+
+@pytest.fixture
+def state_paths(tmp_path, monkeypatch):
+    for name, filename in [('FINGERPRINTS_PATH', 'huellas.parquet'), ('STATE_META_PATH', 'estado.json'),
+                           ('TRAMOS_PATH', 'tramos.parquet'), ('VIALIDADES_PATH', 'vialidades.parquet')]:
+        monkeypatch.setattr(segment_rates, name, tmp_path / filename)
+    monkeypatch.setattr(segment_rates, 'TRAMOS_STATE_DIR', tmp_path)
+    return tmp_path
+
+
+def test_incremental_coincide_con_recalculo_completo(state_paths):
+    index = make_index()
+    atus, baches = make_frames(3000, 1500, 1)
+    corte = pd.Timestamp('2023-03-31')
+    segment_rates.update_segment_rates(atus, baches, index=index, corte=corte)
+
+    # Accidentes tardíos de marzo, un bache atendido y otro nuevo
+    tardios, nuevos = make_frames(50, 1, 2)
+    tardios['datetime'] = pd.Timestamp('2022-03-15')
+    abierto = (baches['fecha_atencion'].isna() & (baches['fecha_reporte'] > '2022-11-01')).idxmax()
+    baches.loc[abierto, 'fecha_atencion'] = baches.loc[abierto, 'fecha_reporte'] + pd.Timedelta(days=20)
+    nuevos['id'] = len(baches)
+    atus = pd.concat([atus, tardios], ignore_index=True)
+    baches = pd.concat([baches, nuevos], ignore_index=True)
+
+    tramos, vialidades, months = segment_rates.update_segment_rates(atus, baches, index=index, corte=corte)
+    assert 0 < len(months) < len(segment_rates.load_state()[0])
+
+    full_tramos, full_vialidades, _ = segment_rates.update_segment_rates(
+        atus, baches, index=index, corte=corte, incremental=False)
+    pd.testing.assert_frame_equal(tramos, full_tramos)
+    pd.testing.assert_frame_equal(vialidades, full_vialidades)
+
+    # Sin cambios no se recalcula ningún mes y las tablas quedan iguales
+    tramos, vialidades, months = segment_rates.update_segment_rates(atus, baches, index=index, corte=corte)
+    assert len(months) == 0
+    pd.testing.assert_frame_equal(tramos, full_tramos)
+    pd.testing.assert_frame_equal(vialidades, full_vialidades)
+
+
+def test_tablas_no_dependen_del_orden_de_los_tramos(state_paths):
+    atus, baches = make_frames(2000, 1000, 3)
+    corte = pd.Timestamp('2023-03-31')
+    tramos, vialidades, _ = segment_rates.update_segment_rates(
+        atus, baches, index=make_index(), corte=corte, incremental=False)
+
+    order = np.random.default_rng(4).permutation(50)
+    shuffled_tramos, shuffled_vialidades, _ = segment_rates.update_segment_rates(
+        atus, baches, index=make_index(order), corte=corte, incremental=False)
+    pd.testing.assert_frame_equal(shuffled_tramos, tramos)
+    pd.testing.assert_frame_equal(shuffled_vialidades, vialidades)
+
+
+def test_estado_sin_llave_de_tramo_recalcula_todo(state_paths):
+    index = make_index()
+    atus, baches = make_frames(500, 200, 5)
+    corte = pd.Timestamp('2023-03-31')
+    segment_rates.update_segment_rates(atus, baches, index=index, corte=corte)
+
+    # Estado guardado antes de identificar los tramos por (u, v, key)
+    segment_rates.STATE_META_PATH.write_text('{"vialidades": ["vialidades", 1]}')
+    _, _, months = segment_rates.update_segment_rates(atus, baches, index=index, corte=corte)
+    assert len(months) == len(segment_rates.load_state()[0])